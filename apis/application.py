@@ -2,11 +2,10 @@
 # application.py
 
 from flask import Blueprint
-from dbutils.pooled_db import PooledDB
-from configs import config, format
+from utils.db_pool import get_pool
+from configs import format
 
 from flask import request
-import pymysql.cursors
 import json
 
 '''
@@ -15,9 +14,7 @@ import json
 '''
 
 # 使用数据库连接池的方式链接数据库，提高资源利用率
-pool = PooledDB(pymysql, mincached=2, maxcached=5,host=config.MYSQL_HOST, port=config.MYSQL_PORT,
-                user=config.MYSQL_USER, passwd= config.MYSQL_PASSWORD, database=config.MYSQL_DATABASE,
-                cursorclass=pymysql.cursors.DictCursor)
+pool = get_pool()
 
 app_application = Blueprint("app_application", __name__)
 
@@ -2,12 +2,11 @@
 
 from flask import Blueprint
 from flask import current_app as app
-from dbutils.pooled_db import PooledDB
-from configs import config,format
+from utils.db_pool import get_pool
+from configs import format
 from app import celery,global_logger
 
 from flask import request
-import pymysql.cursors
 import json
 import time
 
@@ -15,23 +14,7 @@ import time
 interface=Blueprint('interface',__name__)
 
 #获取数据库连接池
-mysql_pool=PooledDB(
-    creator=pymysql,
-    maxconnections=6,
-    mincached=2,
-    maxcached=5,
-    maxshared=3,
-    blocking=True,
-    maxusage=None,
-    setsession=[],
-    ping=0,
-    host=config.MYSQL_HOST,
-    port=config.MYSQL_PORT,
-    user=config.MYSQL_USER,
-    password=config.MYSQL_PASSWORD,
-    database=config.MYSQL_DATABASE,
-    cursorclass=pymysql.cursors.DictCursor
-)
+mysql_pool = get_pool()
 
 #获取接口列表
 @interface.route("/api/interface/list",methods=['GET'])
@@ -2,11 +2,10 @@
 
 from flask import Blueprint
 
-import pymysql.cursors
 from flask import request
 import json
-from configs import config, format
-from dbutils.pooled_db import PooledDB
+from configs import format
+from utils.db_pool import get_pool
 
 '''
 @Author: yzq
@@ -15,16 +14,10 @@ from dbutils.pooled_db import PooledDB
 
 app_product = Blueprint("app_product", __name__)
 
-# 使用用户名密码创建数据库链接
-# ​PyMySQL使用文档  https://pymysql.readthedocs.io
+# 从共享连接池获取数据库链接，close()或with语句结束时归还连接池
 def connectDB():
-    connection = pymysql.connect(host=config.MYSQL_HOST,   # 数据库IP地址或链接域名
-                             user=config.MYSQL_USER,     # 设置的具有增改查权限的用户
-                             password=config.MYSQL_PASSWORD, # 用户对应的密码
-                             database=config.MYSQL_DATABASE,# 数据表
-                             charset='utf8mb4',  # 字符编码
-                             cursorclass=pymysql.cursors.DictCursor) # 结果作为字典返回游标
-    # 返回新的书库链接对象
+    connection = get_pool().connection()
+    # 返回数据库链接对象
     return connection
 
 # 搜索接口
@@ -4,31 +4,17 @@ import pymysql.cursors
 import json
 import time
 import uuid
-from dbutils.pooled_db import PooledDB
-from configs import config, format
+from utils.db_pool import get_pool
+from configs import format
 from app import celery, global_logger
+from utils.assertions import invalidate_assertion_plan
+from services.testcase_service import get_testcase_service
 
 # 创建蓝图
 testcase = Blueprint('testcase', __name__)
 
 # 获取数据库连接池
-db_pool = PooledDB(
-    creator=pymysql,
-    maxconnections=6,
-    mincached=2,
-    maxcached=5,
-    maxshared=3,
-    blocking=True,
-    maxusage=None,
-    setsession=[],
-    ping=0,
-    host=config.MYSQL_HOST,
-    port=config.MYSQL_PORT,
-    user=config.MYSQL_USER,
-    password=config.MYSQL_PASSWORD,
-    database=config.MYSQL_DATABASE,
-    cursorclass=pymysql.cursors.DictCursor
-)
+db_pool = get_pool()
 
 
 @testcase.route('/api/testcase/add', methods=['POST'])
@@ -46,58 +32,8 @@ def add_testcase():
             response["message"] = f"缺少必要参数: {field}"
             return response
 
-            # 生成唯一ID
-    testcase_id = str(uuid.uuid4()).replace('-', '')
-
-    # 处理JSON字段
-    request_headers = json.dumps(data.get('request_headers', {})) if data.get('request_headers') else None
-    request_params = json.dumps(data.get('request_params', {})) if data.get('request_params') else None
-    assertions = json.dumps(data.get('assertions', [])) if data.get('assertions') else '[]'
-
-    # 设置时间戳
-    current_time = int(time.time())
-
     try:
-        # 构建插入数据
-        conn = db_pool.connection()
-        cursor = conn.cursor()
-
-        sql = """  
-        INSERT INTO api_testcase (  
-            id, interface_id, app_id, name, priority, request_url, request_method,   
-            request_headers, request_params, expected_status, assertions, pre_script,   
-            post_script, description, status, creator_id, creator_name, create_time, update_time  
-        ) VALUES (  
-            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s  
-        )  
-        """
-
-        params = (
-            testcase_id,
-            data['interface_id'],
-            data['app_id'],
-            data['name'],
-            data.get('priority', 2),
-            data['request_url'],
-            data['request_method'],
-            request_headers,
-            request_params,
-            data.get('expected_status'),
-            assertions,
-            data.get('pre_script'),
-            data.get('post_script'),
-            data.get('description', ''),
-            data.get('status', 1),
-            data['creator_id'],
-            data['creator_name'],
-            current_time,
-            current_time
-        )
-
-        cursor.execute(sql, params)
-        conn.commit()
-        cursor.close()
-        conn.close()
+        testcase_id = insert_testcase(data)
         response = format.resp_format_success.copy()
         response["message"] = "测试用例添加成功"
         response["data"] = {"id": testcase_id}
@@ -110,6 +46,19 @@ def add_testcase():
         return response
 
 
+def insert_testcase(data):
+    """
+    保存一条测试用例
+
+    参数:
+        data: 测试用例数据，字段同添加测试用例API
+
+    返回:
+        测试用例ID
+    """
+    return get_testcase_service().insert_testcases([data])[0]
+
+
 @testcase.route('/api/testcase/list', methods=['GET'])
 def get_testcase_list():
     try:
@@ -326,6 +275,9 @@ def update_testcase():
         cursor.close()
         conn.close()
 
+        # 用例内容变化后重新编译断言计划
+        invalidate_assertion_plan(data['id'])
+
         if affected_rows == 0:
             response = format.resp_format_failed.copy()
             response["message"] = "测试用例不存在"
@@ -368,6 +320,8 @@ def delete_testcase():
         cursor.close()
         conn.close()
 
+        invalidate_assertion_plan(data['id'])
+
         if affected_rows == 0:
             response = format.resp_format_failed.copy()
             response["message"] = "测试用例不存在"
@@ -2,8 +2,10 @@
 # -*- coding: utf-8 -*-
 
 from flask import Blueprint, request, send_file, current_app as app
-import pymysql
 import requests
+import asyncio
+import logging
+import random
 import json
 import time
 import uuid
@@ -14,34 +16,35 @@ from io import BytesIO
 import traceback
 from configs import config, format
 #from utils.auth import get_current_user
-from dbutils.pooled_db import PooledDB
+from utils.db_pool import get_pool
+from utils.latency_histogram import LatencyHistogram
 #import jsonpath
 import openpyxl
 from openpyxl.styles import Font
-from app import celery, global_logger
-from utils import metrics
+from celery import chord, group
+from app import celery, get_module_logger
+from utils import metrics, http_session, jsonpath, assertions, body_codec
+from services.result_writer import ResultWriter, RESULT_INSERT_SQL
+from services.batch_latency import (BatchLatency, save_batch_latency, save_chunk_latency, load_batch_latency,
+                                    merge_histograms)
+from services.failure_clustering import get_failure_cluster_index
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
 # 创建蓝图
 testexec = Blueprint('testexec', __name__)
 
 #获取数据库连接池
-mysql_pool=PooledDB(
-    creator=pymysql,
-    maxconnections=6,
-    mincached=2,
-    maxcached=5,
-    maxshared=3,
-    blocking=True,
-    maxusage=None,
-    setsession=[],
-    ping=0,
-    host=config.MYSQL_HOST,
-    port=config.MYSQL_PORT,
-    user=config.MYSQL_USER,
-    password=config.MYSQL_PASSWORD,
-    database=config.MYSQL_DATABASE,
-    cursorclass=pymysql.cursors.DictCursor
-)
+mysql_pool = get_pool()
+
+# 执行引擎日志器，级别可通过config.LOG_MODULE_LEVELS单独配置
+global_logger = get_module_logger(__name__)
+
+# 批次执行模式：thread 线程池执行，async 基于asyncio的aiohttp客户端执行
+EXECUTION_MODES = ('thread', 'async')
 
 
 @testexec.route('/api/testexec/execute', methods=['POST'])
@@ -125,12 +128,41 @@ def batch_execute_testcase():
     name = data['name']
     environment = data.get('environment', 'test')
     async_mode = data.get('async_mode', True)
+    concurrency = data.get('concurrency')
+    execution_mode = data.get('execution_mode')
+
+    # 校验执行模式
+    if execution_mode is not None and execution_mode not in EXECUTION_MODES:
+        global_logger.error(f'参数execution_mode不合法: {execution_mode}')
+        response = format.resp_format_failed.copy()
+        response["message"] = "参数execution_mode必须为thread或async"
+        return response
+    execution_mode = normalize_execution_mode(execution_mode)
+
+    # 校验并发数
+    if concurrency is not None:
+        if isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency <= 0:
+            global_logger.error(f'参数concurrency不合法: {concurrency}')
+            response = format.resp_format_failed.copy()
+            response["message"] = "参数concurrency必须为正整数"
+            return response
+    concurrency = normalize_concurrency(concurrency, execution_mode)
+    chunk_size = data.get('chunk_size')
+
+    # 校验分片大小
+    if chunk_size is not None:
+        if isinstance(chunk_size, bool) or not isinstance(chunk_size, int) or chunk_size <= 0:
+            global_logger.error(f'参数chunk_size不合法: {chunk_size}')
+            response = format.resp_format_failed.copy()
+            response["message"] = "参数chunk_size必须为正整数"
+            return response
+    chunk_size = normalize_chunk_size(chunk_size)
 
     #  关键：检查是否传入了batch_id
     existing_batch_id = data.get('batch_id')
 
     global_logger.info(
-        f'开始批量执行测试用例，数量: {len(testcase_ids)}, 应用ID: {app_id}, 环境: {environment}, 异步模式: {async_mode}, 现有批次ID: {existing_batch_id}')
+        f'开始批量执行测试用例，数量: {len(testcase_ids)}, 应用ID: {app_id}, 环境: {environment}, 异步模式: {async_mode}, 执行模式: {execution_mode}, 并发数: {concurrency}, 现有批次ID: {existing_batch_id}')
 
     try:
         #  批次处理逻辑
@@ -159,33 +191,35 @@ def batch_execute_testcase():
             global_logger.info(f"创建测试批次成功，ID: {batch_id}, 名称: {name}, 测试用例数量: {len(testcase_ids)}")
             # 异步执行测试用例
         if async_mode:
-            global_logger.info(f'启动异步执行线程，批次ID: {batch_id}')
-            execute_batch_testcases_async.delay(batch_id, testcase_ids, environment, current_user)
-            global_logger.info(f"已提交异步任务，批次ID: {batch_id}")
+            global_logger.info(f'分发批次分片任务，批次ID: {batch_id}')
+            chunk_count = dispatch_batch_execution(batch_id, testcase_ids, environment, current_user,
+                                                   concurrency, chunk_size, execution_mode)
+            global_logger.info(f"已提交异步任务，批次ID: {batch_id}，分片数量: {chunk_count}")
             response = format.resp_format_success.copy()
             response["message"] = "测试批次已创建，测试用例正在异步执行中" if not existing_batch_id else "测试批次正在异步执行中"
             response["data"] = {
                 "batch_id": batch_id,
-                "total_cases": len(testcase_ids)
+                "total_cases": len(testcase_ids),
+                "concurrency": concurrency,
+                "execution_mode": execution_mode,
+                "chunk_size": chunk_size,
+                "chunk_count": chunk_count
             }
             return response
         else:
             global_logger.info(f'开始同步执行测试用例，批次ID: {batch_id}')
-            # 同步执行测试用例
-            results = execute_batch_testcases_sync(batch_id, testcase_ids, environment, current_user)
-
-            # 计算统计数据
-            passed_cases = sum(1 for r in results if r.get('is_success'))
-            failed_cases = sum(1 for r in results if not r.get('is_success'))
+            # 执行期间以增量方式累加进度，执行前先清零
+            update_batch_progress(batch_id, 0, 0)
 
-            # 更新批次统计数据
-            update_batch_progress(batch_id, passed_cases, failed_cases)
+            # 同步执行测试用例
+            execute_batch_testcases_sync(batch_id, testcase_ids, environment, current_user, concurrency,
+                                         execution_mode)
 
             # 更新批次状态
             update_batch_status(batch_id)
 
-            passed_cases = sum(1 for r in results if r.get('is_success'))
-            failed_cases = sum(1 for r in results if not r.get('is_success'))
+            # 统计数据以批次记录为准，与执行期间写入的结果保持一致
+            passed_cases, failed_cases = get_batch_progress(batch_id)
             global_logger.info(f'测试批次执行完成，批次ID: {batch_id}, 通过: {passed_cases}, 失败: {failed_cases}')
 
             response = format.resp_format_success.copy()
@@ -324,6 +358,9 @@ def get_batch_detail():
             response["code"] = 40004
             return response
 
+        # 延迟百分位读取批次执行时保存的直方图统计
+        batch['latency'] = load_batch_latency(cursor, batch_id)
+
         global_logger.info(f"获取测试批次详情成功，ID: {batch_id}, 名称: {batch['name']}")
 
         response = format.resp_format_success.copy()
@@ -471,6 +508,7 @@ def get_result_detail():
         if result['response_headers']:
             result['response_headers'] = json.loads(result['response_headers'])
         if result['response_body']:
+            result['response_body'] = body_codec.decode_body(result['response_body'])
             try:
                 result['response_body'] = json.loads(result['response_body'])
             except:
@@ -662,6 +700,28 @@ def get_test_dashboard():
         cursor.execute(coverage_sql, [app_id, time_range, app_id])
         coverage = cursor.fetchone()
 
+        # 合并统计周期内各批次保存的延迟直方图
+        latency_sql = """
+            SELECT l.scope, l.scope_key, l.histogram
+            FROM api_batch_latency l
+            INNER JOIN api_test_batch b ON l.batch_id = b.id
+            WHERE b.app_id = %s AND b.create_time > %s AND l.scope IN ('batch', 'interface')
+        """
+        cursor.execute(latency_sql, [app_id, time_range])
+        latency_rows = cursor.fetchall()
+
+        interface_rows = {}
+        for row in latency_rows:
+            if row['scope'] == 'interface':
+                interface_rows.setdefault(row['scope_key'], []).append(row)
+
+        slowest_interfaces = []
+        for interface_id, rows in interface_rows.items():
+            summary = merge_histograms(rows).summary()
+            summary['interface_id'] = interface_id
+            slowest_interfaces.append(summary)
+        slowest_interfaces.sort(key=lambda item: item['p99'] or 0, reverse=True)
+
         global_logger.info(f"获取测试执行统计数据成功，应用ID: {app_id}")
 
         # 构建响应数据
@@ -674,6 +734,10 @@ def get_test_dashboard():
                 'success_rate': round((batch_stats['total_passed'] or 0) * 100 / (batch_stats['total_cases'] or 1), 2)
             },
             'daily_stats': daily_stats,
+            'latency_stats': {
+                'overall': merge_histograms([row for row in latency_rows if row['scope'] == 'batch']).summary(),
+                'slowest_interfaces': slowest_interfaces[:config.DASHBOARD_SLOWEST_INTERFACES]
+            },
             'interface_coverage': {
                 'total_interfaces': coverage['total_interfaces'] or 0,
                 'covered_interfaces': coverage['covered_interfaces'] or 0,
@@ -698,410 +762,261 @@ def get_test_dashboard():
         conn.close()
 
 
-def execute_single_testcase(testcase_id, environment='test', variables={}, current_user=None):
+@testexec.route('/api/testexec/load_test', methods=['POST'])
+def start_load_test():
     """
-    执行单个测试用例
+    对测试用例发起压测：按虚拟用户数（并发）或目标RPS持续执行指定时长，结果汇总为延迟分布与错误率
+    """
+    global_logger.info('访问发起压测API')
+    data = request.json or {}
+    global_logger.info(f'请求参数: {json.dumps(data)}')
 
-    参数:
-        testcase_id: 测试用例ID
-        environment: 执行环境，默认为test
-        variables: 环境变量，用于替换请求中的变量
-        current_user: 当前用户信息
+    # 检查必要参数
+    for field in ['app_id', 'name', 'duration']:
+        if field not in data or not data[field]:
+            global_logger.error(f'缺少必要参数: {field}')
+            response = format.resp_format_failed.copy()
+            response["message"] = f"缺少必要参数: {field}"
+            return response
 
-    返回:
-        包含执行结果的字典
+    current_user = get_current_user()
+    if not current_user:
+        global_logger.error('获取当前用户失败，用户未登录或登录已过期')
+        response = format.resp_format_failed.copy()
+        response["message"] = "用户未登录或登录已过期"
+        response["code"] = 50008
+        return response
+
+    # testcases: [{"id": 用例ID, "weight": 权重}]，或只传testcase_ids表示等权重
+    testcases = data.get('testcases') or [{'id': testcase_id, 'weight': 1}
+                                          for testcase_id in data.get('testcase_ids') or []]
+    if not testcases:
+        global_logger.error('缺少必要参数: testcases')
+        response = format.resp_format_failed.copy()
+        response["message"] = "缺少必要参数: testcases或testcase_ids"
+        return response
+
+    for item in testcases:
+        weight = item.get('weight', 1) if isinstance(item, dict) else None
+        if not isinstance(item, dict) or not item.get('id') or isinstance(weight, bool) \
+                or not isinstance(weight, (int, float)) or weight <= 0:
+            global_logger.error(f'参数testcases不合法: {item}')
+            response = format.resp_format_failed.copy()
+            response["message"] = "参数testcases中每项必须包含id，weight必须为正数"
+            return response
+
+    duration = data.get('duration')
+    concurrency = data.get('concurrency', config.LOAD_TEST_DEFAULT_CONCURRENCY)
+    target_rps = data.get('target_rps')
+
+    for name, value, upper in (('duration', duration, config.LOAD_TEST_MAX_DURATION),
+                               ('concurrency', concurrency, config.LOAD_TEST_MAX_CONCURRENCY)):
+        if isinstance(value, bool) or not isinstance(value, int) or value <= 0 or value > upper:
+            global_logger.error(f'参数{name}不合法: {value}')
+            response = format.resp_format_failed.copy()
+            response["message"] = f"参数{name}必须为1到{upper}之间的整数"
+            return response
+
+    if target_rps is not None and (isinstance(target_rps, bool) or not isinstance(target_rps, (int, float))
+                                   or target_rps <= 0):
+        global_logger.error(f'参数target_rps不合法: {target_rps}')
+        response = format.resp_format_failed.copy()
+        response["message"] = "参数target_rps必须为正数"
+        return response
+
+    environment = data.get('environment', 'test')
+    check_assertions = bool(data.get('check_assertions', True))
+    testcases = [{'id': item['id'], 'weight': item.get('weight', 1)} for item in testcases]
+
+    try:
+        load_test_id = str(uuid.uuid4()).replace('-', '')
+        create_load_test(load_test_id, data['app_id'], data['name'], testcases, environment, duration,
+                         concurrency, target_rps, current_user)
+
+        execute_load_test.delay(load_test_id, testcases, environment, duration, concurrency, target_rps,
+                                check_assertions)
+        global_logger.info(f'已提交压测任务，压测ID: {load_test_id}')
+
+        response = format.resp_format_success.copy()
+        response["message"] = "压测任务已创建，正在异步执行中"
+        response["data"] = {
+            "load_test_id": load_test_id,
+            "duration": duration,
+            "concurrency": concurrency,
+            "target_rps": target_rps
+        }
+        return response
+    except Exception as e:
+        global_logger.error(f"发起压测异常: {str(e)}")
+        global_logger.error(traceback.format_exc())
+
+        response = format.resp_format_failed.copy()
+        response["message"] = f"系统异常: {str(e)}"
+        return response
+
+
+@testexec.route('/api/testexec/load_test_detail', methods=['GET'])
+def get_load_test_detail():
     """
-    global_logger.info(f'开始执行单个测试用例, ID: {testcase_id}, 环境: {environment}')
+    获取压测结果汇总
+    """
+    global_logger.info('访问获取压测结果API')
 
-    start_time=time.time()
+    load_test_id = request.args.get('id')
+    global_logger.info(f'请求参数: id={load_test_id}')
 
-    # 生成结果ID
-    result_id = str(uuid.uuid4()).replace('-', '')
-    global_logger.info(f'生成测试结果ID: {result_id}')
+    if not load_test_id:
+        global_logger.error('缺少必要参数: id')
+        response = format.resp_format_failed.copy()
+        response["message"] = "缺少必要参数: id"
+        return response
 
-    # 获取测试用例信息
     conn = mysql_pool.connection()
     cursor = conn.cursor()
 
     try:
-        # 查询测试用例
-        sql = """  
-            SELECT id, interface_id, app_id, name, priority, request_url, request_method,   
-                   request_headers, request_params, expected_status, assertions,   
-                   pre_script, post_script  
-            FROM api_testcase  
-            WHERE id = %s  
+        sql = """
+            SELECT id, app_id, name, environment, testcases, concurrency, target_rps, duration, status,
+                   total_requests, success_requests, failed_requests, error_requests, throughput, error_rate,
+                   latency_min, latency_mean, latency_p50, latency_p90, latency_p99, latency_max,
+                   detail, error_message, executor_id, executor_name, create_time, start_time, end_time
+            FROM api_load_test
+            WHERE id = %s
         """
-        global_logger.info(f'执行SQL: {sql}, 参数: [{testcase_id}]')
-        cursor.execute(sql, [testcase_id])
-        testcase = cursor.fetchone()
+        cursor.execute(sql, [load_test_id])
+        load_test = cursor.fetchone()
 
-        if not testcase:
-            global_logger.error(f'未找到测试用例, ID: {testcase_id}')
-            raise Exception(f"未找到测试用例: {testcase_id}")
+        if not load_test:
+            global_logger.warning(f"未找到压测记录，ID: {load_test_id}")
+            response = format.resp_format_failed.copy()
+            response["message"] = "未找到压测记录"
+            response["code"] = 40004
+            return response
 
-        global_logger.info(f'获取测试用例信息成功, 名称: {testcase["name"]}')
+        for field in ('testcases', 'detail'):
+            if load_test[field]:
+                load_test[field] = json.loads(load_test[field])
 
-        # 获取环境配置
-        env_sql = """  
-            SELECT base_url, headers, global_variables  
-            FROM api_environment  
-            WHERE app_id = %s AND env = %s  
-        """
-        global_logger.info(f'执行SQL: {env_sql}, 参数: [{testcase["app_id"]}, {environment}]')
-        cursor.execute(env_sql, [testcase["app_id"], environment])
-        env_config = cursor.fetchone()
+        response = format.resp_format_success.copy()
+        response["message"] = "获取压测结果成功"
+        response["data"] = load_test
+        return response
+    except Exception as e:
+        global_logger.error(f"获取压测结果异常: {str(e)}")
+        global_logger.error(traceback.format_exc())
 
-        if not env_config:
-            global_logger.error(f'未找到环境配置, 应用ID: {testcase["app_id"]}, 环境: {environment}')
-            raise Exception(f"未找到环境配置: app_id={testcase['app_id']}, environment={environment}")
+        response = format.resp_format_failed.copy()
+        response["message"] = f"系统异常: {str(e)}"
+        return response
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@testexec.route('/api/testexec/failure_clusters', methods=['GET'])
+def get_failure_clusters():
+    """
+    获取失败聚类列表，指定batch_id时只返回该批次出现的聚类
+    """
+    global_logger.info('访问获取失败聚类列表API')
 
-        global_logger.info(f'获取环境配置成功, 基础URL: {env_config["base_url"]}')
+    app_id = request.args.get('app_id')
+    batch_id = request.args.get('batch_id')
+    page = int(request.args.get('page', 1))
+    size = int(request.args.get('size', 20))
 
-        # 准备请求参数
-        request_url = testcase['request_url']
+    global_logger.info(f'请求参数: app_id={app_id}, batch_id={batch_id}, page={page}, size={size}')
 
-        # 如果URL不是以http开头，则拼接基础URL
-        if not request_url.startswith(('http://', 'https://')):
-            request_url = env_config['base_url'].rstrip('/') + '/' + request_url.lstrip('/')
+    if not app_id:
+        global_logger.error('缺少必要参数: app_id')
+        response = format.resp_format_failed.copy()
+        response["message"] = "缺少必要参数: app_id"
+        return response
 
-        request_method = testcase['request_method'].upper()
+    try:
+        total, clusters = get_failure_cluster_index().list_clusters(app_id, batch_id, (page - 1) * size, size)
 
-        # 处理请求头
-        request_headers = {}
-        if env_config['headers']:
-            try:
-                env_headers = json.loads(env_config['headers'])
-                request_headers.update(env_headers)
-            except Exception as e:
-                global_logger.warning(f'解析环境请求头异常: {str(e)}')
+        global_logger.info(f"获取失败聚类列表成功，总数: {total}, 当前页数量: {len(clusters)}")
 
-        if testcase['request_headers']:
-            try:
-                case_headers = json.loads(testcase['request_headers'])
-                request_headers.update(case_headers)
-            except Exception as e:
-                global_logger.warning(f'解析测试用例请求头异常: {str(e)}')
+        response = format.resp_format_success.copy()
+        response["message"] = "获取失败聚类列表成功"
+        response["data"] = clusters
+        response["total"] = total
+        return response
+    except Exception as e:
+        global_logger.error(f"获取失败聚类列表异常: {str(e)}")
+        global_logger.error(traceback.format_exc())
 
-                # 处理请求参数
-        request_params = {}
-        request_data = None
-        request_json = None
+        response = format.resp_format_failed.copy()
+        response["message"] = f"系统异常: {str(e)}"
+        return response
 
-        global_logger.info(f'测试用例ID: {testcase_id}')
-        global_logger.info(f'request_params原始值: {repr(testcase["request_params"])}')
-        global_logger.info(f'request_params是否为真: {bool(testcase["request_params"])}')
 
-        if testcase['request_params']:
-            try:
-                params_data = json.loads(testcase['request_params'])
-                global_logger.info(f'解析params_data成功: {params_data}')
-
-                # 处理GET请求参数
-                if request_method == 'GET':
-                    request_params = params_data
-                    # 处理POST/PUT/DELETE请求体
-                elif request_method in ['POST', 'PUT', 'DELETE', 'PATCH']:
-                    request_json = params_data
-                    if 'Content-Type' not in request_headers:
-                        request_headers['Content-Type'] = 'application/json'
-            except Exception as e:
-                global_logger.error(f'解析测试用例请求参数异常: {str(e)}')
+def execute_single_testcase(testcase_id, environment='test', variables={}, current_user=None, batch_context=None,
+                            batch_id=None, result_writer=None):
+    """
+    执行单个测试用例
 
-        global_logger.info(f'最终处理结果 - request_params: {request_params}')
-        global_logger.info(f'最终处理结果 - request_json: {request_json}')
-        global_logger.info(f'最终处理结果')
+    参数:
+        testcase_id: 测试用例ID
+        environment: 执行环境，默认为test
+        variables: 环境变量，用于替换请求中的变量
+        current_user: 当前用户信息
+        batch_context: 批次预取的用例与环境配置，为空时逐条查询
+        batch_id: 批次ID，为空表示单独执行
+        result_writer: 批次结果写入器，为空时直接写入数据库
 
-        #记录当前时间
-        http_request_start_time = time.time()
+    返回:
+        包含执行结果的字典
+    """
+    global_logger.debug('开始执行单个测试用例, ID: %s, 环境: %s', testcase_id, environment)
 
-        global_logger.info(f'准备执行HTTP请求, URL: {request_url}, 方法: {request_method}')
-        global_logger.info(f'请求头: {request_headers}')
-        global_logger.info(f'请求参数 (params): {request_params}')
-        global_logger.info(f'请求数据 (data): {request_data}')
-        global_logger.info(f'请求JSON (json): {request_json}')
-        # 执行前置脚本
-        if testcase['pre_script']:
-            global_logger.info(f'执行前置脚本, 测试用例ID: {testcase_id}')
-            try:
-                # 这里可以实现执行前置脚本的逻辑
-                pass
-            except Exception as e:
-                global_logger.error(f'执行前置脚本异常: {str(e)}')
+    start_time = time.time()
 
-                # 记录开始时间
-        start_time = time.time()
+    # 生成结果ID
+    result_id = str(uuid.uuid4()).replace('-', '')
+    global_logger.debug('生成测试结果ID: %s', result_id)
 
-        # 发送HTTP请求
-        try:
-            global_logger.info(f'准备发送请求 - 方法: {request_method}, URL: {request_url}')
-            global_logger.info(f'请求头: {request_headers}')
-            global_logger.info(f'请求JSON: {request_json}')
-            global_logger.info(f'请求JSON类型: {type(request_json)}')
+    try:
+        # 获取测试用例和环境配置（查询完成后立即归还连接，避免HTTP请求期间占用连接池）
+        if batch_context is not None:
+            testcase, env_config = resolve_testcase_context(batch_context, testcase_id, environment)
+        else:
+            testcase, env_config = load_testcase_context(testcase_id, environment)
 
-            if request_method == 'GET':
-                response = requests.get(
-                    url=request_url,
-                    headers=request_headers,
-                    params=request_params,
-                    timeout=30
-                )
-            else:
-                # POST/PUT/DELETE等方法
-                response = requests.request(
-                    method=request_method,
-                    url=request_url,
-                    headers=request_headers,
-                    json=request_json,  # 只使用json参数
-                    timeout=30
-                )
-
-                # 计算执行时间
-            execution_time = int((time.time() - start_time) * 1000)  # 毫秒
-
-            # 获取响应信息
-            response_status = response.status_code
-            response_headers = dict(response.headers)
+        # 准备请求
+        request_spec = build_testcase_request(testcase, env_config)
+        request_url = request_spec['url']
+        request_method = request_spec['method']
 
-            try:
-                response_body = response.json()
-                response_body_str = json.dumps(response_body)
-                global_logger.info(f'响应内容: {response_body_str}')
-            except:
-                response_body = response.text
-                response_body_str = response_body
-                global_logger.info(f'响应内容(文本): {response_body_str}')
-
-            global_logger.info(f'HTTP请求执行完成, 状态码: {response_status}, 执行时间: {execution_time}ms')
-            #HTTP请求完成后记录指标
-            http_request_duration = time.time() - http_request_start_time
-            # 导入metrics模块
-            from utils import metrics
-            metrics.record_http_request(
-                method=request_method,
-                status_code=response_status,
-                duration_seconds=http_request_duration
-            )
-            # 执行断言
-            is_success = True
-            assertion_results = []
+        # 执行前置脚本
+        run_pre_script(testcase)
 
-            if testcase['assertions']:
-                global_logger.info(f'开始执行断言, 测试用例ID: {testcase_id}')
-                try:
-                    assertions = json.loads(testcase['assertions'])
-
-                    for assertion in assertions:
-                        assertion_type = assertion.get('type')
-                        expected = assertion.get('expected')
-                        actual = None
-                        result = False
-
-                        if assertion_type == 'status_code':
-                            actual = response_status
-                            result = str(actual) == str(expected)
-                        elif assertion_type == 'json_path':
-                            json_path = assertion.get('path')
-                            compare_type = assertion.get('operator', assertion.get('compare_type', 'eq'))
-                            if compare_type == "equals":
-                                compare_type = "eq"
-
-                            if isinstance(response_body, dict):
-                                try:
-                                    global_logger.info(f'执行JSON路径断言: {json_path}, 响应内容: {json.dumps(response_body)}')
-                                    # 使用自定义的jsonpath_extract替代jsonpath.jsonpath
-                                    matches = jsonpath_extract(response_body, json_path)
-                                    if matches:
-                                        actual = matches[0]
-
-                                        global_logger.info(f'JSON路径 {json_path} 提取到值: {actual}')
-
-                                        if compare_type == 'eq':
-                                            result = str(actual) == str(expected)
-                                        elif compare_type == 'contains':
-                                            result = str(expected) in str(actual)
-                                        elif compare_type == 'gt':
-                                            result = float(actual) > float(expected)
-                                        elif compare_type == 'lt':
-                                            result = float(actual) < float(expected)
-                                        else:
-                                            result = str(actual) == str(expected)
-                                    else:
-                                        # 记录未找到匹配值的情况
-                                        global_logger.warning(f'JSON路径 {json_path} 未找到匹配值，响应内容: {json.dumps(response_body)}')
-                                        actual = None
-                                except Exception as e:
-                                    global_logger.error(f'执行JSON路径断言异常: {str(e)}')
-                                    actual = str(e)
-                        elif assertion_type == 'contains':
-                            actual = response_body_str
-                            result = str(expected) in str(actual)
-
-                        assertion_result = {
-                            'type': assertion_type,
-                            'expected': expected,
-                            'actual': actual,
-                            'result': result
-                        }
-
-                        assertion_results.append(assertion_result)
-
-                        if not result:
-                            is_success = False
-                        metrics.record_assertion_result(result)
-
-                    global_logger.info(f'断言执行完成, 是否通过: {is_success}')
-
-                    # 执行后置脚本
-                    if testcase['post_script']:
-                        global_logger.info(f'执行后置脚本, 测试用例ID: {testcase_id}')
-                        try:
-                            # 这里可以实现执行后置脚本的逻辑
-                            pass
-                        except Exception as e:
-                            global_logger.error(f'执行后置脚本异常: {str(e)}')
-
-                            # 保存测试结果（移到if语句外面，取消缩进）
-                    current_time = int(time.time())
-
-                    save_sql = """  
-                        INSERT INTO api_result (  
-                            id, testcase_id, interface_id, app_id, batch_id, request_url, request_method,  
-                            request_headers, request_body, response_status, response_headers, response_body,  
-                            assertion_results, is_success, error_message, execution_time, executor_id,   
-                            executor_name, execute_time, test_request_id  
-                        ) VALUES (  
-                            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s  
-                        )  
-                    """
-
-                    executor_id = current_user.get('id') if current_user else None
-                    executor_name = current_user.get('username') if current_user else None
-
-                    params = [
-                        result_id,
-                        testcase_id,
-                        testcase['interface_id'],
-                        testcase['app_id'],
-                        None,  # batch_id为空，表示单独执行
-                        request_url,
-                        request_method,
-                        json.dumps(request_headers),
-                        json.dumps(request_data if request_data else request_json) if (
-                                request_data or request_json) else None,
-                        response_status,
-                        json.dumps(response_headers),
-                        response_body_str,
-                        json.dumps(assertion_results),
-                        is_success,
-                        None,  # error_message
-                        execution_time,
-                        executor_id,
-                        executor_name,
-                        current_time,
-                        ' '
-                    ]
-
-                    global_logger.info(f'保存测试结果，结果ID: {result_id}')
-                    cursor.execute(save_sql, params)
-                    conn.commit()
-
-                    test_duration = time.time() - start_time
-                    metrics.record_test_result(
-                        success=is_success,
-                        duration_seconds=test_duration
-                    )
-
-                    # 返回测试结果（也移到if语句外面，取消缩进）
-                    return {
-                        'result_id': result_id,
-                        'testcase_id': testcase_id,
-                        'request_url': request_url,
-                        'request_method': request_method,
-                        'response_status': response_status,
-                        'is_success': is_success,
-                        'execution_time': execution_time,
-                        'execute_time': current_time
-                    }
-                except Exception as e:
-                    global_logger.error(f'执行断言过程异常: {str(e)}')
-                    is_success = False
-                    assertion_results.append({
-                        'type': 'error',
-                        'expected': 'No error',
-                        'actual': str(e),
-                        'result': False
-                    })
+        # 记录开始时间
+        request_start_time = time.time()
+
+        # 发送HTTP请求
+        try:
+            global_logger.debug('准备发送请求 - 方法: %s, URL: %s', request_method, request_url)
 
+            response = send_testcase_request(request_spec)
 
+            # 计算执行时间
+            execution_time = int((time.time() - request_start_time) * 1000)  # 毫秒
 
         except requests.RequestException as e:
             global_logger.error(f'HTTP请求异常: {str(e)}')
 
             # 计算执行时间
-            execution_time = int((time.time() - start_time) * 1000)
-
-            # 保存错误结果
-            current_time = int(time.time())
-
-            save_sql = """  
-                    INSERT INTO api_result (  
-                        id, testcase_id, interface_id, app_id, batch_id, request_url, request_method,  
-                        request_headers, request_body, response_status, response_headers, response_body,  
-                        assertion_results, is_success, error_message, execution_time, executor_id,   
-                        executor_name, execute_time  
-                    ) VALUES (  
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s  
-                    )  
-                """
+            execution_time = int((time.time() - request_start_time) * 1000)
 
-            executor_id = current_user.get('id') if current_user else None
-            executor_name = current_user.get('username') if current_user else None
-
-            params = [
-                result_id,
-                testcase_id,
-                testcase['interface_id'],
-                testcase['app_id'],
-                None,  # batch_id为空，表示单独执行
-                request_url,
-                request_method,
-                json.dumps(request_headers),
-                json.dumps(request_json, ensure_ascii=False) if request_json else None,
-                None,  # response_status
-                None,  # response_headers
-                None,  # response_body
-                None,  # assertion_results
-                False,  # is_success
-                str(e),  # error_message
-                execution_time,
-                executor_id,
-                executor_name,
-                current_time
-            ]
-
-            global_logger.info(f'保存测试结果（失败），结果ID: {result_id}')
-            cursor.execute(save_sql, params)
-            conn.commit()
-
-            test_duration = time.time() - start_time
-            metrics.record_test_result(
-                success=False,
-                duration_seconds=test_duration
-            )
+            return record_testcase_failure(testcase, request_spec, result_id, str(e), execution_time,
+                                           start_time, current_user, batch_id, result_writer)
 
-            # 返回测试结果
-            return {
-                'result_id': result_id,
-                'testcase_id': testcase_id,
-                'request_url': request_url,
-                'request_method': request_method,
-                'response_status': None,
-                'is_success': False,
-                'execution_time': execution_time,
-                'execute_time': current_time,
-                'error_message': str(e)
-            }
+        return complete_testcase_execution(testcase, request_spec, result_id, response.status_code,
+                                           dict(response.headers), response.content, execution_time,
+                                           start_time, current_user, batch_id, result_writer,
+                                           response.encoding)
 
     except Exception as e:
         global_logger.error(f'执行测试用例异常: {str(e)}')
@@ -1112,124 +1027,1094 @@ def execute_single_testcase(testcase_id, environment='test', variables={}, curre
             success=False,
             duration_seconds=test_duration
         )
-    finally:
-        cursor.close()
-        conn.close()
+        raise
 
-    raise e
 
-@celery.task(bind=False)
-def execute_batch_testcases_async(batch_id, testcase_ids, environment, current_user):
+async def execute_single_testcase_async(session, db_executor, testcase_id, environment='test', current_user=None,
+                                        batch_id=None, batch_context=None, result_writer=None):
     """
-    异步执行批量测试用例
+    通过asyncio客户端执行单个测试用例，生成的api_result记录与execute_single_testcase一致
+
+    数据库读写等阻塞操作交给db_executor线程池执行，不阻塞事件循环。
+
+    参数:
+        session: aiohttp.ClientSession
+        db_executor: 执行数据库操作的线程池
+        testcase_id: 测试用例ID
+        environment: 执行环境，默认为test
+        current_user: 当前用户信息
+        batch_id: 批次ID，保存结果时直接写入
+        batch_context: 批次预取的用例与环境配置，为空时逐条查询
+        result_writer: 批次结果写入器，为空时直接写入数据库
+
+    返回:
+        包含执行结果的字典
     """
-    global_logger.info(f'开始异步执行批量测试用例，批次ID: {batch_id}，用例数量: {len(testcase_ids)}')
+    global_logger.debug('开始异步执行单个测试用例, ID: %s, 环境: %s', testcase_id, environment)
 
-    from utils import metrics
-    metrics.update_queue_length(len(testcase_ids))
-    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='running').set(1)
-    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='completed').set(0)
-    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='failed').set(0)
+    loop = asyncio.get_running_loop()
+    start_time = time.time()
 
-    # 处理结果
-    passed_cases = 0
-    failed_cases = 0
-    total_cases = len(testcase_ids)
+    # 生成结果ID
+    result_id = str(uuid.uuid4()).replace('-', '')
 
     try:
-        for index, testcase_id in enumerate(testcase_ids):
-            try:
-                # 调用执行单个测试用例的函数
-                result = execute_batch_testcase(batch_id, testcase_id, environment, current_user)
-                if result:
-                    if result.get('is_success'):
-                        passed_cases += 1
-                    else:
-                        failed_cases += 1
-                else:
-                    global_logger.error(f'执行测试用例失败，返回结果为None，用例ID: {testcase_id}')
-                    failed_cases += 1
+        if batch_context is not None:
+            testcase, env_config = resolve_testcase_context(batch_context, testcase_id, environment)
+        else:
+            testcase, env_config = await loop.run_in_executor(db_executor, load_testcase_context, testcase_id,
+                                                              environment)
 
-            except Exception as e:
-                global_logger.error(f'执行测试用例异常，用例ID: {testcase_id}, 错误: {str(e)}')
-                failed_cases += 1
+        # 准备请求
+        request_spec = build_testcase_request(testcase, env_config)
+        request_url = request_spec['url']
+        request_method = request_spec['method']
 
-                # 更新批次进度
-            update_batch_progress(batch_id, passed_cases, failed_cases)
+        # 执行前置脚本
+        run_pre_script(testcase)
 
-            remaining = total_cases - (index + 1)
-            metrics.update_queue_length(remaining)
-            completion_rate = (index + 1) / total_cases
-            metrics.BATCH_COMPLETION.labels(batch_id=str(batch_id)).set(completion_rate)
+        request_kwargs = {'headers': request_spec['headers']}
+        if request_method == 'GET':
+            request_kwargs['params'] = to_query_items(request_spec['params'])
+        else:
+            request_kwargs['json'] = request_spec['json']
 
-        # 所有测试用例执行完成后，进行最终统计
-        finalize_test_batch(batch_id)
-        global_logger.info(f'异步执行批量测试用例完成，批次ID: {batch_id}，通过: {passed_cases}，失败: {failed_cases}')
+        # 记录开始时间
+        request_start_time = time.time()
 
-        metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='running').set(0)
-        metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='completed').set(1)
-        success_rate = passed_cases / total_cases if total_cases > 0 else 0
-        metrics.BATCH_SUCCESS_RATE.labels(batch_id=str(batch_id)).set(success_rate)
+        # 发送HTTP请求
+        try:
+            global_logger.debug('准备发送异步请求 - 方法: %s, URL: %s', request_method, request_url)
 
-    except Exception as e:
-        global_logger.error(f'异步执行批量测试用例异常: {str(e)}')
-        global_logger.error(traceback.format_exc())
+            async with session.request(request_method, request_url, **request_kwargs) as response:
+                response_content = await response.read()
+                response_encoding = response.charset
+                response_status = response.status
+                response_headers = dict(response.headers)
 
-        # 更新批次状态为异常
-        update_batch_status(batch_id, status=3)
+            # 计算执行时间
+            execution_time = int((time.time() - request_start_time) * 1000)  # 毫秒
 
-        metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='running').set(0)
-        metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='failed').set(1)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error_message = str(e) or '请求超时'
+            global_logger.error(f'HTTP请求异常: {error_message}')
 
-    finally:
-        metrics.update_queue_length(0)
+            # 计算执行时间
+            execution_time = int((time.time() - request_start_time) * 1000)
+
+            return await loop.run_in_executor(db_executor, record_testcase_failure, testcase, request_spec,
+                                              result_id, error_message, execution_time, start_time,
+                                              current_user, batch_id, result_writer)
+
+        return await loop.run_in_executor(db_executor, complete_testcase_execution, testcase, request_spec,
+                                          result_id, response_status, response_headers, response_content,
+                                          execution_time, start_time, current_user, batch_id, result_writer,
+                                          response_encoding)
+
+    except Exception as e:
+        global_logger.error(f'异步执行测试用例异常: {str(e)}')
+        global_logger.error(traceback.format_exc())
 
+        test_duration = time.time() - start_time
+        metrics.record_test_result(
+            success=False,
+            duration_seconds=test_duration
+        )
+        raise
 
 
-def execute_batch_testcases_sync(batch_id, testcase_ids, environment, current_user):
+def build_testcase_request(testcase, env_config):
     """
-    同步执行批量测试用例
+    根据测试用例与环境配置组装请求
 
     参数:
-        batch_id: 批次ID
-        testcase_ids: 测试用例ID列表
-        environment: 执行环境
-        current_user: 当前用户信息
+        testcase: 测试用例数据
+        env_config: 环境配置
 
     返回:
-        包含所有测试结果的列表
+        包含url、method、headers、params、data、json的字典
     """
-    with app.app_context():
-        global_logger.info(f'开始同步执行批量测试用例，批次ID: {batch_id}，用例数量: {len(testcase_ids)}')
+    request_url = testcase['request_url']
 
-        results = []
-        passed_cases = 0
-        failed_cases = 0
+    # 如果URL不是以http开头，则拼接基础URL
+    if not request_url.startswith(('http://', 'https://')):
+        request_url = env_config['base_url'].rstrip('/') + '/' + request_url.lstrip('/')
 
+    request_method = testcase['request_method'].upper()
+
+    # 处理请求头
+    request_headers = {}
+    if env_config['headers']:
         try:
-            for testcase_id in testcase_ids:
-                try:
-                    result = execute_batch_testcase(batch_id, testcase_id, environment, current_user)
-                    results.append(result)
+            env_headers = json.loads(env_config['headers'])
+            request_headers.update(env_headers)
+        except Exception as e:
+            global_logger.warning(f'解析环境请求头异常: {str(e)}')
 
-                    if result.get('is_success'):
-                        passed_cases += 1
-                    else:
-                        failed_cases += 1
+    if testcase['request_headers']:
+        try:
+            case_headers = json.loads(testcase['request_headers'])
+            request_headers.update(case_headers)
+        except Exception as e:
+            global_logger.warning(f'解析测试用例请求头异常: {str(e)}')
 
-                        # 更新批次进度
-                    update_batch_progress(batch_id, passed_cases, failed_cases)
+    # 处理请求参数
+    request_params = {}
+    request_data = None
+    request_json = None
 
-                except Exception as e:
-                    global_logger.error(f'同步执行测试用例异常，用例ID: {testcase_id}, 错误: {str(e)}')
-                    failed_cases += 1
+    global_logger.debug('测试用例ID: %s', testcase["id"])
+    global_logger.debug('request_params原始值: %r', testcase["request_params"])
 
-                    # 更新批次进度
-                    update_batch_progress(batch_id, passed_cases, failed_cases)
+    if testcase['request_params']:
+        try:
+            params_data = json.loads(testcase['request_params'])
+            global_logger.debug('解析params_data成功: %s', params_data)
 
-            # 所有测试用例执行完成后，进行最终统计
-            finalize_test_batch(batch_id)
-            global_logger.info(f'同步执行批量测试用例完成，批次ID: {batch_id}，通过: {passed_cases}，失败: {failed_cases}')
+            # 处理GET请求参数
+            if request_method == 'GET':
+                request_params = params_data
+            # 处理POST/PUT/DELETE请求体
+            elif request_method in ['POST', 'PUT', 'DELETE', 'PATCH']:
+                request_json = params_data
+                if 'Content-Type' not in request_headers:
+                    request_headers['Content-Type'] = 'application/json'
+        except Exception as e:
+            global_logger.error(f'解析测试用例请求参数异常: {str(e)}')
+
+    global_logger.debug('准备执行HTTP请求, URL: %s, 方法: %s', request_url, request_method)
+    global_logger.debug('请求头: %s', request_headers)
+    global_logger.debug('请求参数 (params): %s', request_params)
+    global_logger.debug('请求JSON (json): %s', request_json)
+
+    return {
+        'url': request_url,
+        'method': request_method,
+        'headers': request_headers,
+        'params': request_params,
+        'data': request_data,
+        'json': request_json
+    }
+
+
+def to_query_items(params):
+    """
+    将GET参数转换为aiohttp可接受的查询参数列表，与requests的编码规则保持一致
+    """
+    if not params:
+        return None
+    if not isinstance(params, dict):
+        return params
+
+    items = []
+    for key, value in params.items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for item in values:
+            if item is None:
+                continue
+            items.append((str(key), item if isinstance(item, str) else str(item)))
+    return items
+
+
+def run_pre_script(testcase):
+    """
+    执行前置脚本
+    """
+    if testcase['pre_script']:
+        global_logger.debug('执行前置脚本, 测试用例ID: %s', testcase["id"])
+        try:
+            # 这里可以实现执行前置脚本的逻辑
+            pass
+        except Exception as e:
+            global_logger.error(f'执行前置脚本异常: {str(e)}')
+
+
+def run_post_script(testcase):
+    """
+    执行后置脚本
+    """
+    if testcase['post_script']:
+        global_logger.debug('执行后置脚本, 测试用例ID: %s', testcase["id"])
+        try:
+            # 这里可以实现执行后置脚本的逻辑
+            pass
+        except Exception as e:
+            global_logger.error(f'执行后置脚本异常: {str(e)}')
+
+
+def send_testcase_request(request_spec, session=None):
+    """
+    按build_testcase_request组装的请求发送HTTP请求
+
+    参数:
+        request_spec: 请求参数字典
+        session: 指定使用的会话，缺省按目标主机取复用会话
+
+    返回:
+        requests.Response
+    """
+    request_url = request_spec['url']
+    if session is None:
+        session = http_session.get_session(request_url)
+
+    if request_spec['method'] == 'GET':
+        return session.get(
+            url=request_url,
+            headers=request_spec['headers'],
+            params=request_spec['params'],
+            timeout=config.HTTP_REQUEST_TIMEOUT
+        )
+
+    # POST/PUT/DELETE等方法
+    return session.request(
+        method=request_spec['method'],
+        url=request_url,
+        headers=request_spec['headers'],
+        json=request_spec['json'],  # 只使用json参数
+        timeout=config.HTTP_REQUEST_TIMEOUT
+    )
+
+
+def decode_response_body(response_content, encoding=None):
+    """
+    解码响应体，能解析为JSON时返回JSON对象，否则返回原始文本
+
+    参数:
+        response_content: 响应原始字节
+        encoding: 响应声明的字符集，缺省按utf-8解码
+
+    返回:
+        (response_body, response_body_str) 元组
+    """
+    try:
+        response_body_str = response_content.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:
+        response_body_str = response_content.decode('utf-8', errors='replace')
+
+    try:
+        response_body = json.loads(response_body_str)
+    except Exception:
+        response_body = response_body_str
+
+    return response_body, response_body_str
+
+
+def parse_response_body(response_content, encoding=None):
+    """
+    解析响应体并按采样记录日志
+
+    响应内容只解码一次，保存与断言都使用原始文本，不再把解析后的JSON重新序列化。
+
+    参数:
+        response_content: 响应原始字节
+        encoding: 响应声明的字符集，缺省按utf-8解码
+
+    返回:
+        (response_body, response_body_str) 元组
+    """
+    response_body, response_body_str = decode_response_body(response_content, encoding)
+
+    log_response_body(response_body_str)
+
+    return response_body, response_body_str
+
+
+def log_response_body(response_body_str):
+    """
+    记录响应内容：DEBUG级别时全部记录，否则按配置的采样率截断记录，避免响应体日志占用大量IO
+    """
+    if global_logger.isEnabledFor(logging.DEBUG):
+        global_logger.debug('响应内容: %s', response_body_str)
+    elif config.LOG_RESPONSE_BODY_SAMPLE_RATE and random.random() < config.LOG_RESPONSE_BODY_SAMPLE_RATE:
+        global_logger.info('响应内容(采样): %s', response_body_str[:config.LOG_RESPONSE_BODY_MAX_LENGTH])
+
+
+def complete_testcase_execution(testcase, request_spec, result_id, response_status, response_headers,
+                                response_content, execution_time, start_time, current_user=None, batch_id=None,
+                                result_writer=None, response_encoding=None):
+    """
+    请求完成后执行断言、后置脚本并保存测试结果，同步与异步执行路径共用
+
+    返回:
+        包含执行结果的字典
+    """
+    request_method = request_spec['method']
+    executor_id = current_user.get('id') if current_user else None
+    executor_name = current_user.get('username') if current_user else None
+
+    # 获取响应信息
+    response_body, response_body_str = parse_response_body(response_content, response_encoding)
+
+    global_logger.debug('HTTP请求执行完成, 状态码: %s, 执行时间: %sms', response_status, execution_time)
+    # HTTP请求完成后记录指标
+    metrics.record_http_request(
+        method=request_method,
+        status_code=response_status,
+        duration_seconds=execution_time / 1000
+    )
+
+    # 执行断言
+    is_success, assertion_results = evaluate_assertions(testcase, response_status, response_body,
+                                                        response_body_str, response_headers, execution_time)
+
+    # 执行后置脚本
+    run_post_script(testcase)
+
+    # 保存测试结果（无论是否配置断言都要落库，否则批量统计会把该用例计为失败）
+    current_time = int(time.time())
+    request_data = request_spec['data']
+    request_json = request_spec['json']
+
+    params = [
+        result_id,
+        testcase['id'],
+        testcase['interface_id'],
+        testcase['app_id'],
+        batch_id,  # batch_id为空，表示单独执行
+        request_spec['url'],
+        request_method,
+        json.dumps(request_spec['headers']),
+        json.dumps(request_data if request_data else request_json) if (
+                request_data or request_json) else None,
+        response_status,
+        json.dumps(response_headers),
+        body_codec.encode_body(response_body_str, testcase['app_id']),
+        json.dumps(assertion_results),
+        is_success,
+        None,  # error_message
+        execution_time,
+        executor_id,
+        executor_name,
+        current_time,
+        ' '
+    ]
+
+    global_logger.debug('保存测试结果，结果ID: %s', result_id)
+    save_testcase_result(params, result_writer)
+
+    test_duration = time.time() - start_time
+    metrics.record_test_result(
+        success=is_success,
+        duration_seconds=test_duration
+    )
+
+    return {
+        'result_id': result_id,
+        'testcase_id': testcase['id'],
+        'request_url': request_spec['url'],
+        'request_method': request_method,
+        'response_status': response_status,
+        'is_success': is_success,
+        'execution_time': execution_time,
+        'execute_time': current_time
+    }
+
+
+def record_testcase_failure(testcase, request_spec, result_id, error_message, execution_time, start_time,
+                            current_user=None, batch_id=None, result_writer=None):
+    """
+    HTTP请求失败时保存失败结果，同步与异步执行路径共用
+
+    返回:
+        包含执行结果的字典
+    """
+    executor_id = current_user.get('id') if current_user else None
+    executor_name = current_user.get('username') if current_user else None
+    request_json = request_spec['json']
+
+    # 保存错误结果
+    current_time = int(time.time())
+
+    params = [
+        result_id,
+        testcase['id'],
+        testcase['interface_id'],
+        testcase['app_id'],
+        batch_id,  # batch_id为空，表示单独执行
+        request_spec['url'],
+        request_spec['method'],
+        json.dumps(request_spec['headers']),
+        json.dumps(request_json, ensure_ascii=False) if request_json else None,
+        None,  # response_status
+        None,  # response_headers
+        None,  # response_body
+        None,  # assertion_results
+        False,  # is_success
+        error_message,  # error_message
+        execution_time,
+        executor_id,
+        executor_name,
+        current_time,
+        ' '
+    ]
+
+    global_logger.debug('保存测试结果（失败），结果ID: %s', result_id)
+    save_testcase_result(params, result_writer)
+
+    test_duration = time.time() - start_time
+    metrics.record_test_result(
+        success=False,
+        duration_seconds=test_duration
+    )
+
+    # 返回测试结果
+    return {
+        'result_id': result_id,
+        'testcase_id': testcase['id'],
+        'request_url': request_spec['url'],
+        'request_method': request_spec['method'],
+        'response_status': None,
+        'is_success': False,
+        'execution_time': execution_time,
+        'execute_time': current_time,
+        'error_message': error_message
+    }
+
+
+def load_testcase_context(testcase_id, environment):
+    """
+    查询测试用例及其环境配置
+
+    参数:
+        testcase_id: 测试用例ID
+        environment: 执行环境
+
+    返回:
+        (testcase, env_config) 元组
+    """
+    conn = mysql_pool.connection()
+    cursor = conn.cursor()
+
+    try:
+        # 查询测试用例
+        sql = """
+            SELECT id, interface_id, app_id, name, priority, request_url, request_method,
+                   request_headers, request_params, expected_status, assertions,
+                   pre_script, post_script
+            FROM api_testcase
+            WHERE id = %s
+        """
+        global_logger.debug('执行SQL: %s, 参数: [%s]', sql, testcase_id)
+        cursor.execute(sql, [testcase_id])
+        testcase = cursor.fetchone()
+
+        if not testcase:
+            global_logger.error(f'未找到测试用例, ID: {testcase_id}')
+            raise Exception(f"未找到测试用例: {testcase_id}")
+
+        global_logger.debug('获取测试用例信息成功, 名称: %s', testcase["name"])
+
+        # 获取环境配置
+        env_sql = """
+            SELECT base_url, headers, global_variables
+            FROM api_environment
+            WHERE app_id = %s AND env = %s
+        """
+        global_logger.debug('执行SQL: %s, 参数: [%s, %s]', env_sql, testcase["app_id"], environment)
+        cursor.execute(env_sql, [testcase["app_id"], environment])
+        env_config = cursor.fetchone()
+
+        if not env_config:
+            global_logger.error(f'未找到环境配置, 应用ID: {testcase["app_id"]}, 环境: {environment}')
+            raise Exception(f"未找到环境配置: app_id={testcase['app_id']}, environment={environment}")
+
+        global_logger.debug('获取环境配置成功, 基础URL: %s', env_config["base_url"])
+
+        return testcase, env_config
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def prefetch_testcase_contexts(testcase_ids, environment):
+    """
+    批量预取一组测试用例及其环境配置，供批次执行期间复用
+
+    测试用例按分片使用 WHERE id IN (...) 查询，环境配置按 (app_id, env) 各查询一次。
+
+    参数:
+        testcase_ids: 测试用例ID列表
+        environment: 执行环境
+
+    返回:
+        包含testcases与environments两个映射的字典
+    """
+    testcases = {}
+    environments = {}
+    unique_ids = list(dict.fromkeys(testcase_ids))
+    prefetch_size = max(1, config.BATCH_PREFETCH_SIZE)
+
+    conn = mysql_pool.connection()
+    cursor = conn.cursor()
+
+    try:
+        for i in range(0, len(unique_ids), prefetch_size):
+            chunk = unique_ids[i:i + prefetch_size]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            sql = f"""
+                SELECT id, interface_id, app_id, name, priority, request_url, request_method,
+                       request_headers, request_params, expected_status, assertions,
+                       pre_script, post_script
+                FROM api_testcase
+                WHERE id IN ({placeholders})
+            """
+            cursor.execute(sql, chunk)
+            for row in cursor.fetchall():
+                testcases[str(row['id'])] = row
+
+        app_ids = list(dict.fromkeys(row['app_id'] for row in testcases.values()))
+        if app_ids:
+            placeholders = ', '.join(['%s'] * len(app_ids))
+            env_sql = f"""
+                SELECT app_id, base_url, headers, global_variables
+                FROM api_environment
+                WHERE env = %s AND app_id IN ({placeholders})
+            """
+            cursor.execute(env_sql, [environment] + app_ids)
+            for row in cursor.fetchall():
+                environments.setdefault((row['app_id'], environment), row)
+
+        global_logger.info(f'预取测试用例完成，用例数量: {len(testcases)}/{len(unique_ids)}，环境配置数量: {len(environments)}')
+
+        return {
+            'testcases': testcases,
+            'environments': environments
+        }
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def resolve_testcase_context(batch_context, testcase_id, environment):
+    """
+    从批次预取结果中取出测试用例及其环境配置，找不到时与load_testcase_context抛出相同的异常
+
+    返回:
+        (testcase, env_config) 元组
+    """
+    testcase = batch_context['testcases'].get(str(testcase_id))
+    if not testcase:
+        global_logger.error(f'未找到测试用例, ID: {testcase_id}')
+        raise Exception(f"未找到测试用例: {testcase_id}")
+
+    env_config = batch_context['environments'].get((testcase['app_id'], environment))
+    if not env_config:
+        global_logger.error(f'未找到环境配置, 应用ID: {testcase["app_id"]}, 环境: {environment}')
+        raise Exception(f"未找到环境配置: app_id={testcase['app_id']}, environment={environment}")
+
+    return testcase, env_config
+
+
+def load_batch_context(batch_id, testcase_ids, environment):
+    """
+    为批次预取测试用例与环境配置，预取失败时返回None，由各用例退回逐条查询
+    """
+    try:
+        return prefetch_testcase_contexts(testcase_ids, environment)
+    except Exception as e:
+        global_logger.error(f'预取测试用例异常，批次ID: {batch_id}，将逐条查询，错误: {str(e)}')
+        return None
+
+
+def evaluate_assertions(testcase, response_status, response_body, response_body_str, response_headers=None,
+                        execution_time=None):
+    """
+    执行测试用例断言
+
+    断言JSON按测试用例编译为断言计划并缓存，重复执行同一用例时不再解析。
+
+    参数:
+        testcase: 测试用例数据
+        response_status: 响应状态码
+        response_body: 响应体（JSON解析后的对象或原始文本）
+        response_body_str: 响应体字符串
+        response_headers: 响应头
+        execution_time: 响应时间(毫秒)
+
+    返回:
+        (is_success, assertion_results) 元组
+    """
+    if not testcase['assertions']:
+        return True, []
+
+    plan = assertions.get_assertion_plan(testcase['id'], testcase['assertions'])
+    context = assertions.AssertionContext(response_status, response_headers, response_body, response_body_str,
+                                          execution_time)
+    is_success, assertion_results = plan.evaluate(context)
+
+    for assertion_result in assertion_results:
+        metrics.record_assertion_result(assertion_result['result'])
+
+    if plan.error:
+        global_logger.error(f'执行断言过程异常: {plan.error}')
+    global_logger.debug('断言执行完成, 测试用例ID: %s, 是否通过: %s', testcase["id"], is_success)
+
+    return is_success, assertion_results
+
+
+def save_testcase_result(params, result_writer=None):
+    """
+    保存单条测试结果到api_result
+
+    参数:
+        params: 与INSERT语句字段顺序一致的参数列表
+        result_writer: 批次结果写入器，指定时交由写入器缓冲后批量写入
+    """
+    if result_writer is not None:
+        result_writer.add(params)
+        return
+
+    conn = mysql_pool.connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(RESULT_INSERT_SQL, params)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def normalize_concurrency(concurrency, execution_mode='thread'):
+    """
+    规范化批次并发数，未指定时使用默认值，并限制在配置的上限内
+
+    asyncio执行模式下并发数表示同时在途的请求数，使用单独的默认值与上限。
+    """
+    if execution_mode == 'async':
+        default_concurrency = config.ASYNC_EXECUTE_CONCURRENCY
+        max_concurrency = config.ASYNC_EXECUTE_MAX_CONCURRENCY
+    else:
+        default_concurrency = config.BATCH_EXECUTE_CONCURRENCY
+        max_concurrency = config.BATCH_EXECUTE_MAX_CONCURRENCY
+
+    try:
+        concurrency = int(concurrency) if concurrency else default_concurrency
+    except (TypeError, ValueError):
+        concurrency = default_concurrency
+
+    return max(1, min(concurrency, max_concurrency))
+
+
+def normalize_execution_mode(execution_mode):
+    """
+    规范化批次执行模式，未安装aiohttp时asyncio模式回退为线程池模式
+    """
+    if execution_mode not in EXECUTION_MODES:
+        execution_mode = config.BATCH_EXECUTION_MODE
+
+    if execution_mode == 'async' and aiohttp is None:
+        global_logger.warning('未安装aiohttp，asyncio执行模式回退为线程池模式')
+        execution_mode = 'thread'
+
+    return execution_mode
+
+
+def run_batch_testcases(batch_id, testcase_ids, environment, current_user, concurrency=None,
+                        collect_results=False, execution_mode=None, latency=None):
+    """
+    按批次的执行模式执行一组测试用例
+
+    参数:
+        latency: 批次延迟统计，指定时在结果写入时累计执行时间
+
+    返回:
+        (passed_cases, failed_cases, results) 元组
+    """
+    execution_mode = normalize_execution_mode(execution_mode)
+
+    if execution_mode == 'async':
+        return run_testcases_async(batch_id, testcase_ids, environment, current_user, concurrency,
+                                   collect_results, latency)
+
+    return run_testcases_concurrently(batch_id, testcase_ids, environment, current_user, concurrency,
+                                      collect_results, latency)
+
+
+def run_testcases_concurrently(batch_id, testcase_ids, environment, current_user, concurrency=None,
+                               collect_results=False, latency=None):
+    """
+    使用线程池并发执行一组测试用例
+
+    通过/失败计数只在调度线程中累加，工作线程只负责执行用例；
+    测试结果经ResultWriter批量写入，批次进度在每次刷新时以增量方式累加，
+    多个分片任务同时执行同一批次时也不会互相覆盖。
+
+    参数:
+        batch_id: 批次ID
+        testcase_ids: 测试用例ID列表
+        environment: 执行环境
+        current_user: 当前用户信息
+        concurrency: 并发数，为空时使用默认配置
+        collect_results: 是否收集并返回每个用例的执行结果
+        latency: 批次延迟统计（BatchLatency）
+
+    返回:
+        (passed_cases, failed_cases, results) 元组
+    """
+    concurrency = normalize_concurrency(concurrency)
+    total_cases = len(testcase_ids)
+    global_logger.info(f'并发执行测试用例，批次ID: {batch_id}，用例数量: {total_cases}，并发数: {concurrency}')
+
+    passed_cases = 0
+    failed_cases = 0
+    results = []
+
+    # 批次内的用例与环境配置一次性预取，执行期间不再逐条查询
+    batch_context = load_batch_context(batch_id, testcase_ids, environment)
+
+    result_writer = ResultWriter(mysql_pool, batch_id,
+                                 on_flush=lambda passed, failed: increment_batch_progress(batch_id, passed, failed),
+                                 latency=latency)
+
+    def _execute(testcase_id):
+        try:
+            return execute_batch_testcase(batch_id, testcase_id, environment, current_user, batch_context,
+                                          result_writer)
+        except Exception as e:
+            global_logger.error(f'执行测试用例异常，用例ID: {testcase_id}, 错误: {str(e)}')
+            return {
+                'testcase_id': testcase_id,
+                'is_success': False,
+                'error_message': str(e),
+                'result_id': None
+            }
+
+    with result_writer, concurrent.futures.ThreadPoolExecutor(max_workers=concurrency,
+                                                              thread_name_prefix=f'batch-{batch_id}') as executor:
+        futures = [executor.submit(_execute, testcase_id) for testcase_id in testcase_ids]
+
+        for completed, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            result = future.result()
+            if result and result.get('is_success'):
+                passed_cases += 1
+            else:
+                failed_cases += 1
+                # 未能生成结果行的用例不会经过写入器，直接计入失败
+                if not result or not result.get('result_id'):
+                    increment_batch_progress(batch_id, 0, 1)
+
+            if collect_results:
+                results.append(result)
+
+            metrics.update_queue_length(total_cases - completed)
+
+    return passed_cases, failed_cases, results
+
+
+def run_testcases_async(batch_id, testcase_ids, environment, current_user, concurrency=None,
+                        collect_results=False, latency=None):
+    """
+    使用asyncio客户端执行一组测试用例，单个进程即可保持大量请求同时在途
+
+    参数与返回值同run_testcases_concurrently。
+    """
+    concurrency = normalize_concurrency(concurrency, 'async')
+    global_logger.info(f'asyncio执行测试用例，批次ID: {batch_id}，用例数量: {len(testcase_ids)}，并发数: {concurrency}')
+
+    return asyncio.run(_run_testcases_async(batch_id, testcase_ids, environment, current_user, concurrency,
+                                            collect_results, latency))
+
+
+async def _run_testcases_async(batch_id, testcase_ids, environment, current_user, concurrency, collect_results,
+                               latency=None):
+    loop = asyncio.get_running_loop()
+    total_cases = len(testcase_ids)
+
+    passed_cases = 0
+    failed_cases = 0
+    results = []
+
+    semaphore = asyncio.Semaphore(concurrency)
+    db_executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.ASYNC_DB_WORKERS,
+                                                        thread_name_prefix=f'batch-db-{batch_id}')
+    result_writer = ResultWriter(mysql_pool, batch_id,
+                                 on_flush=lambda passed, failed: increment_batch_progress(batch_id, passed, failed),
+                                 latency=latency)
+    connector = aiohttp.TCPConnector(limit=concurrency, force_close=not config.HTTP_KEEP_ALIVE)
+    timeout = aiohttp.ClientTimeout(total=config.HTTP_REQUEST_TIMEOUT)
+
+    async def _execute(session, testcase_id, batch_context):
+        async with semaphore:
+            try:
+                return await execute_single_testcase_async(session, db_executor, testcase_id, environment,
+                                                           current_user, batch_id, batch_context, result_writer)
+            except Exception as e:
+                global_logger.error(f'执行测试用例异常，用例ID: {testcase_id}, 错误: {str(e)}')
+                return {
+                    'testcase_id': testcase_id,
+                    'is_success': False,
+                    'error_message': str(e),
+                    'result_id': None
+                }
+
+    try:
+        # 批次内的用例与环境配置一次性预取，执行期间不再逐条查询
+        batch_context = await loop.run_in_executor(db_executor, load_batch_context, batch_id, testcase_ids,
+                                                   environment)
+
+        # 用例之间不共享Cookie，与线程池模式保持一致
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         cookie_jar=aiohttp.DummyCookieJar()) as session:
+            tasks = [asyncio.ensure_future(_execute(session, testcase_id, batch_context))
+                     for testcase_id in testcase_ids]
+
+            for completed, future in enumerate(asyncio.as_completed(tasks), 1):
+                result = await future
+                if result and result.get('is_success'):
+                    passed_cases += 1
+                else:
+                    failed_cases += 1
+                    # 未能生成结果行的用例不会经过写入器，直接计入失败
+                    if not result or not result.get('result_id'):
+                        await loop.run_in_executor(db_executor, increment_batch_progress, batch_id, 0, 1)
+
+                if collect_results:
+                    results.append(result)
+
+                metrics.update_queue_length(total_cases - completed)
+    finally:
+        await loop.run_in_executor(db_executor, result_writer.close)
+        db_executor.shutdown(wait=True)
+
+    return passed_cases, failed_cases, results
+
+
+@celery.task(bind=False)
+def execute_batch_testcases_async(batch_id, testcase_ids, environment, current_user, concurrency=None,
+                                  execution_mode=None):
+    """
+    异步执行批量测试用例
+    """
+    global_logger.info(f'开始异步执行批量测试用例，批次ID: {batch_id}，用例数量: {len(testcase_ids)}，并发数: {concurrency}')
+
+    metrics.update_queue_length(len(testcase_ids))
+    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='running').set(1)
+    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='completed').set(0)
+    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='failed').set(0)
+
+    total_cases = len(testcase_ids)
+    latency = BatchLatency()
+
+    try:
+        passed_cases, failed_cases, _ = run_batch_testcases(batch_id, testcase_ids, environment, current_user,
+                                                            concurrency, execution_mode=execution_mode,
+                                                            latency=latency)
+
+        # 所有测试用例执行完成后，进行最终统计
+        finalize_test_batch(batch_id, latency)
+        global_logger.info(f'异步执行批量测试用例完成，批次ID: {batch_id}，通过: {passed_cases}，失败: {failed_cases}')
+
+        metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='running').set(0)
+        metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='completed').set(1)
+        metrics.BATCH_COMPLETION.labels(batch_id=str(batch_id)).set(1)
+        success_rate = passed_cases / total_cases if total_cases > 0 else 0
+        metrics.BATCH_SUCCESS_RATE.labels(batch_id=str(batch_id)).set(success_rate)
+
+    except Exception as e:
+        global_logger.error(f'异步执行批量测试用例异常: {str(e)}')
+        global_logger.error(traceback.format_exc())
+
+        # 更新批次状态为异常
+        update_batch_status(batch_id, status=3)
+
+        metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='running').set(0)
+        metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='failed').set(1)
+
+    finally:
+        metrics.update_queue_length(0)
+
+
+def normalize_chunk_size(chunk_size):
+    """
+    规范化批次分片大小，未指定或不合法时使用默认配置
+    """
+    try:
+        chunk_size = int(chunk_size) if chunk_size else config.BATCH_CHUNK_SIZE
+    except (TypeError, ValueError):
+        chunk_size = config.BATCH_CHUNK_SIZE
+
+    return max(1, chunk_size)
+
+
+def dispatch_batch_execution(batch_id, testcase_ids, environment, current_user, concurrency=None, chunk_size=None,
+                             execution_mode=None, on_complete=None, on_error=None):
+    """
+    将批次按分片拆成多个Celery子任务分发到各个worker执行，
+    全部分片完成后由chord回调执行一次finalize_test_batch
+
+    参数:
+        batch_id: 批次ID
+        testcase_ids: 测试用例ID列表
+        environment: 执行环境
+        current_user: 当前用户信息
+        concurrency: 每个分片内的并发数
+        chunk_size: 分片大小
+        execution_mode: 执行模式，thread或async
+        on_complete: 批次汇总完成后串联执行的任务签名，接收finalize_test_batch_task的返回值
+        on_error: 批次汇总失败时额外执行的任务签名
+
+    返回:
+        分片数量
+    """
+    chunk_size = normalize_chunk_size(chunk_size)
+    chunks = [testcase_ids[i:i + chunk_size] for i in range(0, len(testcase_ids), chunk_size)]
+
+    global_logger.info(f'批次分片执行，批次ID: {batch_id}，用例数量: {len(testcase_ids)}，'
+                       f'分片大小: {chunk_size}，分片数量: {len(chunks)}')
+
+    # 分片以增量方式累加进度，分发前先清零
+    update_batch_progress(batch_id, 0, 0)
+
+    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='running').set(1)
+    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='completed').set(0)
+    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='failed').set(0)
+
+    header = group(
+        execute_testcase_chunk.s(batch_id, chunk, environment, current_user, concurrency, index, execution_mode)
+        for index, chunk in enumerate(chunks)
+    )
+    callback = finalize_test_batch_task.s(batch_id, len(testcase_ids))
+    callback.on_error(mark_test_batch_failed.si(batch_id))
+    if on_error is not None:
+        callback.on_error(on_error)
+    if on_complete is not None:
+        callback = callback | on_complete
+    chord(header)(callback)
+
+    return len(chunks)
+
+
+@celery.task(bind=False)
+def execute_testcase_chunk(batch_id, testcase_ids, environment, current_user, concurrency=None, chunk_index=0,
+                           execution_mode=None):
+    """
+    执行批次中的一个分片
+
+    分片内部的任何异常都在此处兜底，保证chord回调一定会被触发。
+
+    返回:
+        包含分片序号、通过/失败数及延迟直方图的字典
+    """
+    global_logger.info(f'开始执行批次分片，批次ID: {batch_id}，分片: {chunk_index}，用例数量: {len(testcase_ids)}')
+    latency = BatchLatency()
+
+    try:
+        passed_cases, failed_cases, _ = run_batch_testcases(batch_id, testcase_ids, environment, current_user,
+                                                            concurrency, execution_mode=execution_mode,
+                                                            latency=latency)
+    except Exception as e:
+        global_logger.error(f'执行批次分片异常，批次ID: {batch_id}，分片: {chunk_index}，错误: {str(e)}')
+        global_logger.error(traceback.format_exc())
+        passed_cases, failed_cases = 0, len(testcase_ids)
+    finally:
+        metrics.update_queue_length(0)
+
+    global_logger.info(f'批次分片执行完成，批次ID: {batch_id}，分片: {chunk_index}，通过: {passed_cases}，失败: {failed_cases}')
+
+    save_chunk_latency(mysql_pool, batch_id, chunk_index, latency)
+
+    return {
+        'chunk_index': chunk_index,
+        'passed_cases': passed_cases,
+        'failed_cases': failed_cases,
+        'latency': latency.to_dict()
+    }
+
+
+@celery.task(bind=False)
+def finalize_test_batch_task(chunk_results, batch_id, total_cases):
+    """
+    chord回调：所有分片执行完成后汇总批次结果
+    """
+    passed_cases = sum(r.get('passed_cases', 0) for r in chunk_results if r)
+    failed_cases = sum(r.get('failed_cases', 0) for r in chunk_results if r)
+    global_logger.info(f'批次全部分片执行完成，批次ID: {batch_id}，分片数量: {len(chunk_results)}，'
+                       f'通过: {passed_cases}，失败: {failed_cases}')
+
+    # 合并各分片的延迟直方图，不再扫描api_result计算百分位
+    latency = BatchLatency()
+    for chunk_result in chunk_results:
+        if chunk_result:
+            latency.merge(BatchLatency.from_dict(chunk_result.get('latency')))
+
+    finalize_test_batch(batch_id, latency)
+
+    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='running').set(0)
+    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='completed').set(1)
+    metrics.BATCH_COMPLETION.labels(batch_id=str(batch_id)).set(1)
+    success_rate = passed_cases / total_cases if total_cases > 0 else 0
+    metrics.BATCH_SUCCESS_RATE.labels(batch_id=str(batch_id)).set(success_rate)
+
+    return {
+        'batch_id': batch_id,
+        'passed_cases': passed_cases,
+        'failed_cases': failed_cases
+    }
+
+
+@celery.task(bind=False)
+def mark_test_batch_failed(batch_id):
+    """
+    chord执行失败时将批次标记为异常
+    """
+    global_logger.error(f'批次分片执行失败，标记批次为异常，批次ID: {batch_id}')
+    update_batch_status(batch_id, status=3)
+
+    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='running').set(0)
+    metrics.BATCH_STATUS.labels(batch_id=str(batch_id), status='failed').set(1)
+
+
+@celery.task(bind=False)
+def index_batch_failures(batch_id):
+    """
+    将批次的失败结果归入失败聚类索引，批次完成后提交
+    """
+    get_failure_cluster_index().index_batch(batch_id)
+
+
+@celery.task(bind=False)
+def backfill_failure_clusters(limit=None):
+    """
+    索引尚未索引的已完成批次，可由celery beat定时调度
+    """
+    count = get_failure_cluster_index().backfill(limit)
+    global_logger.info(f'失败聚类补偿索引完成，处理批次数: {count}')
+
+
+def execute_batch_testcases_sync(batch_id, testcase_ids, environment, current_user, concurrency=None,
+                                 execution_mode=None):
+    """
+    同步执行批量测试用例
+
+    参数:
+        batch_id: 批次ID
+        testcase_ids: 测试用例ID列表
+        environment: 执行环境
+        current_user: 当前用户信息
+        concurrency: 并发数，为空时使用默认配置
+        execution_mode: 执行模式，thread或async
+
+    返回:
+        包含所有测试结果的列表
+    """
+    with app.app_context():
+        global_logger.info(f'开始同步执行批量测试用例，批次ID: {batch_id}，用例数量: {len(testcase_ids)}')
+
+        results = []
+        latency = BatchLatency()
+
+        try:
+            passed_cases, failed_cases, results = run_batch_testcases(
+                batch_id, testcase_ids, environment, current_user, concurrency, collect_results=True,
+                execution_mode=execution_mode, latency=latency)
+
+            # 所有测试用例执行完成后，进行最终统计
+            finalize_test_batch(batch_id, latency)
+            global_logger.info(f'同步执行批量测试用例完成，批次ID: {batch_id}，通过: {passed_cases}，失败: {failed_cases}')
             return results
 
         except Exception as e:
@@ -1241,7 +2126,7 @@ def execute_batch_testcases_sync(batch_id, testcase_ids, environment, current_us
             return results
 
 
-def execute_batch_testcase(batch_id, testcase_id, environment, current_user):
+def execute_batch_testcase(batch_id, testcase_id, environment, current_user, batch_context=None, result_writer=None):
     """
     执行批量测试中的单个测试用例
 
@@ -1250,39 +2135,26 @@ def execute_batch_testcase(batch_id, testcase_id, environment, current_user):
         testcase_id: 测试用例ID
         environment: 执行环境
         current_user: 当前用户信息
+        batch_context: 批次预取的用例与环境配置
+        result_writer: 批次结果写入器，结果在写入时直接带上batch_id
 
     返回:
         包含执行结果的字典
     """
-    global_logger.info(f'执行批量测试中的单个测试用例，批次ID: {batch_id}，用例ID: {testcase_id}')
-
-    conn = None
-    cursor = None
+    global_logger.debug('执行批量测试中的单个测试用例，批次ID: %s，用例ID: %s', batch_id, testcase_id)
 
     try:
         # 执行测试用例
-        result = execute_single_testcase(testcase_id, environment, {}, current_user)
+        result = execute_single_testcase(testcase_id, environment, {}, current_user, batch_context,
+                                         batch_id=batch_id, result_writer=result_writer)
 
         # 记录执行结果
-        global_logger.info(f'execute_single_testcase 返回结果: {result}')
-        global_logger.info(f'返回结果类型: {type(result)}')
-
-        # 更新结果的batch_id
-        conn = mysql_pool.connection()
-        cursor = conn.cursor()
+        global_logger.debug('execute_single_testcase 返回结果: %s', result)
 
-        if result and result.get('result_id'):  # 检查result和result_id都存在
-            sql = "UPDATE api_result SET batch_id = %s WHERE id = %s"
-            global_logger.info(f'执行SQL: {sql}, 参数: [{batch_id}, {result["result_id"]}]')
-            cursor.execute(sql, [batch_id, result["result_id"]])
-            global_logger.info(f'执行SQL完成了')
-            conn.commit()
-        else:
+        if not result or not result.get('result_id'):
             global_logger.error(f'执行测试用例失败，无法获取结果ID，测试用例ID: {testcase_id}')
-            # 即使没有result_id，也要提交事务
-            conn.commit()
 
-            # 确保返回统一格式的结果
+        # 确保返回统一格式的结果
         if result:
             return result
         else:
@@ -1298,14 +2170,7 @@ def execute_batch_testcase(batch_id, testcase_id, environment, current_user):
         global_logger.error(f'执行批量测试中的单个测试用例异常，批次ID: {batch_id}，用例ID: {testcase_id}，错误: {str(e)}')
         global_logger.error(traceback.format_exc())
 
-        # 确保数据库连接正常关闭
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-
-                # 返回失败结果
+        # 返回失败结果
         return {
             'testcase_id': testcase_id,
             'is_success': False,
@@ -1313,18 +2178,6 @@ def execute_batch_testcase(batch_id, testcase_id, environment, current_user):
             'result_id': None
         }
 
-    finally:
-        # 确保数据库连接被正确关闭
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if conn:
-            try:
-                conn.close()
-            except:
-                pass
 
 def create_test_batch(batch_id, app_id, test_request_id, name, total_cases, current_user, ai_generated=0):
     """
@@ -1430,6 +2283,59 @@ def update_batch_progress(batch_id, passed_cases, failed_cases):
         conn.close()
 
 
+def get_batch_progress(batch_id):
+    """
+    查询测试批次进度
+
+    参数:
+        batch_id: 批次ID
+
+    返回:
+        (passed_cases, failed_cases) 元组，批次不存在时均为0
+    """
+    conn = mysql_pool.connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT passed_cases, failed_cases FROM api_test_batch WHERE id = %s", [batch_id])
+        result = cursor.fetchone()
+        if not result:
+            return 0, 0
+        return result['passed_cases'] or 0, result['failed_cases'] or 0
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def increment_batch_progress(batch_id, passed_delta, failed_delta):
+    """
+    以增量方式累加测试批次进度
+
+    参数:
+        batch_id: 批次ID
+        passed_delta: 新增通过用例数
+        failed_delta: 新增失败用例数
+    """
+    conn = mysql_pool.connection()
+    cursor = conn.cursor()
+
+    try:
+        sql = """
+                UPDATE api_test_batch
+                SET passed_cases = passed_cases + %s, failed_cases = failed_cases + %s
+                WHERE id = %s
+            """
+        cursor.execute(sql, [passed_delta, failed_delta, batch_id])
+        conn.commit()
+
+    except Exception as e:
+        global_logger.error(f'累加测试批次进度异常，ID: {batch_id}，错误: {str(e)}')
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
+
 def update_batch_status(batch_id, status=2):
     """
     更新测试批次状态
@@ -1468,6 +2374,327 @@ def update_batch_status(batch_id, status=2):
         conn.close()
 
 
+@celery.task(bind=False)
+def execute_load_test(load_test_id, testcases, environment, duration, concurrency, target_rps=None,
+                      check_assertions=True):
+    """
+    执行压测任务
+
+    参数:
+        load_test_id: 压测ID
+        testcases: 测试用例及权重列表，[{"id": 用例ID, "weight": 权重}]
+        environment: 执行环境
+        duration: 持续时间(秒)
+        concurrency: 虚拟用户数
+        target_rps: 目标每秒请求数，为空时虚拟用户不限速
+        check_assertions: 是否执行用例断言
+    """
+    global_logger.info(f'开始执行压测，压测ID: {load_test_id}，用例数量: {len(testcases)}，'
+                       f'并发数: {concurrency}，目标RPS: {target_rps}，时长: {duration}s')
+
+    try:
+        # 用例与环境配置只查询一次，请求在压测开始前组装好
+        batch_context = prefetch_testcase_contexts([item['id'] for item in testcases], environment)
+        targets = []
+        for item in testcases:
+            testcase, env_config = resolve_testcase_context(batch_context, item['id'], environment)
+            plan = None
+            if check_assertions and testcase['assertions']:
+                plan = assertions.get_assertion_plan(testcase['id'], testcase['assertions'])
+            targets.append({
+                'testcase': testcase,
+                'request_spec': build_testcase_request(testcase, env_config),
+                'plan': plan,
+                'weight': item['weight']
+            })
+
+        update_load_test_status(load_test_id, status=1, start_time=int(time.time()))
+        summary = run_load_test(targets, duration, concurrency, target_rps)
+        save_load_test_summary(load_test_id, summary)
+
+        global_logger.info(f'压测执行完成，压测ID: {load_test_id}，请求数: {summary["total_requests"]}，'
+                           f'吞吐量: {summary["throughput"]}/s，p99: {summary["latency"]["p99"]}ms')
+    except Exception as e:
+        global_logger.error(f'执行压测异常，压测ID: {load_test_id}，错误: {str(e)}')
+        global_logger.error(traceback.format_exc())
+        update_load_test_status(load_test_id, status=3, end_time=int(time.time()), error_message=str(e))
+
+
+def run_load_test(targets, duration, concurrency, target_rps=None):
+    """
+    以虚拟用户方式循环执行请求直到达到指定时长
+
+    每个虚拟用户在线程内独立统计，结束后合并，执行期间不写api_result，也不在线程间加锁计数。
+    指定target_rps时所有虚拟用户共用一个发送节拍，总速率不超过目标值。
+    请求异常（连接被拒、超时等）时虚拟用户按指数退避等待后再发送，异常请求的耗时单独统计。
+
+    参数:
+        targets: 压测目标列表，包含testcase、request_spec、plan、weight
+        duration: 持续时间(秒)
+        concurrency: 虚拟用户数
+        target_rps: 目标每秒请求数
+
+    返回:
+        压测汇总结果字典
+    """
+    session = http_session.create_session(pool_maxsize=concurrency)
+    weights = [target['weight'] for target in targets]
+    start_time = time.time()
+    deadline = start_time + duration
+
+    pacer_lock = threading.Lock()
+    pacer = {'next_slot': start_time, 'interval': 1.0 / target_rps if target_rps else 0}
+
+    def _next_slot():
+        with pacer_lock:
+            slot = max(pacer['next_slot'], time.time())
+            pacer['next_slot'] = slot + pacer['interval']
+            return slot
+
+    def _virtual_user(user_index):
+        rng = random.Random(user_index)
+        stats = {}
+        errors = {}
+        backoff = 0
+
+        while True:
+            if pacer['interval']:
+                slot = _next_slot()
+                if slot >= deadline:
+                    break
+                delay = slot - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            elif time.time() >= deadline:
+                break
+
+            target = rng.choices(targets, weights)[0] if len(targets) > 1 else targets[0]
+            testcase_id = target['testcase']['id']
+            item = stats.get(testcase_id)
+            if item is None:
+                item = stats[testcase_id] = {'requests': 0, 'success': 0, 'failed': 0, 'errors': 0,
+                                             'histogram': LatencyHistogram(), 'error_histogram': LatencyHistogram()}
+
+            item['requests'] += 1
+            request_start_time = time.time()
+            try:
+                response = send_testcase_request(target['request_spec'], session)
+            except requests.RequestException as e:
+                item['errors'] += 1
+                item['error_histogram'].record((time.time() - request_start_time) * 1000)
+                message = type(e).__name__
+                errors[message] = errors.get(message, 0) + 1
+
+                # 目标不可用时退避，避免虚拟用户空转占满CPU；连续异常时在上一次的基础上翻倍，不会溢出
+                backoff = min(backoff * 2, config.LOAD_TEST_ERROR_BACKOFF_MAX) if backoff \
+                    else config.LOAD_TEST_ERROR_BACKOFF_BASE
+                time.sleep(max(0, min(backoff, deadline - time.time())))
+                continue
+
+            backoff = 0
+            latency_ms = (time.time() - request_start_time) * 1000
+            item['histogram'].record(latency_ms)
+
+            if target['plan'] is not None:
+                response_body, response_body_str = decode_response_body(response.content, response.encoding)
+                context = assertions.AssertionContext(response.status_code, response.headers, response_body,
+                                                      response_body_str, latency_ms)
+                is_success = target['plan'].evaluate(context)[0]
+            else:
+                is_success = response.status_code < 400
+
+            if is_success:
+                item['success'] += 1
+            else:
+                item['failed'] += 1
+
+        return stats, errors
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load-test') as executor:
+            user_results = list(executor.map(_virtual_user, range(concurrency)))
+    finally:
+        session.close()
+
+    elapsed = max(time.time() - start_time, 0.001)
+
+    # 合并各虚拟用户的统计
+    per_testcase = {}
+    error_types = {}
+    for stats, errors in user_results:
+        for testcase_id, item in stats.items():
+            merged = per_testcase.setdefault(testcase_id, {'requests': 0, 'success': 0, 'failed': 0,
+                                                           'errors': 0, 'histogram': LatencyHistogram(),
+                                                           'error_histogram': LatencyHistogram()})
+            for field in ('requests', 'success', 'failed', 'errors'):
+                merged[field] += item[field]
+            merged['histogram'].merge(item['histogram'])
+            merged['error_histogram'].merge(item['error_histogram'])
+        for message, count in errors.items():
+            error_types[message] = error_types.get(message, 0) + count
+
+    histogram = LatencyHistogram()
+    error_histogram = LatencyHistogram()
+    for item in per_testcase.values():
+        histogram.merge(item['histogram'])
+        error_histogram.merge(item['error_histogram'])
+
+    total_requests = sum(item['requests'] for item in per_testcase.values())
+    failed_requests = sum(item['failed'] for item in per_testcase.values())
+    error_requests = sum(item['errors'] for item in per_testcase.values())
+
+    return {
+        'duration': round(elapsed, 3),
+        'total_requests': total_requests,
+        'success_requests': sum(item['success'] for item in per_testcase.values()),
+        'failed_requests': failed_requests,
+        'error_requests': error_requests,
+        'throughput': round(total_requests / elapsed, 2),
+        'error_rate': round((failed_requests + error_requests) / total_requests, 4) if total_requests else 0,
+        'latency': histogram.summary(),
+        'error_latency': error_histogram.summary(),
+        'histogram': histogram,
+        'testcases': [
+            {
+                'testcase_id': testcase_id,
+                'requests': item['requests'],
+                'success': item['success'],
+                'failed': item['failed'],
+                'errors': item['errors'],
+                'latency': item['histogram'].summary(),
+                'error_latency': item['error_histogram'].summary()
+            }
+            for testcase_id, item in per_testcase.items()
+        ],
+        'error_types': error_types
+    }
+
+
+def create_load_test(load_test_id, app_id, name, testcases, environment, duration, concurrency, target_rps,
+                     current_user):
+    """
+    创建压测记录
+    """
+    global_logger.info(f'创建压测记录，ID: {load_test_id}，名称: {name}，应用ID: {app_id}')
+
+    conn = mysql_pool.connection()
+    cursor = conn.cursor()
+
+    try:
+        sql = """
+            INSERT INTO api_load_test (
+                id, app_id, name, environment, testcases, concurrency, target_rps, duration,
+                status, executor_id, executor_name, create_time
+            ) VALUES (
+                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+            )
+        """
+        params = [
+            load_test_id,
+            app_id,
+            name,
+            environment,
+            json.dumps(testcases),
+            concurrency,
+            target_rps,
+            duration,
+            0,  # status: 0-等待执行
+            current_user.get('id') if current_user else None,
+            current_user.get('username') if current_user else None,
+            int(time.time())
+        ]
+        cursor.execute(sql, params)
+        conn.commit()
+    except Exception as e:
+        global_logger.error(f'创建压测记录异常，ID: {load_test_id}，错误: {str(e)}')
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def update_load_test_status(load_test_id, status, start_time=None, end_time=None, error_message=None):
+    """
+    更新压测状态
+
+    参数:
+        load_test_id: 压测ID
+        status: 状态（0-等待执行，1-执行中，2-已完成，3-异常）
+    """
+    conn = mysql_pool.connection()
+    cursor = conn.cursor()
+
+    try:
+        sql = """
+            UPDATE api_load_test
+            SET status = %s, start_time = COALESCE(%s, start_time), end_time = COALESCE(%s, end_time),
+                error_message = COALESCE(%s, error_message)
+            WHERE id = %s
+        """
+        cursor.execute(sql, [status, start_time, end_time, error_message, load_test_id])
+        conn.commit()
+    except Exception as e:
+        global_logger.error(f'更新压测状态异常，ID: {load_test_id}，错误: {str(e)}')
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def save_load_test_summary(load_test_id, summary):
+    """
+    保存压测汇总结果并标记为已完成
+    """
+    latency = summary['latency']
+    detail = {
+        'duration': summary['duration'],
+        'testcases': summary['testcases'],
+        'error_types': summary['error_types'],
+        'error_latency': summary['error_latency']
+    }
+
+    conn = mysql_pool.connection()
+    cursor = conn.cursor()
+
+    try:
+        sql = """
+            UPDATE api_load_test
+            SET status = 2, total_requests = %s, success_requests = %s, failed_requests = %s,
+                error_requests = %s, throughput = %s, error_rate = %s, latency_min = %s, latency_mean = %s,
+                latency_p50 = %s, latency_p90 = %s, latency_p99 = %s, latency_max = %s,
+                latency_histogram = %s, detail = %s, end_time = %s
+            WHERE id = %s
+        """
+        params = [
+            summary['total_requests'],
+            summary['success_requests'],
+            summary['failed_requests'],
+            summary['error_requests'],
+            summary['throughput'],
+            summary['error_rate'],
+            latency['min'],
+            latency['mean'],
+            latency['p50'],
+            latency['p90'],
+            latency['p99'],
+            latency['max'],
+            summary['histogram'].to_json(),
+            json.dumps(detail, ensure_ascii=False),
+            int(time.time()),
+            load_test_id
+        ]
+        cursor.execute(sql, params)
+        conn.commit()
+    except Exception as e:
+        global_logger.error(f'保存压测结果异常，ID: {load_test_id}，错误: {str(e)}')
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+
 def generate_excel_report(batch_id):
     """
     生成Excel测试报告
@@ -1828,57 +3055,28 @@ def get_current_user():
 # 替代jsonpath库
 def jsonpath_extract(obj, path):
     """
-    简单实现jsonpath提取功能
+    按JSONPath表达式提取值，表达式编译后缓存复用
 
     参数:
         obj: JSON对象
-        path: 路径表达式，例如 $.data.items[0].name
+        path: 路径表达式，例如 $.data.items[0].name、$..id、$.items[?(@.price > 10)]
 
     返回:
         匹配的值列表
     """
-    global_logger.info(f'使用自定义jsonpath提取: {path}')
-
-    # 去掉开头的$
-    if path.startswith('$'):
-        path = path[1:]
-
-        # 如果路径以.开头，去掉开头的.
-    if path.startswith('.'):
-        path = path[1:]
-
-        # 按.分割路径
-    parts = path.split('.')
-
-    # 过滤掉空字符串
-    parts = [part for part in parts if part]
-
-    current = obj
     try:
-        for part in parts:
-            # 处理数组索引，如items[0]
-            if '[' in part and ']' in part:
-                array_name = part.split('[')[0]
-                index_str = part.split('[')[1].split(']')[0]
-
-                if array_name:
-                    current = current[array_name]
-
-                    # 处理索引
-                index = int(index_str)
-                current = current[index]
-            else:
-                current = current[part]
-
-        return [current]
-    except (KeyError, IndexError, TypeError) as e:
+        return jsonpath.find(obj, path)
+    except jsonpath.JsonPathError as e:
         global_logger.warning(f'jsonpath提取失败: {str(e)}')
         return []
-def finalize_test_batch(batch_id):
+
+
+def finalize_test_batch(batch_id, latency=None):
     """
     完成测试批次，统计结果并更新状态
     参数:
          batch_id: 批次ID
+         latency: 批次延迟统计，指定时保存批次及各接口的延迟百分位
     """
     global_logger.info(f'完成测试批次，ID: {batch_id}')
 
@@ -1886,34 +3084,33 @@ def finalize_test_batch(batch_id):
     cursor = conn.cursor()
 
     try:
-         # 统计测试结果
-        stats_sql = """  
-            SELECT   
-                COUNT(*) as total,  
-                SUM(CASE WHEN is_success = 1 THEN 1 ELSE 0 END) as passed,  
-                SUM(CASE WHEN is_success = 0 THEN 1 ELSE 0 END) as failed  
-            FROM api_result  
-            WHERE batch_id = %s  
-        """
-
-        cursor.execute(stats_sql, [batch_id])
+        # 通过/失败数在执行期间已按写入的结果增量累加（未生成结果行的用例计入失败），
+        # 不再按api_result重新统计覆盖，避免进度在完成时回退
+        cursor.execute("SELECT passed_cases, failed_cases FROM api_test_batch WHERE id = %s", [batch_id])
         stats = cursor.fetchone()
 
         if not stats:
-            global_logger.warning(f'未找到测试批次的结果数据，ID: {batch_id}')
+            global_logger.warning(f'未找到测试批次，ID: {batch_id}')
             return
 
-        passed = stats['passed'] or 0
-        failed = stats['failed'] or 0
+        passed = stats['passed_cases'] or 0
+        failed = stats['failed_cases'] or 0
 
         global_logger.info(f'测试批次最终统计，ID: {batch_id}，通过: {passed}，失败: {failed}')
 
-        # 更新批次进度
-        update_batch_progress(batch_id, passed, failed)
+        if latency is not None:
+            save_batch_latency(mysql_pool, batch_id, latency)
 
         # 更新批次状态为已完成
         update_batch_status(batch_id, 2)  # 2-已完成
 
+        # 失败结果在后台归入失败聚类索引，不占用批次完成路径
+        if failed and config.FAILURE_CLUSTER_ENABLED:
+            try:
+                index_batch_failures.delay(batch_id)
+            except Exception as e:
+                global_logger.warning(f'提交失败聚类索引任务失败，批次ID: {batch_id}，错误: {str(e)}')
+
     except Exception as e:
         global_logger.error(f'完成测试批次异常，ID: {batch_id}，错误: {str(e)}')
         global_logger.error(traceback.format_exc())
@@ -1949,7 +3146,7 @@ def update_batch_status_to_running(batch_id):
         conn = mysql_pool.connection()
         cursor = conn.cursor()
 
-        sql = "UPDATE api_test_batch SET status = 2 WHERE id = %s"  # 2=执行中
+        sql = "UPDATE api_test_batch SET status = 1 WHERE id = %s"  # 1=执行中
         cursor.execute(sql, [batch_id])
         conn.commit()
 
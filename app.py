@@ -6,23 +6,61 @@ from apis.application import app_application
 from apis.testmanager import test_manager
 from apis.dashboard import test_dashboard
 from flask_cors import CORS
-from configs import format
+from configs import format, config
 from flask import make_response, render_template
+import atexit
+import os
+import queue
 import logging   #python标准库，提供日志功能
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from celery import Celery
 from utils import metrics
 from prometheus_client import start_http_server
 
 
+_log_listener = None
+
+
 def setup_global_logger():
     logger=logging.getLogger('global_logger')
     if not logger.hasHandlers():
-        logger.setLevel(logging.INFO)
+        logger.setLevel(config.LOG_LEVEL)
         handler=RotatingFileHandler('logs/service.log', maxBytes=10485760, backupCount=10)
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s')
         handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        _start_log_listener(logger, handler)
+        # fork出的子进程（gunicorn/Celery worker）没有父进程的后台线程，需要重新启动
+        os.register_at_fork(after_in_child=lambda: _start_log_listener(logger, handler))
+        atexit.register(_stop_log_listener)
+    return logger
+
+
+def _start_log_listener(logger, handler):
+    """业务线程只把日志记录放入队列，由后台线程写文件"""
+    global _log_listener
+    log_queue = queue.Queue(-1)
+    for queue_handler in [h for h in logger.handlers if isinstance(h, QueueHandler)]:
+        logger.removeHandler(queue_handler)
+    logger.addHandler(QueueHandler(log_queue))
+    _log_listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _log_listener.start()
+
+
+def _stop_log_listener():
+    """进程退出前写完队列中剩余的日志"""
+    if _log_listener is not None:
+        _log_listener.stop()
+
+
+def get_module_logger(name):
+    """
+    获取模块日志器，日志经global_logger统一输出，级别可在config.LOG_MODULE_LEVELS中按模块配置
+    """
+    module = name.rsplit('.', 1)[-1]
+    logger = global_logger.getChild(module)
+    level = config.LOG_MODULE_LEVELS.get(name) or config.LOG_MODULE_LEVELS.get(module)
+    if level:
+        logger.setLevel(level)
     return logger
 
 def make_celery(app):
@@ -55,7 +93,7 @@ app.config.update(
     CELERY_TIMEZONE='UTC',
     CELERY_ENABLE_UTC=True,
     CELERY_TASK_REJECT_ON_WORKER_LOST=False,  # 添加这一行
-    CELERY_IMPORTS=['apis.testexec'],
+    CELERY_IMPORTS=['apis.testexec', 'apis.ai_route'],
 )
 
 celery = make_celery(app)
@@ -2,8 +2,10 @@
 """  
 AI服务配置
 """
+import json
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, fields, replace
+from typing import List
 from app import global_logger
 
 @dataclass
@@ -15,6 +17,7 @@ class AIConfig:
     timeout: int
     max_tokens: int
     temperature: float
+    name: str = 'default'
 
 # 从环境变量或配置文件加载
 def _load_ai_config() -> AIConfig:
@@ -87,4 +90,33 @@ except Exception as e:
     _config_valid = False
 
 # 导出配置验证状态  
-CONFIG_VALID = _config_valid
\ No newline at end of file
+CONFIG_VALID = _config_valid
+
+
+def _load_providers(default: AIConfig) -> List[AIConfig]:
+    """
+    加载AI服务商列表，第一个为主配置
+
+    AI_PROVIDERS环境变量为JSON数组，每一项可覆盖AIConfig的任意字段，未指定的字段沿用主配置，例如：
+    [{"name": "backup", "base_url": "https://api.deepseek.com/v1", "model": "deepseek-chat", "api_key": "sk-..."}]
+    """
+    providers = [default]
+    raw = os.getenv('AI_PROVIDERS')
+    if not raw:
+        return providers
+
+    try:
+        field_names = {field.name for field in fields(AIConfig)}
+        for index, item in enumerate(json.loads(raw)):
+            overrides = {key: value for key, value in item.items() if key in field_names}
+            overrides.setdefault('name', f'provider{index + 1}')
+            providers.append(replace(default, **overrides))
+        global_logger.info(f"加载AI服务商 {len(providers)} 个: {', '.join(p.name for p in providers)}")
+    except Exception as e:
+        global_logger.error(f"解析AI_PROVIDERS失败，仅使用主配置: {e}")
+        providers = [default]
+    return providers
+
+
+# 全部AI服务商，请求按健康状态与延迟在其中路由
+AI_PROVIDERS = _load_providers(AI_CONFIG)
\ No newline at end of file
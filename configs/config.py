@@ -21,4 +21,109 @@ DEFAULT_EMAIL_RECIPIENTS = [
 ]
 
 # 邮件主题前缀
-EMAIL_SUBJECT_PREFIX = "[API测试]"
\ No newline at end of file
+EMAIL_SUBJECT_PREFIX = "[API测试]"
+
+# 批量执行配置
+BATCH_EXECUTE_CONCURRENCY = 10       # 批次默认并发数
+BATCH_EXECUTE_MAX_CONCURRENCY = 50   # 单个批次允许的最大并发数
+BATCH_CHUNK_SIZE = 200               # 批次拆分为Celery子任务时每个分片的用例数
+BATCH_PREFETCH_SIZE = 500            # 批次预取测试用例时单条IN查询的最大ID数
+
+# 用例执行HTTP配置
+HTTP_REQUEST_TIMEOUT = 30            # 单个请求超时时间(秒)
+HTTP_POOL_MAXSIZE = 50               # 每个目标主机的连接池大小，不小于批次最大并发数
+HTTP_KEEP_ALIVE = True               # 是否复用长连接
+
+# 批次执行模式配置
+BATCH_EXECUTION_MODE = 'thread'      # 默认执行模式：thread 线程池 / async asyncio客户端
+ASYNC_EXECUTE_CONCURRENCY = 200      # asyncio模式默认同时在途请求数
+ASYNC_EXECUTE_MAX_CONCURRENCY = 2000 # asyncio模式单个批次允许的最大在途请求数
+ASYNC_DB_WORKERS = 5                 # asyncio模式执行数据库读写的线程数，不超过连接池上限
+
+# 测试结果写入配置
+RESULT_WRITER_BATCH_SIZE = 100       # 缓冲达到该行数时批量写入api_result
+RESULT_WRITER_FLUSH_INTERVAL = 1.0   # 定时批量写入间隔(秒)
+
+# 数据库连接池配置（可通过同名环境变量覆盖）
+DB_POOL_MAX_CONNECTIONS = 20         # 每个进程的最大连接数
+DB_POOL_MIN_CACHED = 2               # 初始空闲连接数
+DB_POOL_MAX_CACHED = 10              # 最大空闲连接数
+DB_POOL_BLOCKING = True              # 连接耗尽时是否等待
+DB_POOL_PING = 1                     # 取出连接时检测连接是否可用
+
+# 断言配置
+JSONPATH_CACHE_SIZE = 1024           # 编译后JSONPath表达式的缓存数量
+ASSERTION_PLAN_CACHE_SIZE = 5000     # 按测试用例缓存的断言计划数量
+
+# 日志配置
+LOG_LEVEL = 'INFO'                   # global_logger日志级别
+LOG_MODULE_LEVELS = {                # 按模块单独设置日志级别，如 {'testexec': 'DEBUG'}
+    'testexec': 'INFO',
+}
+LOG_RESPONSE_BODY_SAMPLE_RATE = 0.01 # 非DEBUG级别下记录响应内容的采样率，0为不记录
+LOG_RESPONSE_BODY_MAX_LENGTH = 2000  # 采样记录响应内容的最大长度
+
+# 响应体存储配置
+RESPONSE_BODY_MAX_BYTES = 1048576    # 默认存储上限(字节)，超出部分截断，0为不限制
+RESPONSE_BODY_APP_LIMITS = {}        # 按应用ID单独配置存储上限，如 {'app_id': 262144}
+RESPONSE_BODY_COMPRESSION = 'zlib'   # 压缩方式：none / zlib / zstd（未安装zstandard时回退zlib）
+RESPONSE_BODY_COMPRESS_MIN_BYTES = 1024  # 超过该大小才压缩
+RESPONSE_BODY_ZLIB_LEVEL = 6         # zlib压缩级别
+RESPONSE_BODY_ZSTD_LEVEL = 3         # zstd压缩级别
+
+# 压测配置
+LOAD_TEST_DEFAULT_CONCURRENCY = 10   # 默认虚拟用户数
+LOAD_TEST_MAX_CONCURRENCY = 200      # 单次压测允许的最大虚拟用户数
+LOAD_TEST_MAX_DURATION = 3600        # 单次压测允许的最长时间(秒)
+LOAD_TEST_ERROR_BACKOFF_BASE = 0.05  # 请求异常后虚拟用户的首次退避时间(秒)，连续异常时翻倍
+LOAD_TEST_ERROR_BACKOFF_MAX = 1.0    # 请求异常后虚拟用户的最长退避时间(秒)
+
+# 延迟统计配置
+DASHBOARD_SLOWEST_INTERFACES = 10    # 统计面板展示p99最高的接口数量
+
+# AI生成配置
+AI_STREAM_ENABLED = True             # 以SSE流式读取AI响应，每解析出一个用例立即处理
+AI_STREAM_SAVE_BATCH_SIZE = 5        # 流式生成时每积累多少个用例批量保存一次
+AI_GENERATION_CACHE_ENABLED = True   # 是否缓存相同接口定义的AI生成结果
+AI_GENERATION_CACHE_TTL = 604800     # 生成缓存有效期(秒)
+AI_GENERATION_CACHE_MAX_ENTRIES = 10000  # 数据库中保留的缓存条目上限，超出按最近访问时间淘汰
+AI_GENERATION_CACHE_LOCAL_SIZE = 256 # 进程内缓存条目数
+
+# LLM调用限流配置
+AI_LLM_MAX_CONCURRENCY = 8           # 单个进程同时在途的AI请求数
+AI_LLM_REQUESTS_PER_MINUTE = 60      # 每分钟AI请求数上限(含重试)
+AI_LLM_TOKENS_PER_MINUTE = 200000    # 每分钟AI token数上限(输入与输出)
+AI_LLM_MAX_RETRIES = 3               # 429/5xx/连接异常的最大重试次数
+AI_LLM_BACKOFF_BASE = 2              # 重试退避基数(秒)，按2的幂增长
+AI_LLM_BACKOFF_MAX = 60              # 单次重试最长等待时间(秒)
+
+# 批量AI生成配置
+AI_BULK_GENERATE_CONCURRENCY = 8     # 批量生成时同时处理的接口数
+AI_BULK_GENERATE_MAX_INTERFACES = 1000  # 单次批量生成允许的最大接口数
+
+# AI服务健康探测配置
+AI_HEALTH_TTL = 300                  # 探测成功后结果的缓存时间(秒)
+AI_HEALTH_FAILURE_TTL = 60           # 探测失败后结果的缓存时间(秒)，到期后重新探测
+AI_HEALTH_PROBE_TIMEOUT = 10         # 单次探测的超时时间(秒)
+
+# AI服务商熔断配置
+AI_LLM_CONNECT_TIMEOUT = 3           # 连接AI服务商的超时时间(秒)，服务商宕机时尽快切换
+AI_CIRCUIT_FAILURE_THRESHOLD = 3     # 连续失败多少次后熔断
+AI_CIRCUIT_OPEN_SECONDS = 30         # 熔断持续时间(秒)，之后放行一个试探请求
+AI_PROVIDER_EWMA_ALPHA = 0.3         # 服务商响应耗时EWMA的平滑系数，越大越偏向最近的请求
+
+# AI失败分析配置
+AI_CONTEXT_WINDOW = 32768            # 模型上下文窗口(token)
+AI_ANALYSIS_MAX_OUTPUT_TOKENS = 2000 # 失败分析每次请求预留的输出token
+AI_ANALYSIS_MAX_REQUESTS = 3         # 单次失败分析最多拆分的请求数，装不下的失败分组只计入统计
+AI_ANALYSIS_BODY_CHARS = 500         # 代表用例请求体、响应体保留的最大字符数
+
+# 失败聚类配置
+FAILURE_CLUSTER_ENABLED = True       # 批次完成后是否在后台索引失败聚类
+FAILURE_CLUSTER_PATTERN_LENGTH = 500 # 归一化后错误信息与响应体保留的最大长度
+FAILURE_CLUSTER_BACKFILL_LIMIT = 100 # 补偿索引单次处理的最大批次数
+
+# 模拟用例生成配置
+MOCK_NWISE_STRENGTH = 2              # 合法边界值组合的覆盖强度，2为pairwise，0为全组合
+MOCK_STRING_MAX_LENGTH = 50          # 未声明max_length的字符串参数的最大长度
+MOCK_MAX_NWISE_TUPLES = 20000        # n-wise待覆盖组合数上限，超出时自动降低覆盖强度，限制宽接口的耗时与内存
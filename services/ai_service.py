@@ -1,73 +1,151 @@
 # services/ai_service.py
 import json
+import threading
+import time
 import traceback
 
 import requests
 from datetime import datetime
 from app import global_logger
+from configs import config
 from configs.ai_config import AI_CONFIG, CONFIG_VALID
+from utils.json_stream import iter_array_objects
+from services.generation_cache import build_cache_key, get_generation_cache
+from services.llm_client import LLMClientError, estimate_tokens, get_llm_client
+from services.mock_generator import iter_mock_testcases
 
 import re
 
+# 提示词模板版本，修改_build_prompt或系统提示词时递增，使已有生成缓存失效
+PROMPT_TEMPLATE_VERSION = 1
 
 
-class AIService:
+class AIGenerationError(Exception):
+    """AI生成测试用例失败"""
+    pass
 
-    def __init__(self):
-        #  详细调试信息
-        global_logger.info(" 初始化AI服务...")
-        global_logger.info(f" CONFIG_VALID: {CONFIG_VALID}")
-        global_logger.info(f" API Key前缀: {AI_CONFIG.api_key[:8]}...")
 
-        self.config = AI_CONFIG
-        self.use_mock = not CONFIG_VALID
 
-        global_logger.info(f" 初始模式: {'真实API' if not self.use_mock else '模拟模式'}")
+class AIHealthProber:
+    """
+    AI服务健康探测
 
-        self._test_connection()
+    依次探测服务商池中的每个服务商，结果带有效期缓存，过期后由后台线程重新探测；
+    读取状态只读缓存，不会阻塞在网络请求上。探测结果同时计入各服务商的熔断器，
+    熔断中的服务商探测成功即恢复。
+    """
 
-        #  最终确认
-        final_mode = "真实API" if not self.use_mock else "模拟模式"
-        global_logger.info(f" AI服务启动完成，使用: {final_mode}")
+    def __init__(self, pool, ttl=None, failure_ttl=None):
+        self.pool = pool
+        self.ttl = ttl or config.AI_HEALTH_TTL
+        self.failure_ttl = failure_ttl or config.AI_HEALTH_FAILURE_TTL
 
-    def _test_connection(self):
-        """测试AI API连接"""
-        if not CONFIG_VALID:
-            global_logger.warning("AI配置无效，使用模拟模式")
-            self.use_mock = True
-            return
+        # available为None表示尚未探测
+        self._status = {"available": None, "last_test_time": None, "probes": []}
+        self._expires_at = 0
+        self._probing = False
+        self._lock = threading.Lock()
 
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.config.api_key}",
-                "Content-Type": "application/json"
-            }
+    def status(self):
+        """返回缓存的探测结果，缓存过期时在后台触发一次探测"""
+        with self._lock:
+            status = dict(self._status)
+            if time.time() >= self._expires_at and not self._probing:
+                self._probing = True
+                threading.Thread(target=self._probe_in_background, name='ai-health-probe', daemon=True).start()
+        return status
 
+    def _probe_in_background(self):
+        try:
+            self.probe()
+        except Exception as e:
+            global_logger.warning(f" AI API健康探测异常: {e}")
+        finally:
+            with self._lock:
+                self._probing = False
+
+    def _probe_provider(self, provider):
+        started = time.time()
+        error = None
+        try:
             # 发送简单的测试请求
-            test_payload = {
-                "model": self.config.model,
-                "messages": [{"role": "user", "content": "Hello"}],
-                "max_tokens": 10
-            }
-
             response = requests.post(
-                f"{self.config.base_url}/chat/completions",
-                headers=headers,
-                json=test_payload,
-                timeout=10
+                f"{provider.config.base_url}/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {provider.config.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": provider.config.model,
+                    "messages": [{"role": "user", "content": "Hello"}],
+                    "max_tokens": 10
+                },
+                timeout=config.AI_HEALTH_PROBE_TIMEOUT
             )
-
-            if response.status_code == 200:
-                global_logger.info(" 硅基流动AI API连接成功")
-                self.use_mock = False
+            available = response.status_code == 200
+            if available:
+                global_logger.info(f" AI服务商 {provider.name} 连接成功")
             else:
-                global_logger.warning(f" AI API连接失败: {response.status_code}")
-                global_logger.warning(f"错误详情: {response.text}")
-                self.use_mock = True
-
+                error = f"{response.status_code} {response.text[:500]}"
+                global_logger.warning(f" AI服务商 {provider.name} 连接失败: {error}")
         except Exception as e:
-            global_logger.warning(f" AI API连接异常: {e}")
-            self.use_mock = True
+            available = False
+            error = str(e)
+            global_logger.warning(f" AI服务商 {provider.name} 连接异常: {e}")
+
+        if available:
+            provider.breaker.record_success()
+        else:
+            provider.breaker.record_failure()
+
+        return {
+            "name": provider.name,
+            "available": available,
+            "latency_ms": round((time.time() - started) * 1000, 2),
+            "error": error
+        }
+
+    def probe(self):
+        """同步探测全部服务商并更新缓存"""
+        probes = [self._probe_provider(provider) for provider in self.pool.providers]
+        available = any(item["available"] for item in probes)
+
+        status = {
+            "available": available,
+            "last_test_time": datetime.now().isoformat(),
+            "probes": probes
+        }
+        with self._lock:
+            self._status = status
+            # 不可用时较早重新探测
+            self._expires_at = time.time() + (self.ttl if available else self.failure_ttl)
+        return dict(status)
+
+
+class AIService:
+
+    def __init__(self):
+        # 构造时不访问网络，连接状态由健康探测在后台获取
+        self.config = AI_CONFIG
+        self._prober = AIHealthProber(get_llm_client().pool)
+
+        global_logger.info(f" AI服务初始化，CONFIG_VALID: {CONFIG_VALID}，API Key前缀: {AI_CONFIG.api_key[:8]}...")
+        if not CONFIG_VALID:
+            global_logger.warning("AI配置无效，使用模拟模式")
+
+    @property
+    def use_mock(self):
+        """
+        是否使用模拟模式
+
+        配置无效、最近一次健康探测全部服务商失败，或全部服务商熔断时使用模拟模式；
+        尚未探测时按可用处理，实际调用失败仍会降级到模拟数据。
+        """
+        if not CONFIG_VALID:
+            return True
+        if self._prober.status()["available"] is False:
+            return True
+        return not get_llm_client().pool.has_available()
 
     def _parse_ai_response(self, response_text, interface_data):
         """解析AI响应，解析失败直接跳过"""
@@ -211,8 +289,12 @@ class AIService:
 
         return text
 
-    def generate_testcases(self, interface_data, count=10):
-        """生成测试用例主方法，简化错误处理"""
+    def generate_testcases(self, interface_data, count=10, force_refresh=False):
+        """
+        生成测试用例主方法，简化错误处理
+
+        AI模式下相同接口定义与模型设置的结果会被缓存，force_refresh为True时跳过缓存重新生成。
+        """
         try:
             interface_name = interface_data.get('name', '未知接口')
 
@@ -223,9 +305,18 @@ class AIService:
             if self.use_mock:
                 # 调用模拟生成方法
                 testcases = self._generate_mock_testcases(interface_data, count)
+            elif config.AI_STREAM_ENABLED:
+                # 流式调用AI生成方法
+                testcases = list(self.stream_testcases(interface_data, count, force_refresh))
             else:
-                # 调用AI生成方法
-                testcases = self._generate_ai_testcases(interface_data, count)
+                testcases = self._get_cached_testcases(interface_data, count, force_refresh)
+                if testcases is None:
+                    try:
+                        # 调用AI生成方法，成功后写入缓存
+                        testcases = self._generate_ai_testcases(interface_data, count, fallback_to_mock=False)
+                    except AIGenerationError:
+                        global_logger.info("降级使用模拟模式")
+                        testcases = self._generate_mock_testcases(interface_data, count)
 
             if not testcases:
                 global_logger.warning("未能生成有效的测试用例")
@@ -239,24 +330,90 @@ class AIService:
             global_logger.error(f"错误详情: {traceback.format_exc()}")
             return []  # 确保任何异常都返回空列表，而不是抛出异常
 
-    def _generate_ai_testcases(self, interface_data, count=15):
-        """ 使用真实AI生成测试用例"""
+    def _generate_ai_testcases(self, interface_data, count=15, fallback_to_mock=True):
+        """ 使用真实AI生成测试用例，fallback_to_mock为False时调用失败抛出AIGenerationError"""
         try:
             # 构建提示词
             prompt = self._build_prompt(interface_data, count)
 
             # 准备API请求
-            headers = {
-                "Authorization": f"Bearer {self.config.api_key}",
-                "Content-Type": "application/json"
-            }
+            payload = self._build_chat_payload(prompt)
 
-            payload = {
-                "model": self.config.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": """你是一个资深的API测试工程师，拥有10年以上的接口测试经验。  
+            global_logger.info(" 正在调用硅基流动AI API...")
+
+            # 经共享客户端调用AI API，限流与429/5xx重试由客户端处理
+            result = get_llm_client().chat(payload)
+            ai_content = result['choices'][0]['message']['content']
+
+            global_logger.info(" AI API调用成功")
+            global_logger.debug(f"AI响应长度: {len(ai_content)} 字符")
+
+            # 解析AI返回的内容
+            testcases = self._parse_ai_response(ai_content, interface_data)
+
+            global_logger.info(f" AI成功生成 {len(testcases)} 个测试用例")
+            self._save_cached_testcases(interface_data, count, testcases, result.get('provider'))
+            return testcases
+
+        except LLMClientError as e:
+            global_logger.error(str(e))
+            if not fallback_to_mock:
+                raise AIGenerationError(str(e))
+            # 降级到模拟模式
+            global_logger.info("降级使用模拟模式")
+            return self._generate_mock_testcases(interface_data, count)
+        except requests.exceptions.Timeout:
+            global_logger.error("AI API调用超时")
+            if not fallback_to_mock:
+                raise AIGenerationError("AI API调用超时")
+            return self._generate_mock_testcases(interface_data, count)
+        except Exception as e:
+            global_logger.error(f"AI生成异常: {str(e)}")
+            if not fallback_to_mock:
+                raise AIGenerationError(str(e))
+            return self._generate_mock_testcases(interface_data, count)
+
+    def _generation_cache_key(self, interface_data, count):
+        """生成缓存键，包含接口定义、生成数量、提示词版本与模型设置"""
+        model_settings = {
+            "model": self.config.model,
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens
+        }
+        return build_cache_key(interface_data, count, model_settings, PROMPT_TEMPLATE_VERSION)
+
+    def _get_cached_testcases(self, interface_data, count, force_refresh=False):
+        """查询生成缓存，未启用、强制刷新或未命中时返回None"""
+        if not config.AI_GENERATION_CACHE_ENABLED or force_refresh:
+            return None
+
+        testcases = get_generation_cache().get(self._generation_cache_key(interface_data, count))
+        if testcases is not None:
+            global_logger.info(f"命中AI生成缓存，接口: {interface_data.get('name')}，用例数: {len(testcases)}")
+        return testcases
+
+    def _save_cached_testcases(self, interface_data, count, testcases, provider):
+        """
+        保存AI生成结果到缓存，模拟模式及降级结果不缓存
+
+        缓存键按主服务商的模型设置计算，故障切换到其他服务商时生成的结果不缓存，
+        避免备用模型的结果以主模型的名义在整个有效期内被命中。
+        """
+        if not config.AI_GENERATION_CACHE_ENABLED or not testcases:
+            return
+        if provider != self.config.name:
+            global_logger.info(f"本次由AI服务商 {provider} 生成，与主服务商 {self.config.name} 不同，不写入缓存")
+            return
+        get_generation_cache().set(self._generation_cache_key(interface_data, count), testcases, self.config.model)
+
+    def _build_chat_payload(self, prompt, stream=False):
+        """构建生成测试用例的chat/completions请求体"""
+        payload = {
+            "model": self.config.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": """你是一个资深的API测试工程师，拥有10年以上的接口测试经验。  
 你擅长根据接口文档设计全面的测试用例，包括：  
 1. 正常场景测试  
 2. 参数验证测试（必填、格式、类型等）  
@@ -265,55 +422,106 @@ class AIService:
 5. 安全测试  
 
 请严格按照用户要求的JSON格式返回测试用例，不要添加任何markdown标记或其他解释文字。"""
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "temperature": self.config.temperature,
-                "max_tokens": self.config.max_tokens,
-                "top_p": 0.9,
-                "frequency_penalty": 0.1,
-                "presence_penalty": 0.1
-            }
-
-            global_logger.info(" 正在调用硅基流动AI API...")
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens,
+            "top_p": 0.9,
+            "frequency_penalty": 0.1,
+            "presence_penalty": 0.1
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def stream_testcases(self, interface_data, count=10, force_refresh=False):
+        """
+        流式生成测试用例，每解析出一个完整的用例立即产出
+
+        AI模式下以SSE方式读取响应，增量解析JSON数组；未解析出任何用例时按完整内容走原有解析，
+        调用失败且尚未产出用例时降级到模拟模式。命中生成缓存时直接产出缓存结果，
+        完整生成成功后写入缓存。
+        """
+        if self.use_mock:
+            yield from self._generate_mock_testcases(interface_data, count)
+            return
 
-            # 调用AI API
-            response = requests.post(
-                f"{self.config.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=self.config.timeout
-            )
+        cached = self._get_cached_testcases(interface_data, count, force_refresh)
+        if cached is not None:
+            yield from cached
+            return
 
-            if response.status_code == 200:
-                result = response.json()
-                ai_content = result['choices'][0]['message']['content']
+        generated = []
+        served = {}
+        try:
+            for testcase in self._stream_ai_testcases(interface_data, count, served):
+                generated.append(testcase)
+                yield testcase
+        except Exception as e:
+            global_logger.error(f"AI流式生成异常: {str(e)}")
+            if not generated:
+                global_logger.info("降级使用模拟模式")
+                yield from self._generate_mock_testcases(interface_data, count)
+            return
 
-                global_logger.info(" AI API调用成功")
-                global_logger.debug(f"AI响应长度: {len(ai_content)} 字符")
+        global_logger.info(f"AI流式生成完成，共 {len(generated)} 个测试用例")
+        self._save_cached_testcases(interface_data, count, generated, served.get('provider'))
+
+    def _stream_ai_testcases(self, interface_data, count, served):
+        """读取SSE响应并逐个产出修复后的测试用例，served['provider']记录实际响应的服务商"""
+        prompt = self._build_prompt(interface_data, count)
+        content_parts = []
+        emitted = 0
+
+        global_logger.info(" 正在以流式方式调用硅基流动AI API...")
+        started = datetime.now()
+
+        # 读超时作用于相邻两次数据之间，而不是整个响应；读取期间占用共享客户端的并发名额
+        llm_client = get_llm_client()
+        with llm_client.stream(self._build_chat_payload(prompt, stream=True)) as response:
+            served['provider'] = response.provider
+            def _content_chunks():
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+                    try:
+                        delta = json.loads(data)['choices'][0].get('delta') or {}
+                    except (ValueError, KeyError, IndexError):
+                        continue
+                    text = delta.get('content')
+                    if text:
+                        content_parts.append(text)
+                        yield text
+
+            def _fix_raw(raw):
+                try:
+                    return json.loads(self._fix_single_testcase_json(raw))
+                except json.JSONDecodeError:
+                    global_logger.warning(f"流式解析测试用例失败，已跳过: {raw[:200]}")
+                    return None
 
-                # 解析AI返回的内容
-                testcases = self._parse_ai_response(ai_content, interface_data)
+            for testcase in iter_array_objects(_content_chunks(), on_error=_fix_raw):
+                if not isinstance(testcase, dict):
+                    continue
+                fixed_testcase = self._fix_testcase(testcase, interface_data, emitted + 1)
+                if fixed_testcase:
+                    emitted += 1
+                    if emitted == 1:
+                        global_logger.info(f"首个测试用例生成耗时: {(datetime.now() - started).total_seconds():.1f}s")
+                    yield fixed_testcase
 
-                global_logger.info(f" AI成功生成 {len(testcases)} 个测试用例")
-                return testcases
+        llm_client.record_usage(estimate_tokens(''.join(content_parts)))
 
-            else:
-                global_logger.error(f"AI API调用失败: {response.status_code}")
-                global_logger.error(f"错误详情: {response.text}")
-                # 降级到模拟模式
-                global_logger.info("降级使用模拟模式")
-                return self._generate_mock_testcases(interface_data, count)
-
-        except requests.exceptions.Timeout:
-            global_logger.error("AI API调用超时")
-            return self._generate_mock_testcases(interface_data, count)
-        except Exception as e:
-            global_logger.error(f"AI生成异常: {str(e)}")
-            return self._generate_mock_testcases(interface_data, count)
+        if emitted == 0 and content_parts:
+            global_logger.info("流式解析未得到测试用例，按完整响应解析")
+            yield from self._parse_ai_response(''.join(content_parts), interface_data)
 
     def _build_prompt(self, interface_data, count=15):
         """构建更严格的AI提示词"""
@@ -780,323 +988,70 @@ class AIService:
             return None
 
     def _generate_mock_testcases(self, interface_data, count=15):
-        """生成模拟测试用例（备用方案）"""
+        """生成模拟测试用例（备用方案），按需从组合式生成器截取count个"""
         global_logger.info("使用模拟模式生成测试用例")
 
-        interface_name = interface_data.get('name', '未知接口')
-        interface_url = interface_data.get('url', '/api/test')
-        interface_method = interface_data.get('method', 'POST')
-        interface_params = interface_data.get('params', {})
+        result_testcases = list(iter_mock_testcases(interface_data, count))
 
-        # 生成模拟测试用例
-        mock_testcases = []
-
-        # 1. 正常场景
-        mock_testcases.append({
-            "name": f"{interface_name} - 正常场景测试",
-            "description": "使用有效参数进行正常场景测试",
-            "priority": 1,
-            "request_url": interface_url,
-            "request_method": interface_method,
-            "request_headers": {"Content-Type": "application/json"},
-            "request_params": self._generate_valid_params(interface_params),
-            "expected_status": 200,
-            "assertions": [
-                {
-                    "type": "status_code",
-                    "operator": "equals",
-                    "expected": 200,
-                    "description": "HTTP状态码应为200"
-                }
-            ],
-            "pre_script": "",
-            "post_script": "",
-            "status": 1
-        })
-
-        # 2. 参数为空测试
-        for param_name in interface_params.keys():
-            mock_testcases.append({
-                "name": f"{interface_name} - {param_name}参数为空测试",
-                "description": f"测试{param_name}参数为空时的接口响应",
-                "priority": 2,
-                "request_url": interface_url,
-                "request_method": interface_method,
-                "request_headers": {"Content-Type": "application/json"},
-                "request_params": self._generate_empty_param(interface_params, param_name),
-                "expected_status": 400,
-                "assertions": [
-                    {
-                        "type": "status_code",
-                        "operator": "equals",
-                        "expected": 400,
-                        "description": "参数为空时应返回400状态码"
-                    }
-                ],
-                "pre_script": "",
-                "post_script": "",
-                "status": 1
-            })
-
-            # 3. 参数类型错误测试
-            for param_name in interface_params.keys():
-                mock_testcases.append({
-                    "name": f"{interface_name} - {param_name}参数类型错误测试",
-                    "description": f"测试{param_name}参数类型错误时的接口响应",
-                    "priority": 2,
-                    "request_url": interface_url,
-                    "request_method": interface_method,
-                    "request_headers": {"Content-Type": "application/json"},
-                    "request_params": self._generate_invalid_type_param(interface_params, param_name),
-                    "expected_status": 400,
-                    "assertions": [
-                        {
-                            "type": "status_code",
-                            "operator": "equals",
-                            "expected": 400,
-                            "description": "参数类型错误时应返回400状态码"
-                        }
-                    ],
-                    "pre_script": "",
-                    "post_script": "",
-                    "status": 1
-                })
-
-                # 4. 边界值测试
-            mock_testcases.extend([
-                {
-                    "name": f"{interface_name} - 最大长度测试",
-                    "description": "测试参数最大长度限制",
-                    "priority": 2,
-                    "request_url": interface_url,
-                    "request_method": interface_method,
-                    "request_headers": {"Content-Type": "application/json"},
-                    "request_params": self._generate_max_length_params(interface_params),
-                    "expected_status": 200,
-                    "assertions": [
-                        {
-                            "type": "status_code",
-                            "operator": "equals",
-                            "expected": 200,
-                            "description": "最大长度参数应正常处理"
-                        }
-                    ],
-                    "pre_script": "",
-                    "post_script": "",
-                    "status": 1
-                },
-                {
-                    "name": f"{interface_name} - 超长参数测试",
-                    "description": "测试超长参数的处理",
-                    "priority": 2,
-                    "request_url": interface_url,
-                    "request_method": interface_method,
-                    "request_headers": {"Content-Type": "application/json"},
-                    "request_params": self._generate_over_length_params(interface_params),
-                    "expected_status": 400,
-                    "assertions": [
-                        {
-                            "type": "status_code",
-                            "operator": "equals",
-                            "expected": 400,
-                            "description": "超长参数应返回400状态码"
-                        }
-                    ],
-                    "pre_script": "",
-                    "post_script": "",
-                    "status": 1
-                }
-            ])
-
-            # 5. 特殊字符测试
-            mock_testcases.append({
-                "name": f"{interface_name} - 特殊字符测试",
-                "description": "测试特殊字符的处理",
-                "priority": 2,
-                "request_url": interface_url,
-                "request_method": interface_method,
-                "request_headers": {"Content-Type": "application/json"},
-                "request_params": self._generate_special_char_params(interface_params),
-                "expected_status": 200,
-                "assertions": [
-                    {
-                        "type": "status_code",
-                        "operator": "equals",
-                        "expected": 200,
-                        "description": "特殊字符应正常处理"
-                    }
-                ],
-                "pre_script": "",
-                "post_script": "",
-                "status": 1
-            })
-
-            # 6. 权限测试
-            mock_testcases.append({
-                "name": f"{interface_name} - 无权限测试",
-                "description": "测试无权限访问的处理",
-                "priority": 2,
-                "request_url": interface_url,
-                "request_method": interface_method,
-                "request_headers": {"Content-Type": "application/json"},
-                "request_params": self._generate_valid_params(interface_params),
-                "expected_status": 401,
-                "assertions": [
-                    {
-                        "type": "status_code",
-                        "operator": "equals",
-                        "expected": 401,
-                        "description": "无权限时应返回401状态码"
-                    }
-                ],
-                "pre_script": "",
-                "post_script": "",
-                "status": 1
-            })
-
-            # 7. 安全测试
-            mock_testcases.append({
-                "name": f"{interface_name} - SQL注入测试",
-                "description": "测试SQL注入防护",
-                "priority": 3,
-                "request_url": interface_url,
-                "request_method": interface_method,
-                "request_headers": {"Content-Type": "application/json"},
-                "request_params": self._generate_sql_injection_params(interface_params),
-                "expected_status": 400,
-                "assertions": [
-                    {
-                        "type": "status_code",
-                        "operator": "equals",
-                        "expected": 400,
-                        "description": "SQL注入应被拦截"
-                    }
-                ],
-                "pre_script": "",
-                "post_script": "",
-                "status": 1
-            })
-
-            # 根据count截取相应数量的测试用例
-            result_testcases = mock_testcases[:count]
-
-            global_logger.info(f"模拟生成了 {len(result_testcases)} 个测试用例")
-            return result_testcases
-
-    def _generate_valid_params(self, interface_params):
-        """生成有效的参数"""
-        valid_params = {}
-        for param_name, param_type in interface_params.items():
-            if param_type == 'string':
-                valid_params[param_name] = "testvalue"
-            elif param_type == 'int' or param_type == 'integer':
-                valid_params[param_name] = 123
-            elif param_type == 'float':
-                valid_params[param_name] = 123.45
-            elif param_type == 'bool' or param_type == 'boolean':
-                valid_params[param_name] = True
-            elif param_type == 'email':
-                valid_params[param_name] = "test@example.com"
-            elif param_type == 'phone':
-                valid_params[param_name] = "13800138000"
-            else:
-                valid_params[param_name] = "testvalue"
-        return valid_params
-
-    def _generate_empty_param(self, interface_params, empty_param_name):
-        """生成指定参数为空的参数组合"""
-        params = self._generate_valid_params(interface_params)
-        params[empty_param_name] = ""
-        return params
-
-    def _generate_invalid_type_param(self, interface_params, invalid_param_name):
-        """生成指定参数类型错误的参数组合"""
-        params = self._generate_valid_params(interface_params)
-        param_type = interface_params.get(invalid_param_name, 'string')
-
-        if param_type in ['int', 'integer']:
-            params[invalid_param_name] = "not_a_number"
-        elif param_type == 'email':
-            params[invalid_param_name] = "invalid_email"
-        elif param_type == 'phone':
-            params[invalid_param_name] = "invalid_phone"
-        elif param_type in ['bool', 'boolean']:
-            params[invalid_param_name] = "not_boolean"
-        else:
-            params[invalid_param_name] = 12345  # 字符串类型用数字
-
-        return params
-
-    def _generate_max_length_params(self, interface_params):
-        """生成最大长度的参数"""
-        params = self._generate_valid_params(interface_params)
-        for param_name, param_type in interface_params.items():
-            if param_type == 'string':
-                params[param_name] = "a" * 50  # 50个字符
-        return params
-
-    def _generate_over_length_params(self, interface_params):
-        """生成超长参数"""
-        params = self._generate_valid_params(interface_params)
-        for param_name, param_type in interface_params.items():
-            if param_type == 'string':
-                params[param_name] = "a" * 1000  # 1000个字符
-        return params
-
-    def _generate_special_char_params(self, interface_params):
-        """生成包含特殊字符的参数"""
-        params = self._generate_valid_params(interface_params)
-        special_chars = ["<script>", "'; DROP TABLE users; --", "中文测试", "测试@#$%^&*()"]
-
-        for i, (param_name, param_type) in enumerate(interface_params.items()):
-            if param_type == 'string':
-                params[param_name] = special_chars[i % len(special_chars)]
-
-        return params
-
-    def _generate_sql_injection_params(self, interface_params):
-        """生成SQL注入测试参数"""
-        params = self._generate_valid_params(interface_params)
-        sql_injection_payloads = [
-            "' OR '1'='1",
-            "'; DROP TABLE users; --",
-            "' UNION SELECT * FROM users --",
-            "admin'--"
-        ]
-
-        for i, (param_name, param_type) in enumerate(interface_params.items()):
-            if param_type == 'string':
-                params[param_name] = sql_injection_payloads[i % len(sql_injection_payloads)]
-
-        return params
+        global_logger.info(f"模拟生成了 {len(result_testcases)} 个测试用例")
+        return result_testcases
+
+    def generate_response(self, prompt, max_tokens=2000):
+        """
+        发送单轮对话并返回AI回复文本，用于失败分析等非用例生成场景
+
+        模拟模式下返回None，调用失败时抛出LLMClientError或requests异常
+        """
+        if self.use_mock:
+            return None
+
+        payload = {
+            "model": self.config.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": self.config.temperature,
+            "max_tokens": max_tokens
+        }
+        result = get_llm_client().chat(payload)
+        return result['choices'][0]['message']['content']
 
     def get_ai_service_status(self):
-        """获取AI服务状态"""
+        """获取AI服务状态，读取健康探测的缓存结果"""
+        health = self._prober.status() if CONFIG_VALID else {}
         return {
             "ai_enabled": not self.use_mock,
             "model": self.config.model if hasattr(self.config, 'model') else 'Unknown',
             "base_url": self.config.base_url if hasattr(self.config, 'base_url') else 'Unknown',
             "config_valid": CONFIG_VALID,
-            "last_test_time": datetime.now().isoformat()
+            "last_test_time": health.get("last_test_time"),
+            "probes": health.get("probes", []),
+            "providers": get_llm_client().pool.status()
         }
 
     def test_ai_connection(self):
-        """手动测试AI连接"""
-        self._test_connection()
+        """手动测试AI连接，同步探测并刷新缓存"""
+        if CONFIG_VALID:
+            self._prober.probe()
         return self.get_ai_service_status()
 
 # 全局单例实例
 _ai_service_instance = None
+_ai_service_lock = threading.Lock()
 
 def get_ai_service():
-    """获取AI服务实例（单例模式）"""
+    """获取AI服务实例（单例模式，首次使用时创建）"""
     global _ai_service_instance
     if _ai_service_instance is None:
-        _ai_service_instance = AIService()
+        with _ai_service_lock:
+            if _ai_service_instance is None:
+                _ai_service_instance = AIService()
     return _ai_service_instance
 
 # 兼容性别名和函数
-ai_service = get_ai_service()
+def __getattr__(name):
+    # 模块级ai_service在首次访问时才创建实例，导入本模块不产生任何初始化开销
+    if name == 'ai_service':
+        return get_ai_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def create_ai_service():
     """创建AI服务实例"""
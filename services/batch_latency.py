@@ -0,0 +1,209 @@
+"""
+批次延迟统计服务
+负责批次执行期间按批次、接口、分片累计延迟直方图，并保存到api_batch_latency
+"""
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app import global_logger
+from utils.latency_histogram import LatencyHistogram
+
+# 统计范围：整个批次 / 单个接口 / 单个分片
+SCOPE_BATCH = 'batch'
+SCOPE_INTERFACE = 'interface'
+SCOPE_CHUNK = 'chunk'
+
+LATENCY_UPSERT_SQL = """
+    INSERT INTO api_batch_latency (
+        batch_id, scope, scope_key, count, latency_min, latency_mean, latency_p50,
+        latency_p90, latency_p99, latency_max, histogram, update_time
+    ) VALUES (
+        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+    )
+    ON DUPLICATE KEY UPDATE
+        count = VALUES(count), latency_min = VALUES(latency_min), latency_mean = VALUES(latency_mean),
+        latency_p50 = VALUES(latency_p50), latency_p90 = VALUES(latency_p90), latency_p99 = VALUES(latency_p99),
+        latency_max = VALUES(latency_max), histogram = VALUES(histogram), update_time = VALUES(update_time)
+"""
+
+
+class BatchLatency:
+    """
+    批次延迟统计
+
+    同时维护整体直方图与按接口划分的直方图，结果写入时增量记录，
+    各分片的统计可通过to_dict传回chord回调后合并。
+    """
+
+    def __init__(self):
+        self.overall = LatencyHistogram()
+        self.interfaces: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, interface_id, execution_time):
+        """
+        记录一条结果的执行时间
+
+        Args:
+            interface_id: 接口ID
+            execution_time: 执行时间(毫秒)
+        """
+        if execution_time is None:
+            return
+
+        key = str(interface_id) if interface_id is not None else ''
+        with self._lock:
+            self.overall.record(execution_time)
+            histogram = self.interfaces.get(key)
+            if histogram is None:
+                histogram = self.interfaces[key] = LatencyHistogram()
+            histogram.record(execution_time)
+
+    def merge(self, other: Optional['BatchLatency']) -> 'BatchLatency':
+        """合并另一份统计，返回自身"""
+        if other is None:
+            return self
+
+        with self._lock:
+            self.overall.merge(other.overall)
+            for key, histogram in other.interfaces.items():
+                self.interfaces.setdefault(key, LatencyHistogram()).merge(histogram)
+        return self
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'overall': self.overall.to_dict(),
+                'interfaces': {key: histogram.to_dict() for key, histogram in self.interfaces.items()}
+            }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> 'BatchLatency':
+        latency = cls()
+        if not data:
+            return latency
+        latency.overall = LatencyHistogram.from_dict(data.get('overall'))
+        latency.interfaces = {key: LatencyHistogram.from_dict(value)
+                              for key, value in (data.get('interfaces') or {}).items()}
+        return latency
+
+
+def _build_row(batch_id: str, scope: str, scope_key: str, histogram: LatencyHistogram, update_time: int) -> List:
+    summary = histogram.summary()
+    return [
+        batch_id,
+        scope,
+        scope_key,
+        summary['count'],
+        summary['min'],
+        summary['mean'],
+        summary['p50'],
+        summary['p90'],
+        summary['p99'],
+        summary['max'],
+        histogram.to_json(),
+        update_time
+    ]
+
+
+def _write_rows(pool, batch_id: str, rows: List[List]):
+    conn = pool.connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.executemany(LATENCY_UPSERT_SQL, rows)
+        conn.commit()
+    except Exception as e:
+        global_logger.error(f'保存批次延迟统计异常，批次ID: {batch_id}，错误: {str(e)}')
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def save_batch_latency(pool, batch_id: str, latency: BatchLatency):
+    """
+    保存批次整体及各接口的延迟统计
+
+    Args:
+        pool: 数据库连接池
+        batch_id: 批次ID
+        latency: 批次延迟统计
+    """
+    if not latency.overall.total_count:
+        return
+
+    update_time = int(time.time())
+    rows = [_build_row(batch_id, SCOPE_BATCH, '', latency.overall, update_time)]
+    rows.extend(_build_row(batch_id, SCOPE_INTERFACE, key, histogram, update_time)
+                for key, histogram in latency.interfaces.items())
+
+    _write_rows(pool, batch_id, rows)
+    global_logger.info(f'保存批次延迟统计，批次ID: {batch_id}，样本数: {latency.overall.total_count}，'
+                       f'p99: {latency.overall.percentile(99)}ms')
+
+
+def save_chunk_latency(pool, batch_id: str, chunk_index: int, latency: BatchLatency):
+    """
+    保存单个分片的延迟统计
+
+    Args:
+        pool: 数据库连接池
+        batch_id: 批次ID
+        chunk_index: 分片序号
+        latency: 分片延迟统计
+    """
+    if not latency.overall.total_count:
+        return
+
+    _write_rows(pool, batch_id, [_build_row(batch_id, SCOPE_CHUNK, str(chunk_index), latency.overall,
+                                            int(time.time()))])
+
+
+def load_batch_latency(cursor, batch_id: str) -> Optional[Dict]:
+    """
+    查询批次的延迟统计
+
+    Args:
+        cursor: 数据库游标
+        batch_id: 批次ID
+
+    Returns:
+        包含batch、interfaces、chunks三部分百分位数据的字典，无统计数据时返回None
+    """
+    sql = """
+        SELECT scope, scope_key, count, latency_min, latency_mean, latency_p50, latency_p90,
+               latency_p99, latency_max
+        FROM api_batch_latency
+        WHERE batch_id = %s
+    """
+    cursor.execute(sql, [batch_id])
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+
+    result = {'batch': None, 'interfaces': [], 'chunks': []}
+    for row in rows:
+        scope = row.pop('scope')
+        scope_key = row.pop('scope_key')
+        if scope == SCOPE_BATCH:
+            result['batch'] = row
+        elif scope == SCOPE_INTERFACE:
+            result['interfaces'].append(dict(row, interface_id=scope_key))
+        elif scope == SCOPE_CHUNK:
+            result['chunks'].append(dict(row, chunk_index=int(scope_key)))
+
+    result['interfaces'].sort(key=lambda item: item['latency_p99'] or 0, reverse=True)
+    result['chunks'].sort(key=lambda item: item['chunk_index'])
+    return result
+
+
+def merge_histograms(rows: List[Dict]) -> LatencyHistogram:
+    """合并查询出的多行histogram字段"""
+    histogram = LatencyHistogram()
+    for row in rows:
+        if row.get('histogram'):
+            histogram.merge(LatencyHistogram.from_dict(json.loads(row['histogram'])))
+    return histogram
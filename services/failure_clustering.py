@@ -0,0 +1,375 @@
+"""
+失败聚类服务
+负责对api_result中的失败结果做错误信息与响应体归一化，计算失败签名，并增量维护跨批次的失败聚类索引
+"""
+import hashlib
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+import pymysql
+
+from app import global_logger
+from configs import config
+from utils import body_codec
+from utils.db_pool import get_pool
+
+# 归一化时按顺序替换的易变内容
+_MASK_PATTERNS = [
+    (re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'), '<uuid>'),
+    (re.compile(r'\b[0-9a-fA-F]{16,}\b'), '<hex>'),
+    (re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2})?(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?'), '<time>'),
+    (re.compile(r'\d{4}[-/]\d{2}[-/]\d{2}'), '<date>'),
+    (re.compile(r'\d{2}:\d{2}:\d{2}(?:\.\d+)?'), '<time>'),
+    (re.compile(r'\b\d{10}(?:\d{3})?\b'), '<ts>'),
+    (re.compile(r'\d+(?:\.\d+)?'), '<num>'),
+]
+
+CLUSTER_UPSERT_SQL = """
+    INSERT INTO api_failure_cluster (
+        app_id, signature, status_code, error_pattern, body_pattern, sample_result_id,
+        sample_testcase_id, sample_interface_id, failure_count, batch_count, first_seen, last_seen, last_batch_id
+    ) VALUES (
+        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+    )
+    ON DUPLICATE KEY UPDATE
+        failure_count = failure_count + VALUES(failure_count), batch_count = batch_count + 1,
+        first_seen = LEAST(first_seen, VALUES(first_seen)), last_seen = GREATEST(last_seen, VALUES(last_seen)),
+        last_batch_id = VALUES(last_batch_id)
+"""
+
+# 没有失败结果的批次写入空签名的标记行，避免补偿索引反复选中
+EMPTY_BATCH_SIGNATURE = ''
+
+CLUSTER_BATCH_INSERT_SQL = """
+    INSERT INTO api_failure_cluster_batch (
+        batch_id, app_id, signature, failure_count, first_seen, last_seen
+    ) VALUES (
+        %s, %s, %s, %s, %s, %s
+    )
+"""
+
+
+def normalize_text(text: Optional[str], max_length: Optional[int] = None) -> str:
+    """
+    屏蔽文本中的ID、时间戳和数字并压缩空白
+
+    Args:
+        text: 原始文本
+        max_length: 结果最大长度，缺省使用FAILURE_CLUSTER_PATTERN_LENGTH
+
+    Returns:
+        str: 归一化后的文本
+    """
+    if not text:
+        return ''
+    text = str(text)
+    for pattern, replacement in _MASK_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return ' '.join(text.split())[:max_length or config.FAILURE_CLUSTER_PATTERN_LENGTH]
+
+
+def _skeleton(value, depth=0):
+    """提取JSON结构骨架，字符串归一化，数字替换为占位符，数组只保留首个元素的结构"""
+    if depth > 5:
+        return '<...>'
+    if isinstance(value, dict):
+        return {key: _skeleton(value[key], depth + 1) for key in sorted(value)}
+    if isinstance(value, list):
+        return [_skeleton(value[0], depth + 1)] if value else []
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return '<num>'
+    return normalize_text(value, 100)
+
+
+def normalize_body(body) -> str:
+    """
+    归一化响应体：JSON取结构骨架，其他文本按normalize_text处理
+
+    Args:
+        body: 响应体文本或已解析的对象
+
+    Returns:
+        str: 归一化后的响应体
+    """
+    if body is None or body == '':
+        return ''
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            return normalize_text(body)
+    return json.dumps(_skeleton(body), ensure_ascii=False, sort_keys=True)[:config.FAILURE_CLUSTER_PATTERN_LENGTH]
+
+
+def failure_signature(status_code, error_pattern: str, body_pattern: str) -> str:
+    """根据状态码与归一化后的错误信息、响应体计算失败签名"""
+    text = f'{status_code}\n{error_pattern}\n{body_pattern}'
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def case_signature(row) -> Tuple[str, str, str]:
+    """
+    计算单个失败结果的签名
+
+    Args:
+        row: 失败结果，包含response_status、error_message、response_body
+
+    Returns:
+        (签名, 归一化后的错误信息, 归一化后的响应体)
+    """
+    error_pattern = normalize_text(row.get('error_message'))
+    body_pattern = normalize_body(body_codec.decode_body(row.get('response_body')))
+    return failure_signature(row.get('response_status'), error_pattern, body_pattern), error_pattern, body_pattern
+
+
+def cluster_failures(rows) -> Dict[str, Dict]:
+    """
+    将失败结果按签名聚合
+
+    Args:
+        rows: 失败结果，包含id、testcase_id、interface_id、response_status、error_message、
+              response_body、execute_time
+
+    Returns:
+        Dict[str, Dict]: 签名到聚类的映射
+    """
+    clusters = {}
+    for row in rows:
+        status_code = row.get('response_status')
+        signature, error_pattern, body_pattern = case_signature(row)
+        execute_time = row.get('execute_time') or 0
+
+        cluster = clusters.get(signature)
+        if cluster is None:
+            clusters[signature] = {
+                'signature': signature,
+                'status_code': status_code,
+                'error_pattern': error_pattern,
+                'body_pattern': body_pattern,
+                'sample_result_id': row.get('id'),
+                'sample_testcase_id': row.get('testcase_id'),
+                'sample_interface_id': row.get('interface_id'),
+                'failure_count': 1,
+                'first_seen': execute_time,
+                'last_seen': execute_time
+            }
+        else:
+            cluster['failure_count'] += 1
+            cluster['first_seen'] = min(cluster['first_seen'], execute_time)
+            cluster['last_seen'] = max(cluster['last_seen'], execute_time)
+    return clusters
+
+
+class FailureClusterIndex:
+    """
+    失败聚类索引
+
+    每个批次只索引一次：批次的聚类写入api_failure_cluster_batch，同一事务内累加到
+    api_failure_cluster，主键冲突说明批次已被索引，事务整体回滚。
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def _is_indexed(self, cursor, batch_id: str) -> bool:
+        cursor.execute("SELECT 1 FROM api_failure_cluster_batch WHERE batch_id = %s LIMIT 1", [batch_id])
+        return cursor.fetchone() is not None
+
+    def _load_failures(self, batch_id: str) -> Dict[str, Dict]:
+        """以流式游标读取批次失败结果并聚合，内存占用只与聚类数有关"""
+        conn = self.pool.connection()
+        cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+        try:
+            cursor.execute("""
+                SELECT id, testcase_id, interface_id, response_status, error_message, response_body, execute_time
+                FROM api_result
+                WHERE batch_id = %s AND is_success = 0
+            """, [batch_id])
+            return cluster_failures(iter(lambda: cursor.fetchone(), None))
+        finally:
+            cursor.close()
+            conn.close()
+
+    def index_batch(self, batch_id: str) -> int:
+        """
+        索引批次的失败结果
+
+        Args:
+            batch_id: 批次ID
+
+        Returns:
+            int: 批次的聚类数，批次已索引或没有失败结果时返回0
+        """
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        try:
+            if self._is_indexed(cursor, batch_id):
+                global_logger.info(f'批次失败结果已索引，跳过，批次ID: {batch_id}')
+                return 0
+
+            cursor.execute("SELECT app_id FROM api_test_batch WHERE id = %s", [batch_id])
+            batch = cursor.fetchone()
+            if not batch:
+                global_logger.warning(f'索引失败聚类时未找到批次，ID: {batch_id}')
+                return 0
+        finally:
+            cursor.close()
+            conn.close()
+
+        clusters = self._load_failures(batch_id)
+        app_id = batch['app_id']
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        try:
+            if not clusters:
+                cursor.execute(CLUSTER_BATCH_INSERT_SQL, [batch_id, app_id, EMPTY_BATCH_SIGNATURE, 0, 0, 0])
+                conn.commit()
+                global_logger.info(f'批次没有失败结果，已记录索引标记，批次ID: {batch_id}')
+                return 0
+
+            cursor.executemany(CLUSTER_BATCH_INSERT_SQL, [
+                [batch_id, app_id, item['signature'], item['failure_count'], item['first_seen'], item['last_seen']]
+                for item in clusters.values()
+            ])
+            cursor.executemany(CLUSTER_UPSERT_SQL, [
+                [app_id, item['signature'], item['status_code'], item['error_pattern'], item['body_pattern'],
+                 item['sample_result_id'], item['sample_testcase_id'], item['sample_interface_id'],
+                 item['failure_count'], 1, item['first_seen'], item['last_seen'], batch_id]
+                for item in clusters.values()
+            ])
+            conn.commit()
+        except pymysql.err.IntegrityError:
+            conn.rollback()
+            global_logger.info(f'批次失败结果已被其他任务索引，批次ID: {batch_id}')
+            return 0
+        except Exception as e:
+            conn.rollback()
+            global_logger.error(f'索引批次失败聚类异常，批次ID: {batch_id}，错误: {str(e)}')
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+        global_logger.info(f'批次失败聚类索引完成，批次ID: {batch_id}，失败数: '
+                           f'{sum(item["failure_count"] for item in clusters.values())}，聚类数: {len(clusters)}')
+        return len(clusters)
+
+    def backfill(self, limit: Optional[int] = None) -> int:
+        """
+        索引尚未索引的已完成批次，用于首次启用或补偿丢失的索引任务
+
+        没有失败结果的批次会写入标记行，下次不再被选中，不会一直占用LIMIT。
+
+        Args:
+            limit: 本次最多处理的批次数，缺省使用FAILURE_CLUSTER_BACKFILL_LIMIT
+
+        Returns:
+            int: 处理的批次数
+        """
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT b.id FROM api_test_batch b
+                WHERE b.status = 2 AND b.failed_cases > 0
+                  AND NOT EXISTS (SELECT 1 FROM api_failure_cluster_batch c WHERE c.batch_id = b.id)
+                ORDER BY b.create_time
+                LIMIT %s
+            """, [limit or config.FAILURE_CLUSTER_BACKFILL_LIMIT])
+            batch_ids = [row['id'] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            conn.close()
+
+        for batch_id in batch_ids:
+            self.index_batch(batch_id)
+        return len(batch_ids)
+
+    def get_clusters(self, app_id: str, signatures: List[str]) -> Dict[str, Dict]:
+        """
+        按签名查询应用的失败聚类
+
+        Args:
+            app_id: 应用ID
+            signatures: 失败签名列表
+
+        Returns:
+            Dict[str, Dict]: 签名到聚类的映射，未索引的签名不在结果中
+        """
+        if not signatures:
+            return {}
+
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        try:
+            placeholders = ', '.join(['%s'] * len(signatures))
+            cursor.execute(f"""
+                SELECT signature, failure_count, batch_count, first_seen, last_seen, last_batch_id
+                FROM api_failure_cluster
+                WHERE app_id = %s AND signature IN ({placeholders})
+            """, [app_id] + list(signatures))
+            return {row['signature']: row for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+            conn.close()
+
+    def list_clusters(self, app_id: str, batch_id: Optional[str] = None, offset: int = 0,
+                      size: int = 20) -> Tuple[int, List[Dict]]:
+        """
+        查询失败聚类，按失败数从多到少排列
+
+        Args:
+            app_id: 应用ID
+            batch_id: 批次ID，指定时只返回该批次出现的聚类及其在批次内的失败数
+            offset: 偏移量
+            size: 数量
+
+        Returns:
+            (总数, 聚类列表)
+        """
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        try:
+            if batch_id:
+                where_clause = "FROM api_failure_cluster_batch cb JOIN api_failure_cluster c " \
+                               "ON c.app_id = cb.app_id AND c.signature = cb.signature " \
+                               "WHERE cb.app_id = %s AND cb.batch_id = %s"
+                params = [app_id, batch_id]
+                order_column = 'cb.failure_count'
+                batch_columns = ', cb.failure_count AS batch_failure_count'
+            else:
+                where_clause = "FROM api_failure_cluster c WHERE c.app_id = %s"
+                params = [app_id]
+                order_column = 'c.failure_count'
+                batch_columns = ''
+
+            cursor.execute(f"SELECT COUNT(*) AS total {where_clause}", params)
+            total = cursor.fetchone()['total']
+
+            cursor.execute(f"""
+                SELECT c.signature, c.status_code, c.error_pattern, c.body_pattern, c.sample_result_id,
+                       c.sample_testcase_id, c.sample_interface_id, c.failure_count, c.batch_count,
+                       c.first_seen, c.last_seen, c.last_batch_id{batch_columns}
+                {where_clause}
+                ORDER BY {order_column} DESC
+                LIMIT %s, %s
+            """, params + [offset, size])
+            return total, cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+
+# 单例实例
+_failure_cluster_index = None
+
+
+def get_failure_cluster_index() -> FailureClusterIndex:
+    """获取失败聚类索引实例"""
+    global _failure_cluster_index
+    if _failure_cluster_index is None:
+        _failure_cluster_index = FailureClusterIndex(get_pool())
+    return _failure_cluster_index
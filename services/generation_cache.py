@@ -0,0 +1,182 @@
+"""
+AI测试用例生成缓存服务
+负责按接口定义与模型设置缓存解析后的测试用例，命中时跳过LLM调用
+"""
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from configs import config
+from app import global_logger
+from utils.db_pool import get_pool
+
+# 参与缓存键计算的接口字段，与生成提示词使用的字段一致
+KEY_FIELDS = ('name', 'url', 'method', 'params', 'description')
+
+
+def build_cache_key(interface_data: Dict, count: int, model_settings: Dict, prompt_version: int) -> str:
+    """
+    计算生成缓存键
+
+    Args:
+        interface_data: 接口信息
+        count: 生成数量
+        model_settings: 模型设置（模型名、温度、最大token数等）
+        prompt_version: 提示词模板版本
+
+    Returns:
+        str: 规范化内容的sha256
+    """
+    method = interface_data.get('method') or ''
+    normalized = {
+        'interface': {field: interface_data.get(field) for field in KEY_FIELDS},
+        'count': count,
+        'model': model_settings,
+        'prompt_version': prompt_version
+    }
+    normalized['interface']['method'] = method.upper()
+    text = json.dumps(normalized, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class GenerationCache:
+    """
+    两级生成缓存
+
+    进程内OrderedDict作为LRU，未命中时查询api_ai_generation_cache；
+    数据库中的条目按过期时间失效，超过上限时按最近访问时间淘汰。
+    """
+
+    def __init__(self, pool, ttl: Optional[int] = None, max_entries: Optional[int] = None,
+                 local_size: Optional[int] = None):
+        self.pool = pool
+        self.ttl = ttl or config.AI_GENERATION_CACHE_TTL
+        self.max_entries = max_entries or config.AI_GENERATION_CACHE_MAX_ENTRIES
+        self.local_size = local_size or config.AI_GENERATION_CACHE_LOCAL_SIZE
+
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cache_key: str) -> Optional[List[Dict]]:
+        """
+        查询缓存
+
+        Returns:
+            缓存的测试用例列表，未命中或已过期时返回None
+        """
+        now = int(time.time())
+
+        with self._lock:
+            cached = self._local.get(cache_key)
+            if cached is not None:
+                if cached[0] > now:
+                    self._local.move_to_end(cache_key)
+                    return copy.deepcopy(cached[1])
+                del self._local[cache_key]
+
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT testcases, expire_time FROM api_ai_generation_cache
+                WHERE cache_key = %s AND expire_time > %s
+            """, [cache_key, now])
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            cursor.execute("""
+                UPDATE api_ai_generation_cache SET hit_count = hit_count + 1, last_access_time = %s
+                WHERE cache_key = %s
+            """, [now, cache_key])
+            conn.commit()
+        except Exception as e:
+            global_logger.error(f"查询生成缓存异常: {str(e)}")
+            conn.rollback()
+            return None
+        finally:
+            cursor.close()
+            conn.close()
+
+        testcases = json.loads(row['testcases'])
+        self._put_local(cache_key, row['expire_time'], copy.deepcopy(testcases))
+        return testcases
+
+    def set(self, cache_key: str, testcases: List[Dict], model: str):
+        """保存生成结果，超过条目上限时淘汰最久未访问的条目"""
+        now = int(time.time())
+        expire_time = now + self.ttl
+
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO api_ai_generation_cache (
+                    cache_key, model, testcases, hit_count, create_time, last_access_time, expire_time
+                ) VALUES (
+                    %s, %s, %s, %s, %s, %s, %s
+                )
+                ON DUPLICATE KEY UPDATE
+                    model = VALUES(model), testcases = VALUES(testcases), hit_count = 0,
+                    create_time = VALUES(create_time), last_access_time = VALUES(last_access_time),
+                    expire_time = VALUES(expire_time)
+            """, [cache_key, model, json.dumps(testcases, ensure_ascii=False), 0, now, now, expire_time])
+
+            cursor.execute("DELETE FROM api_ai_generation_cache WHERE expire_time <= %s", [now])
+            cursor.execute("SELECT COUNT(*) AS total FROM api_ai_generation_cache")
+            overflow = cursor.fetchone()['total'] - self.max_entries
+            if overflow > 0:
+                cursor.execute("DELETE FROM api_ai_generation_cache ORDER BY last_access_time LIMIT %s", [overflow])
+            conn.commit()
+        except Exception as e:
+            global_logger.error(f"保存生成缓存异常: {str(e)}")
+            conn.rollback()
+            return
+        finally:
+            cursor.close()
+            conn.close()
+
+        self._put_local(cache_key, expire_time, copy.deepcopy(testcases))
+
+    def invalidate(self, cache_key: str):
+        """删除缓存条目"""
+        with self._lock:
+            self._local.pop(cache_key, None)
+
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM api_ai_generation_cache WHERE cache_key = %s", [cache_key])
+            conn.commit()
+        except Exception as e:
+            global_logger.error(f"删除生成缓存异常: {str(e)}")
+            conn.rollback()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _put_local(self, cache_key: str, expire_time: int, testcases: List[Dict]):
+        with self._lock:
+            self._local[cache_key] = (expire_time, testcases)
+            self._local.move_to_end(cache_key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+
+# 单例实例
+_generation_cache = None
+_generation_cache_lock = threading.Lock()
+
+
+def get_generation_cache() -> GenerationCache:
+    """获取生成缓存实例"""
+    global _generation_cache
+    if _generation_cache is None:
+        with _generation_cache_lock:
+            if _generation_cache is None:
+                _generation_cache = GenerationCache(get_pool())
+    return _generation_cache
@@ -0,0 +1,238 @@
+"""
+LLM调用客户端
+负责对chat/completions的请求做每分钟请求数与token数限流、并发控制、服务商故障切换，以及429/5xx的退避重试
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import requests
+
+from app import global_logger
+from configs import config
+from configs.ai_config import AI_PROVIDERS
+from services.provider_pool import ProviderPool
+from utils import http_session
+
+# 需要退避重试的HTTP状态码
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class LLMClientError(Exception):
+    """LLM调用失败"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    令牌按每分钟速率连续补充，容量为一分钟的配额；consume允许余额为负，
+    用于在响应返回后补扣实际消耗，超出部分由后续请求等待偿还。
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1):
+        """阻塞直到桶内有足够令牌并扣除，超过容量的请求按容量计算"""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def consume(self, amount: float):
+        """直接扣除令牌，不等待"""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数，中文约每1.5个字符一个token"""
+    return int(len(text or '') / 1.5) + 1
+
+
+def estimate_payload_tokens(payload: Dict) -> int:
+    """估算请求的输入token数"""
+    return sum(estimate_tokens(message.get('content')) for message in payload.get('messages', []))
+
+
+class LLMClient:
+    """
+    共享的LLM调用客户端
+
+    同一进程内的所有AI调用共用令牌桶与并发信号量，批量生成时并发请求不会超出服务商的限额。
+    请求路由到延迟最低的健康服务商，失败时立即切换到下一个，熔断中的服务商直接跳过。
+    """
+
+    def __init__(self, providers=None, max_concurrency: Optional[int] = None,
+                 requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None,
+                 max_retries: Optional[int] = None):
+        self.pool = ProviderPool(providers or AI_PROVIDERS)
+        self.max_concurrency = max_concurrency or config.AI_LLM_MAX_CONCURRENCY
+        self.max_retries = config.AI_LLM_MAX_RETRIES if max_retries is None else max_retries
+
+        self._request_bucket = TokenBucket(requests_per_minute or config.AI_LLM_REQUESTS_PER_MINUTE)
+        self._token_bucket = TokenBucket(tokens_per_minute or config.AI_LLM_TOKENS_PER_MINUTE)
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._session = http_session.create_session(pool_maxsize=self.max_concurrency)
+
+    def _build_headers(self, provider) -> Dict:
+        return {
+            "Authorization": f"Bearer {provider.config.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """计算重试等待时间，优先使用Retry-After"""
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), config.AI_LLM_BACKOFF_MAX)
+        delay = config.AI_LLM_BACKOFF_BASE * (2 ** attempt)
+        return min(delay, config.AI_LLM_BACKOFF_MAX) * random.uniform(0.5, 1.0)
+
+    def _post(self, payload: Dict, stream: bool, timeout=None):
+        """
+        限流后发送请求，返回(服务商, 状态码200的响应)
+
+        每一轮按延迟从低到高尝试熔断器放行的服务商，失败立即切换到下一个；
+        本轮全部失败后退避重试，所有服务商均已熔断时立即失败，由调用方降级。
+        """
+        self._token_bucket.acquire(estimate_payload_tokens(payload))
+
+        last_error = None
+        retry_after = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = self._backoff(attempt - 1, retry_after)
+                global_logger.warning(f"AI API调用失败({last_error})，{delay:.1f}s后第{attempt}次重试")
+                time.sleep(delay)
+
+            tried = []
+            retry_after = None
+            while True:
+                provider = self.pool.select(exclude=tried)
+                if provider is None:
+                    break
+                tried.append(provider.name)
+
+                # 重试与切换同样计入每分钟请求数
+                self._request_bucket.acquire()
+                started = time.time()
+                try:
+                    response = self._session.post(
+                        f"{provider.config.base_url}/chat/completions",
+                        headers=self._build_headers(provider),
+                        json=dict(payload, model=provider.config.model),
+                        timeout=timeout or (config.AI_LLM_CONNECT_TIMEOUT, provider.config.timeout),
+                        stream=stream
+                    )
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    provider.record_failure(time.time() - started)
+                    last_error = f"{provider.name} {type(e).__name__}"
+                    global_logger.warning(f"AI服务商 {provider.name} 请求异常: {str(e)}")
+                    continue
+
+                elapsed = time.time() - started
+                if response.status_code == 200:
+                    provider.record_success(elapsed)
+                    return provider, response
+
+                last_error = f"{provider.name} HTTP {response.status_code}"
+                if response.status_code == 429:
+                    # 限流不代表服务商故障，不计入熔断
+                    provider.breaker.release_trial()
+                    retry_after = response.headers.get('Retry-After')
+                elif response.status_code in RETRYABLE_STATUS_CODES:
+                    provider.record_failure(elapsed)
+                else:
+                    provider.breaker.release_trial()
+                    raise LLMClientError(f"AI API调用失败: {provider.name} {response.status_code} "
+                                         f"{response.text[:500]}", response.status_code)
+                response.close()
+                global_logger.warning(f"AI服务商 {provider.name} 返回 {response.status_code}，切换服务商")
+
+            if not tried:
+                raise LLMClientError(f"所有AI服务商均已熔断，最近错误: {last_error}")
+
+        raise LLMClientError(f"AI API调用失败，已重试{self.max_retries}次: {last_error}")
+
+    def chat(self, payload: Dict, timeout=None) -> Dict:
+        """
+        发送非流式请求
+
+        Args:
+            payload: chat/completions请求体，model会替换为所选服务商的模型
+            timeout: 超时时间，缺省为连接AI_LLM_CONNECT_TIMEOUT秒、读取为服务商配置的timeout
+
+        Returns:
+            Dict: 响应JSON，provider为实际响应的服务商名称
+        """
+        with self._semaphore:
+            provider, response = self._post(payload, stream=False, timeout=timeout)
+            result = response.json()
+        result['provider'] = provider.name
+
+        # 按实际输出补扣token
+        usage = result.get('usage') or {}
+        if usage.get('completion_tokens'):
+            self._token_bucket.consume(usage['completion_tokens'])
+        return result
+
+    @contextmanager
+    def stream(self, payload: Dict, timeout=None):
+        """
+        发送流式请求，读取响应期间一直占用并发名额
+
+        Args:
+            payload: chat/completions请求体，需包含stream=True
+            timeout: 超时时间，缺省为连接AI_LLM_CONNECT_TIMEOUT秒、相邻数据间隔为服务商配置的timeout
+
+        产出的响应对象上provider属性为实际响应的服务商名称。
+        """
+        with self._semaphore:
+            provider, response = self._post(payload, stream=True, timeout=timeout)
+            response.provider = provider.name
+            try:
+                yield response
+            finally:
+                response.close()
+
+    def record_usage(self, tokens: int):
+        """补扣流式响应的输出token，流式响应不返回usage，由调用方按输出内容估算"""
+        if tokens > 0:
+            self._token_bucket.consume(tokens)
+
+
+# 单例实例
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """获取LLM调用客户端实例"""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                _llm_client = LLMClient()
+    return _llm_client
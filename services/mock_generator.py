@@ -0,0 +1,328 @@
+"""
+模拟测试用例生成服务
+负责按参数类型组合生成边界值、类型错误、长度、特殊字符与注入用例，支持pairwise/n-wise覆盖缩减并以生成器方式逐个产出
+"""
+import itertools
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app import global_logger
+from configs import config
+
+# 单参数异常用例的类别：(类别, 用例名称, 期望状态码, 断言描述, 优先级)
+FAULT_CATEGORIES = [
+    ('empty', '参数为空测试', 400, '参数为空时应返回400状态码', 2),
+    ('invalid_type', '参数类型错误测试', 400, '参数类型错误时应返回400状态码', 2),
+    ('over_length', '超长/越界测试', 400, '超长或越界参数应返回400状态码', 2),
+    ('special', '特殊字符测试', 200, '特殊字符应正常处理', 2),
+    ('injection', 'SQL注入测试', 400, 'SQL注入应被拦截', 3),
+]
+
+SPECIAL_CHARS = ["中文测试", "测试@#$%^&*()", "<script>"]
+SQL_INJECTION_PAYLOADS = [
+    "' OR '1'='1",
+    "'; DROP TABLE users; --",
+    "' UNION SELECT * FROM users --",
+    "admin'--"
+]
+
+INT32_MAX = 2 ** 31 - 1
+
+
+class ParamSpec:
+    """参数定义"""
+
+    def __init__(self, name: str, param_type: str = 'string', max_length: Optional[int] = None):
+        self.name = name
+        self.type = (param_type or 'string').lower()
+        self.max_length = max_length or config.MOCK_STRING_MAX_LENGTH
+
+
+def _infer_type(value) -> str:
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, str) and value.lower() in ('string', 'int', 'integer', 'float', 'number', 'bool',
+                                                    'boolean', 'email', 'phone'):
+        return value
+    return 'string'
+
+
+def normalize_params(params) -> List[ParamSpec]:
+    """
+    将接口参数定义统一为ParamSpec列表
+
+    支持 {"参数名": "类型"}、{"参数名": {"type": ..., "max_length": ...}}、{"参数名": 示例值}
+    以及 [{"name": ..., "type": ...}] 几种写法。
+    """
+    if not params:
+        return []
+
+    if isinstance(params, list):
+        items = [(item.get('name'), item) for item in params if isinstance(item, dict) and item.get('name')]
+    elif isinstance(params, dict):
+        items = list(params.items())
+    else:
+        return []
+
+    specs = []
+    for name, definition in items:
+        if isinstance(definition, dict):
+            specs.append(ParamSpec(name, _infer_type(definition.get('type', 'string')),
+                                   definition.get('max_length') or definition.get('maxLength')))
+        else:
+            specs.append(ParamSpec(name, _infer_type(definition)))
+    return specs
+
+
+def value_classes(spec: ParamSpec) -> Dict[str, List[Tuple[str, object]]]:
+    """
+    按参数类型生成各类别的取值，每个取值为(说明, 值)
+
+    valid中的取值都是合法值，第一个作为其他用例中该参数的默认值，其余为边界值，参与组合覆盖。
+    """
+    param_type = spec.type
+    over_length = 'a' * max(spec.max_length * 20, 1000)
+
+    if param_type in ('int', 'integer'):
+        return {
+            'valid': [('常规值', 123), ('边界值0', 0), ('边界值1', 1), ('最大值', INT32_MAX)],
+            'empty': [('空值', '')],
+            'invalid_type': [('非数字', 'not_a_number')],
+            'over_length': [('超出int32', INT32_MAX + 1)],
+        }
+    if param_type in ('float', 'number'):
+        return {
+            'valid': [('常规值', 123.45), ('边界值0', 0.0), ('负数', -1.5)],
+            'empty': [('空值', '')],
+            'invalid_type': [('非数字', 'not_a_float')],
+        }
+    if param_type in ('bool', 'boolean'):
+        return {
+            'valid': [('真', True), ('假', False)],
+            'empty': [('空值', '')],
+            'invalid_type': [('非布尔值', 'not_boolean')],
+        }
+    if param_type == 'email':
+        return {
+            'valid': [('常规值', 'test@example.com'), ('最短格式', 'a@b.co')],
+            'empty': [('空值', '')],
+            'invalid_type': [('格式错误', 'invalid_email')],
+            'over_length': [('超长', over_length + '@example.com')],
+        }
+    if param_type == 'phone':
+        return {
+            'valid': [('常规值', '13800138000')],
+            'empty': [('空值', '')],
+            'invalid_type': [('格式错误', 'invalid_phone'), ('位数不足', '1380013800')],
+        }
+    return {
+        'valid': [('常规值', 'testvalue'), ('最短长度', 'a'), ('最大长度', 'a' * spec.max_length)],
+        'empty': [('空值', '')],
+        'invalid_type': [('数字类型', 12345)],
+        'over_length': [('超长', over_length)],
+        'special': [('特殊字符', value) for value in SPECIAL_CHARS],
+        'injection': [('SQL注入', value) for value in SQL_INJECTION_PAYLOADS],
+    }
+
+
+def _tuple_count(domain_sizes: Sequence[int], strength: int) -> int:
+    """待覆盖的strength元组合总数，即各参数取值个数的strength阶初等对称多项式"""
+    counts = [1] + [0] * strength
+    for size in domain_sizes:
+        for order in range(strength, 0, -1):
+            counts[order] += counts[order - 1] * size
+    return counts[strength]
+
+
+def covering_array(domain_sizes: Sequence[int], strength: int = 2) -> Iterator[Tuple[int, ...]]:
+    """
+    贪心生成t-wise覆盖数组，逐行产出每个参数的取值下标
+
+    strength为0或不小于参数数时产出全组合；为1时每个取值至少出现一次；
+    其余情况保证任意strength个参数的所有取值组合至少出现一次。
+    覆盖情况按参数组合分别记录已覆盖的取值，不预先展开全部待覆盖组合；
+    待覆盖组合数超过MOCK_MAX_NWISE_TUPLES时自动降低强度，保证耗时与内存占用有上限。
+
+    Args:
+        domain_sizes: 每个参数的取值个数
+        strength: 覆盖强度，2即pairwise
+
+    Returns:
+        取值下标元组的生成器
+    """
+    k = len(domain_sizes)
+    if k == 0:
+        return
+
+    if strength <= 0 or strength >= k:
+        yield from itertools.product(*(range(size) for size in domain_sizes))
+        return
+
+    while strength > 1 and _tuple_count(domain_sizes, strength) > config.MOCK_MAX_NWISE_TUPLES:
+        global_logger.warning(f"{strength}-wise待覆盖组合数超过上限，降低为{strength - 1}-wise")
+        strength -= 1
+
+    if strength == 1:
+        for index in range(max(domain_sizes)):
+            yield tuple(min(index, size - 1) for size in domain_sizes)
+        return
+
+    # 每个参数组合已覆盖的取值组合
+    covered = {combo: set() for combo in itertools.combinations(range(k), strength)}
+    combos = list(covered)
+    cursor = 0
+
+    while True:
+        # 以第一个未完全覆盖的参数组合中第一个未覆盖的取值组合作为种子，其余参数逐个选择新增覆盖最多的取值
+        seed = None
+        while cursor < len(combos):
+            combo = combos[cursor]
+            seen = covered[combo]
+            total = 1
+            for param in combo:
+                total *= domain_sizes[param]
+            if len(seen) < total:
+                seed = combo, next(values for values in itertools.product(*(range(domain_sizes[p]) for p in combo))
+                                   if values not in seen)
+                break
+            cursor += 1
+        if seed is None:
+            return
+
+        seed_combo, seed_values = seed
+        row = [None] * k
+        for param, value in zip(seed_combo, seed_values):
+            row[param] = value
+
+        for param in range(k):
+            if row[param] is not None:
+                continue
+            assigned = [q for q in range(k) if row[q] is not None]
+            best_value, best_gain = 0, -1
+            for value in range(domain_sizes[param]):
+                row[param] = value
+                gain = 0
+                for others in itertools.combinations(assigned, strength - 1):
+                    combo = tuple(sorted(others + (param,)))
+                    if tuple(row[q] for q in combo) not in covered[combo]:
+                        gain += 1
+                if gain > best_gain:
+                    best_value, best_gain = value, gain
+            row[param] = best_value
+
+        row = tuple(row)
+        for combo, seen in covered.items():
+            seen.add(tuple(row[q] for q in combo))
+        yield row
+
+
+def _roundrobin(iterators: List[Iterator]) -> Iterator:
+    """轮流从各生成器取值，保证截取前若干个用例时覆盖各个类别"""
+    active = list(iterators)
+    while active:
+        for iterator in list(active):
+            try:
+                yield next(iterator)
+            except StopIteration:
+                active.remove(iterator)
+
+
+class MockTestcaseGenerator:
+    """
+    组合式模拟测试用例生成器
+
+    产出顺序：正常场景、无权限，然后轮流产出各类单参数异常用例（每个用例只有一个参数取异常值，
+    便于定位），最后是合法边界值的n-wise组合用例。全部用例按需生成，不会一次性物化。
+    """
+
+    def __init__(self, interface_data: Dict, strength: Optional[int] = None):
+        self.name = interface_data.get('name', '未知接口')
+        self.url = interface_data.get('url', '/api/test')
+        self.method = interface_data.get('method', 'POST')
+        self.strength = config.MOCK_NWISE_STRENGTH if strength is None else strength
+
+        self.params = normalize_params(interface_data.get('params', {}))
+        self.classes = [value_classes(spec) for spec in self.params]
+        self.valid_params = {spec.name: classes['valid'][0][1] for spec, classes in zip(self.params, self.classes)}
+
+    def _build_case(self, name: str, description: str, priority: int, params: Dict, expected_status: int,
+                    assertion_description: str) -> Dict:
+        return {
+            "name": f"{self.name} - {name}",
+            "description": description,
+            "priority": priority,
+            "request_url": self.url,
+            "request_method": self.method,
+            "request_headers": {"Content-Type": "application/json"},
+            "request_params": params,
+            "expected_status": expected_status,
+            "assertions": [
+                {
+                    "type": "status_code",
+                    "operator": "equals",
+                    "expected": expected_status,
+                    "description": assertion_description
+                }
+            ],
+            "pre_script": "",
+            "post_script": "",
+            "status": 1
+        }
+
+    def _fault_cases(self, category: str, title: str, expected_status: int, assertion_description: str,
+                     priority: int) -> Iterator[Dict]:
+        for spec, classes in zip(self.params, self.classes):
+            for label, value in classes.get(category, []):
+                params = dict(self.valid_params)
+                params[spec.name] = value
+                yield self._build_case(f"{spec.name}{title}", f"测试{spec.name}参数{label}时的接口响应", priority,
+                                       params, expected_status, assertion_description)
+
+    def _combination_cases(self) -> Iterator[Dict]:
+        domains = [classes['valid'] for classes in self.classes]
+        if not domains or all(len(domain) == 1 for domain in domains):
+            return
+
+        index = 0
+        for row in covering_array([len(domain) for domain in domains], self.strength):
+            # 全部取默认值的组合与正常场景重复
+            if not any(row):
+                continue
+            index += 1
+            params = {}
+            labels = []
+            for spec, domain, value_index in zip(self.params, domains, row):
+                label, value = domain[value_index]
+                params[spec.name] = value
+                if value_index:
+                    labels.append(f"{spec.name}={label}")
+            yield self._build_case(f"边界值组合测试{index}", f"合法边界值组合：{', '.join(labels)}", 2,
+                                   params, 200, "合法边界值组合应正常处理")
+
+    def iter_testcases(self) -> Iterator[Dict]:
+        """逐个产出测试用例"""
+        yield self._build_case("正常场景测试", "使用有效参数进行正常场景测试", 1, dict(self.valid_params), 200,
+                               "HTTP状态码应为200")
+        yield self._build_case("无权限测试", "测试无权限访问的处理", 2, dict(self.valid_params), 401,
+                               "无权限时应返回401状态码")
+        yield from _roundrobin([self._fault_cases(*category) for category in FAULT_CATEGORIES])
+        yield from self._combination_cases()
+
+
+def iter_mock_testcases(interface_data: Dict, count: Optional[int] = None,
+                        strength: Optional[int] = None) -> Iterator[Dict]:
+    """
+    按接口定义逐个产出模拟测试用例
+
+    Args:
+        interface_data: 接口信息
+        count: 最多产出的用例数，为空时产出全部
+        strength: 组合覆盖强度，缺省使用MOCK_NWISE_STRENGTH
+
+    Returns:
+        测试用例生成器
+    """
+    return itertools.islice(MockTestcaseGenerator(interface_data, strength).iter_testcases(), count)
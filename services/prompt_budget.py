@@ -0,0 +1,127 @@
+"""
+提示词预算服务
+负责估算提示词token数，把失败用例按失败聚类签名聚合，并将各组代表用例装入尽量少的AI请求
+"""
+import json
+from typing import Dict, List, Optional
+
+from configs import config
+from services.failure_clustering import case_signature
+from services.llm_client import estimate_tokens
+
+
+def _truncate(value, limit: int) -> str:
+    if value is None or value == '':
+        return ''
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False)
+    return value if len(value) <= limit else value[:limit] + '...'
+
+
+def group_failures(failed_cases: List[Dict], body_chars: Optional[int] = None) -> List[Dict]:
+    """
+    按失败聚类签名（状态码、归一化后的错误信息与响应体结构）聚合失败用例，每组保留一个代表用例
+
+    Args:
+        failed_cases: 失败的测试结果列表
+        body_chars: 代表用例请求体与响应体保留的最大字符数
+
+    Returns:
+        List[Dict]: 按失败数从多到少排列的分组
+    """
+    body_chars = body_chars or config.AI_ANALYSIS_BODY_CHARS
+    groups = {}
+    for case in failed_cases:
+        signature, error_pattern, _ = case_signature(case)
+        group = groups.get(signature)
+        if group is None:
+            group = groups[signature] = {
+                'signature': signature,
+                'status_code': case.get('response_status') or 'unknown',
+                'error_pattern': error_pattern[:200],
+                'count': 0,
+                'testcase_names': [],
+                'representative': {
+                    'testcase_name': case.get('testcase_name', 'Unknown'),
+                    'error_message': _truncate(case.get('error_message'), body_chars),
+                    'request_method': case.get('request_method', ''),
+                    'request_url': case.get('request_url', ''),
+                    'request_body': _truncate(case.get('request_body'), body_chars),
+                    'response_body': _truncate(case.get('response_body'), body_chars)
+                }
+            }
+        group['count'] += 1
+        if len(group['testcase_names']) < 5:
+            group['testcase_names'].append(case.get('testcase_name', 'Unknown'))
+
+    return sorted(groups.values(), key=lambda item: item['count'], reverse=True)
+
+
+def group_tokens(group: Dict) -> int:
+    """估算一个分组写入提示词后的token数"""
+    return estimate_tokens(json.dumps(group, ensure_ascii=False, indent=2))
+
+
+def shrink_group(group: Dict, max_tokens: int) -> Dict:
+    """单个分组超出预算时逐步截短代表用例的请求体与响应体"""
+    limit = config.AI_ANALYSIS_BODY_CHARS
+    while group_tokens(group) > max_tokens and limit > 50:
+        limit //= 2
+        representative = group['representative']
+        for field in ('request_body', 'response_body', 'error_message'):
+            representative[field] = _truncate(representative[field], limit)
+    return group
+
+
+class PromptBudget:
+    """
+    提示词token预算
+
+    可用预算 = 模型上下文窗口 - 预留的输出token - 固定提示词部分的token。
+    """
+
+    def __init__(self, base_prompt: str, context_window: Optional[int] = None,
+                 max_output_tokens: Optional[int] = None):
+        self.context_window = context_window or config.AI_CONTEXT_WINDOW
+        self.max_output_tokens = max_output_tokens or config.AI_ANALYSIS_MAX_OUTPUT_TOKENS
+        self.base_tokens = estimate_tokens(base_prompt)
+
+    @property
+    def available(self) -> int:
+        return self.context_window - self.max_output_tokens - self.base_tokens
+
+    def pack(self, groups: List[Dict], max_requests: Optional[int] = None) -> List[List[Dict]]:
+        """
+        按首次适应把分组装入尽量少的请求
+
+        分组已按失败数排序，超过max_requests个请求仍装不下的分组不再发送，只体现在统计中。
+
+        Args:
+            groups: group_failures的结果
+            max_requests: 最多请求数，缺省使用AI_ANALYSIS_MAX_REQUESTS
+
+        Returns:
+            List[List[Dict]]: 每个请求包含的分组
+        """
+        max_requests = max_requests or config.AI_ANALYSIS_MAX_REQUESTS
+        available = self.available
+        if available <= 0:
+            return []
+
+        bins = []
+        bin_tokens = []
+        for group in groups:
+            tokens = group_tokens(shrink_group(group, available))
+            if tokens > available:
+                continue
+            for index, used in enumerate(bin_tokens):
+                if used + tokens <= available:
+                    bins[index].append(group)
+                    bin_tokens[index] += tokens
+                    break
+            else:
+                if len(bins) >= max_requests:
+                    continue
+                bins.append([group])
+                bin_tokens.append(tokens)
+        return bins
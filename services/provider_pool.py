@@ -0,0 +1,159 @@
+"""
+AI服务商池
+负责为每个服务商维护熔断器与延迟EWMA，并把请求路由到最快的健康服务商
+"""
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from app import global_logger
+from configs import config
+from utils import metrics
+
+# 熔断器状态，数值用于Prometheus指标
+STATE_CLOSED = 'closed'
+STATE_HALF_OPEN = 'half_open'
+STATE_OPEN = 'open'
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败达到阈值后打开，打开期间直接拒绝请求；冷却时间过后进入半开状态，
+    只放行一个试探请求，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, name: str, failure_threshold: Optional[int] = None, open_seconds: Optional[int] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or config.AI_CIRCUIT_FAILURE_THRESHOLD
+        self.open_seconds = open_seconds or config.AI_CIRCUIT_OPEN_SECONDS
+
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            global_logger.warning(f"AI服务商 {self.name} 熔断器状态: {self.state} -> {state}")
+            self.state = state
+            metrics.update_ai_provider_state(self.name, STATE_VALUES[state])
+
+    def allow_request(self) -> bool:
+        """是否放行请求，半开状态下只放行一个试探请求"""
+        with self._lock:
+            if self.state == STATE_OPEN:
+                if time.time() - self.opened_at < self.open_seconds:
+                    return False
+                self._set_state(STATE_HALF_OPEN)
+                self._trial_in_flight = False
+
+            if self.state == STATE_HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def is_available(self) -> bool:
+        """是否可能放行请求，不占用半开状态的试探名额"""
+        with self._lock:
+            if self.state == STATE_OPEN:
+                return time.time() - self.opened_at >= self.open_seconds
+            if self.state == STATE_HALF_OPEN:
+                return not self._trial_in_flight
+            return True
+
+    def release_trial(self):
+        """请求结果不代表服务商健康状况（如429）时归还半开状态的试探名额"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            self._set_state(STATE_CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.time()
+                self._set_state(STATE_OPEN)
+
+
+class Provider:
+    """单个AI服务商及其熔断器、延迟EWMA"""
+
+    def __init__(self, ai_config, alpha: Optional[float] = None):
+        self.config = ai_config
+        self.name = ai_config.name
+        self.breaker = CircuitBreaker(self.name)
+        self.alpha = alpha or config.AI_PROVIDER_EWMA_ALPHA
+        self.latency_ewma = None
+        self._lock = threading.Lock()
+
+    def record_success(self, latency_seconds: float):
+        with self._lock:
+            if self.latency_ewma is None:
+                self.latency_ewma = latency_seconds
+            else:
+                self.latency_ewma = self.alpha * latency_seconds + (1 - self.alpha) * self.latency_ewma
+        self.breaker.record_success()
+        metrics.record_ai_provider_request(self.name, True, latency_seconds, self.latency_ewma)
+
+    def record_failure(self, latency_seconds: float):
+        self.breaker.record_failure()
+        metrics.record_ai_provider_request(self.name, False, latency_seconds)
+
+    def status(self) -> Dict:
+        return {
+            "name": self.name,
+            "base_url": self.config.base_url,
+            "model": self.config.model,
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 2) if self.latency_ewma is not None else None
+        }
+
+
+class ProviderPool:
+    """
+    服务商池
+
+    按延迟EWMA从低到高选择熔断器放行的服务商，尚无延迟数据的服务商优先，以便尽快测得延迟。
+    """
+
+    def __init__(self, provider_configs: Iterable):
+        self.providers: List[Provider] = [Provider(provider_config) for provider_config in provider_configs]
+        for provider in self.providers:
+            metrics.update_ai_provider_state(provider.name, STATE_VALUES[STATE_CLOSED])
+
+    def select(self, exclude: Iterable[str] = ()) -> Optional[Provider]:
+        """
+        选择本次请求使用的服务商
+
+        Args:
+            exclude: 本次请求中已失败的服务商名称
+
+        Returns:
+            Provider: 最快的健康服务商，全部熔断或已排除时返回None
+        """
+        excluded = set(exclude)
+        candidates = sorted((provider for provider in self.providers if provider.name not in excluded),
+                            key=lambda provider: provider.latency_ewma or 0)
+        for provider in candidates:
+            if provider.breaker.allow_request():
+                return provider
+        return None
+
+    def has_available(self) -> bool:
+        """是否存在熔断器未打开的服务商"""
+        return any(provider.breaker.is_available() for provider in self.providers)
+
+    def status(self) -> List[Dict]:
+        return [provider.status() for provider in self.providers]
@@ -0,0 +1,167 @@
+"""
+测试结果写入服务
+负责批次执行期间api_result的缓冲批量写入
+"""
+import threading
+import time
+import traceback
+from typing import Callable, List, Optional
+
+from configs import config
+from app import global_logger
+
+# api_result插入语句，字段顺序与执行引擎生成的结果参数一致
+RESULT_INSERT_SQL = """
+    INSERT INTO api_result (
+        id, testcase_id, interface_id, app_id, batch_id, request_url, request_method,
+        request_headers, request_body, response_status, response_headers, response_body,
+        assertion_results, is_success, error_message, execution_time, executor_id,
+        executor_name, execute_time, test_request_id
+    ) VALUES (
+        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+    )
+"""
+
+# 结果参数中各字段的位置
+INTERFACE_ID_INDEX = 2
+IS_SUCCESS_INDEX = 13
+EXECUTION_TIME_INDEX = 15
+
+
+class ResultWriter:
+    """
+    批次结果缓冲写入器
+
+    结果行先进入缓冲区，达到批量大小或超过刷新间隔时通过executemany一次写入，
+    每次刷新后按实际写入的行调用on_flush回调累加批次通过/失败数，写入失败的行只计入dropped_rows。
+    指定latency时，每条结果加入缓冲区时同步记录执行时间到延迟直方图。
+    """
+
+    def __init__(self, pool, batch_id: str, on_flush: Optional[Callable[[int, int], None]] = None,
+                 batch_size: Optional[int] = None, flush_interval: Optional[float] = None,
+                 latency=None):
+        """
+        初始化写入器
+
+        Args:
+            pool: 数据库连接池
+            batch_id: 批次ID
+            on_flush: 刷新完成后的回调，参数为本次刷新的通过数与失败数
+            batch_size: 触发刷新的缓冲行数
+            flush_interval: 定时刷新间隔(秒)
+            latency: 批次延迟统计（BatchLatency）
+        """
+        self.pool = pool
+        self.batch_id = batch_id
+        self.on_flush = on_flush
+        self.batch_size = max(1, batch_size or config.RESULT_WRITER_BATCH_SIZE)
+        self.flush_interval = flush_interval or config.RESULT_WRITER_FLUSH_INTERVAL
+        self.latency = latency
+
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._last_flush = time.time()
+        self.dropped_rows = 0
+
+        self._flusher = threading.Thread(target=self._run_flusher, name=f'result-writer-{batch_id}', daemon=True)
+        self._flusher.start()
+
+    def add(self, params: List):
+        """
+        添加一条结果，batch_id在写入前统一设置
+
+        Args:
+            params: 与RESULT_INSERT_SQL字段顺序一致的参数列表
+        """
+        row = list(params)
+        row[4] = self.batch_id
+
+        if self.latency is not None:
+            self.latency.record(row[INTERFACE_ID_INDEX], row[EXECUTION_TIME_INDEX])
+
+        with self._buffer_lock:
+            self._buffer.append(row)
+            should_flush = len(self._buffer) >= self.batch_size
+
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """将缓冲区中的结果写入数据库"""
+        with self._flush_lock:
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+            self._last_flush = time.time()
+
+            if not rows:
+                return
+
+            written = self._write(rows)
+
+            passed_cases = sum(1 for row in written if row[IS_SUCCESS_INDEX])
+            failed_cases = len(written) - passed_cases
+            global_logger.info(f'批量写入测试结果，批次ID: {self.batch_id}，行数: {len(written)}/{len(rows)}')
+
+            dropped = len(rows) - len(written)
+            if dropped:
+                self.dropped_rows += dropped
+                global_logger.error(f'测试结果写入失败已丢弃，批次ID: {self.batch_id}，本次: {dropped}，'
+                                    f'累计: {self.dropped_rows}')
+
+            if self.on_flush:
+                try:
+                    self.on_flush(passed_cases, failed_cases)
+                except Exception as e:
+                    global_logger.error(f'结果写入回调异常，批次ID: {self.batch_id}，错误: {str(e)}')
+
+    def close(self):
+        """停止定时刷新并写入剩余结果"""
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _run_flusher(self):
+        while not self._closed.wait(self.flush_interval):
+            if time.time() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def _write(self, rows: List[List]) -> List[List]:
+        """
+        批量写入，失败时逐行重试，避免单行错误导致整批结果丢失
+
+        Returns:
+            成功写入的行
+        """
+        conn = self.pool.connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.executemany(RESULT_INSERT_SQL, rows)
+            conn.commit()
+            return rows
+        except Exception as e:
+            global_logger.error(f'批量写入测试结果异常，批次ID: {self.batch_id}，将逐行重试，错误: {str(e)}')
+            conn.rollback()
+
+            written = []
+            for row in rows:
+                try:
+                    cursor.execute(RESULT_INSERT_SQL, row)
+                    conn.commit()
+                    written.append(row)
+                except Exception as e:
+                    global_logger.error(f'写入测试结果异常，结果ID: {row[0]}，错误: {str(e)}')
+                    global_logger.error(traceback.format_exc())
+                    conn.rollback()
+            return written
+        finally:
+            cursor.close()
+            conn.close()
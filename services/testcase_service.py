@@ -8,11 +8,22 @@ import json
 import uuid
 from datetime import datetime
 from typing import Dict, List, Optional
-from dbutils.pooled_db import PooledDB
-from configs import config
+from utils.db_pool import get_pool
 from app import global_logger
+import time
 import traceback
 
+# api_testcase插入语句，executemany时由pymysql合并为多行INSERT
+TESTCASE_INSERT_SQL = """
+    INSERT INTO api_testcase (
+        id, interface_id, app_id, name, priority, request_url, request_method,
+        request_headers, request_params, expected_status, assertions, pre_script,
+        post_script, description, status, creator_id, creator_name, create_time, update_time
+    ) VALUES (
+        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+    )
+"""
+
 class TestcaseServiceError(Exception):
     """测试用例服务异常"""
     pass
@@ -22,9 +33,7 @@ class TestcaseService:
 
     def __init__(self):
         """初始化服务"""
-        self.pool = PooledDB(pymysql, mincached=2, maxcached=5, host=config.MYSQL_HOST, port=config.MYSQL_PORT,
-                        user=config.MYSQL_USER, passwd=config.MYSQL_PASSWORD, database=config.MYSQL_DATABASE,
-                        cursorclass=pymysql.cursors.DictCursor)
+        self.pool = get_pool()
         global_logger.info("测试用例服务初始化成功")
 
     def create_batch_with_cases(self, testcases: List[Dict], interface_data: Dict) -> int:
@@ -113,6 +122,65 @@ class TestcaseService:
             if connection:
                 connection.close()
 
+    def insert_testcases(self, testcases: List[Dict]) -> List[str]:
+        """
+        在一个事务内批量保存测试用例到api_testcase
+
+        Args:
+            testcases: 测试用例数据列表，字段同添加测试用例API
+
+        Returns:
+            List[str]: 与输入顺序一致的测试用例ID列表
+
+        Raises:
+            TestcaseServiceError: 保存失败，整批回滚
+        """
+        if not testcases:
+            return []
+
+        current_time = int(time.time())
+        testcase_ids = []
+        rows = []
+        for data in testcases:
+            testcase_id = str(uuid.uuid4()).replace('-', '')
+            testcase_ids.append(testcase_id)
+            rows.append((
+                testcase_id,
+                data['interface_id'],
+                data['app_id'],
+                data['name'],
+                data.get('priority', 2),
+                data['request_url'],
+                data['request_method'],
+                json.dumps(data.get('request_headers', {})) if data.get('request_headers') else None,
+                json.dumps(data.get('request_params', {})) if data.get('request_params') else None,
+                data.get('expected_status'),
+                json.dumps(data.get('assertions', [])) if data.get('assertions') else '[]',
+                data.get('pre_script'),
+                data.get('post_script'),
+                data.get('description', ''),
+                data.get('status', 1),
+                data['creator_id'],
+                data['creator_name'],
+                current_time,
+                current_time
+            ))
+
+        connection = self.pool.connection()
+        cursor = connection.cursor()
+        try:
+            cursor.executemany(TESTCASE_INSERT_SQL, rows)
+            connection.commit()
+            global_logger.info(f"批量保存测试用例成功，数量: {len(rows)}")
+            return testcase_ids
+        except Exception as e:
+            connection.rollback()
+            global_logger.error(f"批量保存测试用例失败: {traceback.format_exc()}")
+            raise TestcaseServiceError(f"批量保存测试用例失败: {e}")
+        finally:
+            cursor.close()
+            connection.close()
+
     def execute_batch(self, batch_id: str) -> bool:
         """
         执行批次测试 (复用现有执行逻辑)
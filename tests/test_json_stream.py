@@ -0,0 +1,48 @@
+# test_json_stream.py
+from utils.json_stream import JsonArrayStreamParser, iter_array_objects
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_objects_split_across_chunks():
+    text = '```json\n[{"name": "a", "params": {"x": [1, 2]}}, {"name": "b}"}]\n```'
+    for size in (1, 3, len(text)):
+        assert list(iter_array_objects(_chunks(text, size))) == [
+            {"name": "a", "params": {"x": [1, 2]}},
+            {"name": "b}"}
+        ]
+
+
+def test_bracket_in_preamble_is_not_array_start():
+    text = '返回[见下]：```json\n[ {"name": "a"}, {"name": "b"}]\n```'
+    for size in (1, 2, len(text)):
+        assert [item['name'] for item in iter_array_objects(_chunks(text, size))] == ['a', 'b']
+
+
+def test_empty_array():
+    parser = JsonArrayStreamParser()
+    assert parser.feed('说明[1] 结果：[') == []
+    assert parser.feed('  ]') == []
+    assert parser.finished
+
+
+def test_reads_remaining_chunks_after_array_closes():
+    consumed = []
+
+    def chunks():
+        for chunk in ('[{"name": "a"}]', '\n```', '\n说明'):
+            consumed.append(chunk)
+            yield chunk
+
+    assert list(iter_array_objects(chunks())) == [{"name": "a"}]
+    assert len(consumed) == 3
+
+
+def test_invalid_object_uses_on_error():
+    text = '[{"name": "a",}, {"name": "b"}]'
+    assert list(iter_array_objects([text], on_error=lambda raw: {"fixed": raw})) == [
+        {"fixed": '{"name": "a",}'},
+        {"name": "b"}
+    ]
@@ -0,0 +1,513 @@
+# assertions.py
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+from configs import config
+from utils import jsonpath
+
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+'''
+断言计划编译与执行
+
+测试用例的断言JSON编译为可直接执行的断言计划，按测试用例ID缓存，
+断言内容变化（用例更新）或显式失效时重新编译。支持的断言类型：
+    status_code    状态码，operator 默认 eq，无法识别的运算符按 eq 处理
+    json_path      JSONPath取值后比较，需 path
+    contains       响应体包含
+    regex          响应体或 path 取值匹配正则
+    json_schema    响应体满足JSON Schema（安装jsonschema时使用完整校验，否则使用内置子集）
+    header         响应头，需 name
+    response_time  响应时间(毫秒)，operator 默认 lte
+比较运算符：eq ne gt gte lt lte contains not_contains regex between in exists not_exists
+无法识别的比较运算符记录警告后按 eq 处理，与旧版断言保持兼容
+'''
+
+_OPERATOR_ALIASES = {
+    'equals': 'eq', '==': 'eq', 'not_equals': 'ne', '!=': 'ne',
+    '>': 'gt', '>=': 'gte', '<': 'lt', '<=': 'lte', 'matches': 'regex', 'range': 'between'
+}
+
+_SUPPORTED_OPERATORS = {
+    'eq', 'ne', 'gt', 'gte', 'lt', 'lte', 'contains', 'not_contains', 'regex', 'between', 'in', 'exists', 'not_exists'
+}
+
+_MISSING = object()
+
+# app模块在导入蓝图前才创建global_logger，这里直接按名称获取，避免循环导入
+logger = logging.getLogger('global_logger')
+
+
+class AssertionContext:
+    """单次响应的断言上下文"""
+
+    def __init__(self, status, headers, body, body_str, response_time):
+        self.status = status
+        self.body = body
+        self.body_str = body_str
+        self.response_time = response_time
+        self._raw_headers = headers or {}
+        self._headers = None
+
+    @property
+    def headers(self):
+        """按小写名称索引的响应头"""
+        if self._headers is None:
+            self._headers = {str(k).lower(): v for k, v in self._raw_headers.items()}
+        return self._headers
+
+
+class AssertionPlan:
+    """编译后的断言计划"""
+
+    def __init__(self, steps, error=None):
+        self.steps = steps
+        self.error = error
+
+    def evaluate(self, context):
+        """
+        执行断言计划
+
+        返回:
+            (is_success, assertion_results) 元组
+        """
+        if self.error:
+            return False, [{'type': 'error', 'expected': 'No error', 'actual': self.error, 'result': False}]
+
+        is_success = True
+        assertion_results = []
+        for assertion_type, expected, check in self.steps:
+            try:
+                actual, result = check(context)
+            except Exception as e:
+                actual, result = str(e), False
+
+            assertion_results.append({
+                'type': assertion_type,
+                'expected': expected,
+                'actual': actual,
+                'result': result
+            })
+            if not result:
+                is_success = False
+
+        return is_success, assertion_results
+
+
+# ---------------- 计划缓存 ----------------
+
+_plan_cache = OrderedDict()
+_plan_lock = threading.Lock()
+
+
+def get_assertion_plan(testcase_id, assertions_text):
+    """
+    获取测试用例的断言计划，断言内容与缓存不一致时重新编译
+
+    参数:
+        testcase_id: 测试用例ID
+        assertions_text: api_testcase.assertions 原始内容
+
+    返回:
+        AssertionPlan
+    """
+    key = str(testcase_id)
+    with _plan_lock:
+        cached = _plan_cache.get(key)
+        if cached and cached[0] == assertions_text:
+            _plan_cache.move_to_end(key)
+            return cached[1]
+
+    plan = compile_assertions(assertions_text)
+
+    with _plan_lock:
+        _plan_cache[key] = (assertions_text, plan)
+        _plan_cache.move_to_end(key)
+        while len(_plan_cache) > config.ASSERTION_PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+
+    return plan
+
+
+def invalidate_assertion_plan(testcase_id):
+    """测试用例更新或删除后使断言计划失效"""
+    with _plan_lock:
+        _plan_cache.pop(str(testcase_id), None)
+
+
+# ---------------- 编译 ----------------
+
+def compile_assertions(assertions_text):
+    """
+    将断言JSON编译为断言计划
+
+    参数:
+        assertions_text: 断言JSON字符串或已解析的断言列表
+
+    返回:
+        AssertionPlan
+    """
+    try:
+        assertions = assertions_text
+        # 兼容被重复序列化的断言内容
+        while isinstance(assertions, str):
+            assertions = json.loads(assertions) if assertions.strip() else []
+        if isinstance(assertions, dict):
+            assertions = [assertions]
+        if not isinstance(assertions, list):
+            raise ValueError(f'断言格式不正确: {type(assertions).__name__}')
+    except Exception as e:
+        return AssertionPlan([], error=str(e))
+
+    return AssertionPlan([_compile_step(assertion) for assertion in assertions])
+
+
+def _compile_step(assertion):
+    if not isinstance(assertion, dict):
+        return None, assertion, lambda context: (None, False)
+
+    assertion_type = assertion.get('type')
+    expected = assertion.get('expected')
+    operator = _normalize_operator(assertion.get('operator', assertion.get('compare_type')))
+
+    try:
+        if assertion_type == 'status_code':
+            # 兼容旧断言：状态码断言原先忽略operator，无法识别的运算符按eq处理
+            if operator not in _SUPPORTED_OPERATORS:
+                operator = 'eq'
+            check = _value_check(lambda context: context.status, operator, expected)
+        elif assertion_type == 'json_path':
+            check = _json_path_check(assertion.get('path'), operator or 'eq', expected)
+        elif assertion_type == 'contains':
+            check = _value_check(lambda context: context.body_str, 'contains', expected)
+        elif assertion_type == 'regex':
+            if assertion.get('path'):
+                check = _json_path_check(assertion['path'], 'regex', expected)
+            else:
+                check = _value_check(lambda context: context.body_str, 'regex', expected)
+        elif assertion_type == 'json_schema':
+            check = _schema_check(expected)
+        elif assertion_type == 'header':
+            check = _header_check(assertion.get('name') or assertion.get('header'), operator or 'eq', expected)
+        elif assertion_type == 'response_time':
+            check = _value_check(lambda context: context.response_time, operator or 'lte', expected)
+        else:
+            check = lambda context: (None, False)
+    except Exception as e:
+        error = f'断言配置错误: {str(e)}'
+        check = lambda context: (error, False)
+
+    return assertion_type, expected, check
+
+
+def _normalize_operator(operator):
+    if not operator:
+        return None
+    operator = str(operator).strip().lower()
+    return _OPERATOR_ALIASES.get(operator, operator)
+
+
+def _fallback_operator(operator):
+    """无法识别的运算符按eq处理，与旧版断言行为保持一致"""
+    if operator in _SUPPORTED_OPERATORS:
+        return operator
+    logger.warning(f'不支持的比较运算符: {operator}，按eq处理')
+    return 'eq'
+
+
+def _json_path_check(path, operator, expected):
+    compiled = jsonpath.compile_path(path)
+    compare = _compile_comparison(operator, expected)
+
+    def check(context):
+        if not isinstance(context.body, (dict, list)):
+            return None, operator == 'not_exists'
+        matches = compiled.find(context.body)
+        actual = matches[0] if matches else _MISSING
+        return (None if actual is _MISSING else actual), compare(actual)
+
+    return check
+
+
+def _header_check(name, operator, expected):
+    if not name:
+        raise ValueError('header断言缺少name')
+    header_name = str(name).lower()
+    compare = _compile_comparison(operator, expected)
+
+    def check(context):
+        actual = context.headers.get(header_name, _MISSING)
+        return (None if actual is _MISSING else actual), compare(actual)
+
+    return check
+
+
+def _value_check(getter, operator, expected):
+    compare = _compile_comparison(operator, expected)
+
+    def check(context):
+        actual = getter(context)
+        return actual, compare(actual)
+
+    return check
+
+
+def _schema_check(schema):
+    if isinstance(schema, str):
+        schema = json.loads(schema)
+    if not isinstance(schema, dict):
+        raise ValueError('json_schema断言的expected必须为对象')
+
+    if jsonschema is not None:
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator_class.check_schema(schema)
+        validator = validator_class(schema)
+
+        def validate(body):
+            error = jsonschema.exceptions.best_match(validator.iter_errors(body))
+            return error.message if error else None
+    else:
+        validate = _compile_schema(schema, '$')
+
+    def check(context):
+        error = validate(context.body)
+        return ('ok' if error is None else error), error is None
+
+    return check
+
+
+# ---------------- 比较 ----------------
+
+def _to_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in ('true', 'false'):
+        return str(value).strip().lower() == 'true'
+    return None
+
+
+def _compile_comparison(operator, expected):
+    """预先处理期望值，返回只需传入实际值的比较函数"""
+    operator = _fallback_operator(operator)
+    if operator == 'exists':
+        return lambda actual: actual is not _MISSING
+    if operator == 'not_exists':
+        return lambda actual: actual is _MISSING
+
+    expected_str = str(expected)
+
+    if operator in ('eq', 'ne'):
+        expected_number = _to_number(expected)
+        expected_bool = _to_bool(expected)
+
+        def equals(actual):
+            if actual is _MISSING:
+                return False
+            if isinstance(actual, bool):
+                return expected_bool is not None and actual == expected_bool
+            if isinstance(actual, (int, float)) and expected_number is not None:
+                return actual == expected_number
+            if actual is None:
+                # 旧版按str()比较，期望值"None"同样视为相等
+                return expected is None or expected_str.lower() == 'null' or expected_str == 'None'
+            if isinstance(actual, (dict, list)):
+                return actual == expected or json.dumps(actual, ensure_ascii=False) == expected_str
+            return str(actual) == expected_str
+
+        if operator == 'eq':
+            return equals
+        return lambda actual: actual is not _MISSING and not equals(actual)
+
+    if operator in ('gt', 'gte', 'lt', 'lte'):
+        expected_number = _to_number(expected)
+        if expected_number is None:
+            raise ValueError(f'{operator}比较的期望值必须为数字: {expected}')
+        test = {
+            'gt': lambda number: number > expected_number,
+            'gte': lambda number: number >= expected_number,
+            'lt': lambda number: number < expected_number,
+            'lte': lambda number: number <= expected_number,
+        }[operator]
+
+        def numeric(actual):
+            number = None if actual is _MISSING else _to_number(actual)
+            return number is not None and test(number)
+
+        return numeric
+
+    if operator == 'between':
+        if isinstance(expected, dict):
+            low, high = expected.get('min'), expected.get('max')
+        elif isinstance(expected, (list, tuple)) and len(expected) == 2:
+            low, high = expected
+        else:
+            raise ValueError(f'between的期望值必须为[min, max]或{{"min", "max"}}: {expected}')
+        low = _to_number(low) if low is not None else None
+        high = _to_number(high) if high is not None else None
+
+        def between(actual):
+            number = None if actual is _MISSING else _to_number(actual)
+            if number is None:
+                return False
+            return (low is None or number >= low) and (high is None or number <= high)
+
+        return between
+
+    if operator in ('contains', 'not_contains'):
+        def contains(actual):
+            if actual is _MISSING or actual is None:
+                return False
+            if isinstance(actual, list):
+                return expected in actual or expected_str in [str(item) for item in actual]
+            if isinstance(actual, dict):
+                return expected_str in actual
+            return expected_str in str(actual)
+
+        if operator == 'contains':
+            return contains
+        return lambda actual: actual is not _MISSING and not contains(actual)
+
+    if operator == 'regex':
+        pattern = re.compile(expected_str)
+        return lambda actual: actual is not _MISSING and actual is not None \
+            and pattern.search(actual if isinstance(actual, str) else str(actual)) is not None
+
+    if operator == 'in':
+        if not isinstance(expected, (list, tuple)):
+            raise ValueError(f'in的期望值必须为数组: {expected}')
+        candidates = _compile_comparison_set(expected)
+        return lambda actual: actual is not _MISSING and any(candidate(actual) for candidate in candidates)
+
+
+def _compile_comparison_set(values):
+    return [_compile_comparison('eq', value) for value in values]
+
+
+# ---------------- 内置JSON Schema子集 ----------------
+
+_SCHEMA_TYPES = {
+    'object': lambda value: isinstance(value, dict),
+    'array': lambda value: isinstance(value, list),
+    'string': lambda value: isinstance(value, str),
+    'integer': lambda value: isinstance(value, int) and not isinstance(value, bool),
+    'number': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    'boolean': lambda value: isinstance(value, bool),
+    'null': lambda value: value is None,
+}
+
+
+def _compile_schema(schema, location):
+    """
+    编译JSON Schema子集：type、enum、const、required、properties、additionalProperties、
+    items、minItems、maxItems、minLength、maxLength、pattern、minimum、maximum
+
+    返回的校验函数在不通过时返回错误信息，通过时返回None
+    """
+    checks = []
+
+    if 'type' in schema:
+        types = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+        type_checks = [_SCHEMA_TYPES[name] for name in types]
+        checks.append(lambda value: None if any(test(value) for test in type_checks)
+                      else f'{location} 类型应为 {"/".join(types)}')
+
+    if 'enum' in schema:
+        options = schema['enum']
+        checks.append(lambda value: None if value in options else f'{location} 不在枚举值 {options} 中')
+
+    if 'const' in schema:
+        const = schema['const']
+        checks.append(lambda value: None if value == const else f'{location} 应等于 {const}')
+
+    if 'required' in schema:
+        required = schema['required']
+
+        def check_required(value):
+            if isinstance(value, dict):
+                for name in required:
+                    if name not in value:
+                        return f'{location} 缺少必填字段 {name}'
+            return None
+
+        checks.append(check_required)
+
+    if 'properties' in schema or 'additionalProperties' in schema:
+        properties = {name: _compile_schema(sub, f'{location}.{name}')
+                      for name, sub in schema.get('properties', {}).items()}
+        additional = schema.get('additionalProperties', True)
+
+        def check_properties(value):
+            if not isinstance(value, dict):
+                return None
+            for name, item in value.items():
+                if name in properties:
+                    error = properties[name](item)
+                    if error:
+                        return error
+                elif additional is False:
+                    return f'{location} 不允许额外字段 {name}'
+            return None
+
+        checks.append(check_properties)
+
+    if isinstance(schema.get('items'), dict):
+        item_check = _compile_schema(schema['items'], f'{location}[]')
+
+        def check_items(value):
+            if isinstance(value, list):
+                for item in value:
+                    error = item_check(item)
+                    if error:
+                        return error
+            return None
+
+        checks.append(check_items)
+
+    for keyword, kind, test, message in (
+            ('minItems', list, lambda value, limit: len(value) >= limit, '元素数量不能少于'),
+            ('maxItems', list, lambda value, limit: len(value) <= limit, '元素数量不能多于'),
+            ('minLength', str, lambda value, limit: len(value) >= limit, '长度不能小于'),
+            ('maxLength', str, lambda value, limit: len(value) <= limit, '长度不能大于'),
+            ('minimum', (int, float), lambda value, limit: value >= limit, '不能小于'),
+            ('maximum', (int, float), lambda value, limit: value <= limit, '不能大于')):
+        if keyword in schema:
+            checks.append(_bound_check(location, schema[keyword], kind, test, message))
+
+    if 'pattern' in schema:
+        pattern = re.compile(schema['pattern'])
+        checks.append(lambda value: None if not isinstance(value, str) or pattern.search(value)
+                      else f'{location} 不匹配 {schema["pattern"]}')
+
+    def validate(value):
+        for check in checks:
+            error = check(value)
+            if error:
+                return error
+        return None
+
+    return validate
+
+
+def _bound_check(location, limit, kind, test, message):
+    def check(value):
+        if isinstance(value, kind) and not isinstance(value, bool) and not test(value, limit):
+            return f'{location} {message} {limit}'
+        return None
+    return check
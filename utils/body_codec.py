@@ -0,0 +1,95 @@
+# body_codec.py
+import base64
+import threading
+import zlib
+
+from configs import config
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+'''
+api_result.response_body 存储编码
+
+响应体按应用配置的上限截断，超过压缩阈值时压缩后以base64文本保存，
+并加上标记前缀，读取时通过decode_body透明还原；未带前缀的历史数据原样返回。
+response_body为文本列，压缩结果经base64编码后比压缩字节约多1/3。
+'''
+
+ZLIB_PREFIX = '#zlib:'
+ZSTD_PREFIX = '#zstd:'
+TRUNCATED_MARKER = '\n...[响应内容已截断，原始大小 {size} 字节]'
+
+# ZstdCompressor不能被多个线程同时使用，每个线程各自创建
+_local = threading.local()
+
+
+def _get_zstd_compressor():
+    compressor = getattr(_local, 'zstd_compressor', None)
+    if compressor is None:
+        compressor = _local.zstd_compressor = zstandard.ZstdCompressor(level=config.RESPONSE_BODY_ZSTD_LEVEL)
+    return compressor
+
+
+def get_body_limit(app_id):
+    """获取应用的响应体存储上限(字节)，0表示不限制"""
+    return config.RESPONSE_BODY_APP_LIMITS.get(app_id, config.RESPONSE_BODY_MAX_BYTES)
+
+
+def encode_body(body_text, app_id=None):
+    """
+    将响应体编码为存储格式
+
+    参数:
+        body_text: 响应体原始文本
+        app_id: 应用ID，用于确定存储上限
+
+    返回:
+        存储到数据库的文本
+    """
+    if body_text is None:
+        return None
+
+    data = body_text.encode('utf-8')
+
+    limit = get_body_limit(app_id)
+    if limit and len(data) > limit:
+        original_size = len(data)
+        # 按字节截断后丢弃不完整的多字节字符
+        data = data[:limit].decode('utf-8', errors='ignore').encode('utf-8')
+        data += TRUNCATED_MARKER.format(size=original_size).encode('utf-8')
+
+    compression = config.RESPONSE_BODY_COMPRESSION
+    if compression == 'none' or len(data) < config.RESPONSE_BODY_COMPRESS_MIN_BYTES:
+        return data.decode('utf-8')
+
+    if compression == 'zstd' and zstandard is not None:
+        return ZSTD_PREFIX + base64.b64encode(_get_zstd_compressor().compress(data)).decode('ascii')
+
+    return ZLIB_PREFIX + base64.b64encode(zlib.compress(data, config.RESPONSE_BODY_ZLIB_LEVEL)).decode('ascii')
+
+
+def decode_body(stored):
+    """
+    还原存储的响应体
+
+    参数:
+        stored: 数据库中的response_body
+
+    返回:
+        响应体原始文本
+    """
+    if not isinstance(stored, str):
+        return stored
+
+    if stored.startswith(ZLIB_PREFIX):
+        return zlib.decompress(base64.b64decode(stored[len(ZLIB_PREFIX):])).decode('utf-8')
+
+    if stored.startswith(ZSTD_PREFIX):
+        if zstandard is None:
+            raise RuntimeError('响应体使用zstd压缩，但未安装zstandard')
+        return zstandard.ZstdDecompressor().decompress(base64.b64decode(stored[len(ZSTD_PREFIX):])).decode('utf-8')
+
+    return stored
@@ -0,0 +1,202 @@
+# db_pool.py
+import logging
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+import pymysql
+from dbutils.pooled_db import PooledDB
+
+from configs import config
+from utils import metrics
+
+# app模块在导入蓝图前才创建global_logger，这里直接按名称获取，避免循环导入
+logger = logging.getLogger('global_logger')
+
+_lock = threading.Lock()
+
+# 从SQL中提取操作类型与表名，作为耗时指标的statement标签
+_STATEMENT_PATTERN = re.compile(
+    r'^\s*(?:(select|delete)\b.*?\bfrom|(insert)\b.*?\binto|(update)|(replace)\b.*?\binto)\s+`?(\w+)`?',
+    re.IGNORECASE | re.DOTALL)
+
+
+def _setting(name):
+    """读取连接池配置，环境变量优先于configs/config.py"""
+    default = getattr(config, name)
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return type(default)(value)
+
+
+@lru_cache(maxsize=1024)
+def statement_name(sql):
+    """
+    生成SQL的简短名称，如 select_api_testcase、insert_api_result
+
+    无法识别表名时只取首个关键字，避免把完整SQL放进指标标签。
+    """
+    match = _STATEMENT_PATTERN.match(sql)
+    if match:
+        verb = next(group for group in match.groups()[:4] if group)
+        return f'{verb.lower()}_{match.group(5).lower()}'
+
+    words = sql.split(None, 1)
+    return words[0].lower() if words else 'unknown'
+
+
+class InstrumentedCursor:
+    """记录SQL执行耗时的游标代理"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, args=None):
+        start_time = time.time()
+        try:
+            return self._cursor.execute(query, args)
+        finally:
+            metrics.record_db_query(statement_name(query), time.time() - start_time)
+
+    def executemany(self, query, args):
+        start_time = time.time()
+        try:
+            return self._cursor.executemany(query, args)
+        finally:
+            metrics.record_db_query(statement_name(query), time.time() - start_time)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class InstrumentedConnection:
+    """归还连接时同步连接池指标的连接代理"""
+
+    def __init__(self, con, shared_pool):
+        self._con = con
+        self._shared_pool = shared_pool
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._con.cursor(*args, **kwargs))
+
+    def close(self):
+        if self._con is not None:
+            con, self._con = self._con, None
+            con.close()
+            self._shared_pool.update_metrics()
+
+    def __getattr__(self, name):
+        if self._con is None:
+            raise AttributeError(name)
+        return getattr(self._con, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class SharedPool:
+    """
+    进程内共享的MySQL连接池
+
+    真正的PooledDB在首次取连接时按进程创建，gunicorn/Celery fork出的子进程不会复用父进程的连接。
+    对外保持与PooledDB相同的connection()用法。
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._pid = None
+
+    def _get_pool(self):
+        pid = os.getpid()
+        if self._pool is None or self._pid != pid:
+            with _lock:
+                if self._pool is None or self._pid != pid:
+                    self._pool = self._create_pool()
+                    self._pid = pid
+        return self._pool
+
+    @staticmethod
+    def _create_pool():
+        max_connections = _setting('DB_POOL_MAX_CONNECTIONS')
+        logger.info(f'创建数据库连接池，进程: {os.getpid()}，最大连接数: {max_connections}')
+        return PooledDB(
+            creator=pymysql,
+            maxconnections=max_connections,
+            mincached=_setting('DB_POOL_MIN_CACHED'),
+            maxcached=_setting('DB_POOL_MAX_CACHED'),
+            maxshared=0,
+            blocking=_setting('DB_POOL_BLOCKING'),
+            maxusage=None,
+            setsession=[],
+            ping=_setting('DB_POOL_PING'),
+            host=_setting('MYSQL_HOST'),
+            port=_setting('MYSQL_PORT'),
+            user=_setting('MYSQL_USER'),
+            password=_setting('MYSQL_PASSWORD'),
+            database=_setting('MYSQL_DATABASE'),
+            charset='utf8mb4',
+            cursorclass=pymysql.cursors.DictCursor
+        )
+
+    def connection(self, shareable=True):
+        """从连接池获取连接，用完调用close()归还"""
+        pool = self._get_pool()
+
+        # blocking模式下连接耗尽会在这里等待，等待时间计入checkout指标
+        start_time = time.time()
+        con = pool.connection(shareable)
+        metrics.record_db_checkout(time.time() - start_time)
+        self.update_metrics()
+
+        return InstrumentedConnection(con, self)
+
+    def update_metrics(self):
+        """同步连接池使用中与空闲连接数指标"""
+        stats = self.stats()
+        metrics.update_db_pool_usage(stats['in_use'], stats['idle'])
+
+    def stats(self):
+        """当前进程连接池使用情况"""
+        pool = self._pool if self._pid == os.getpid() else None
+        return {
+            'pid': os.getpid(),
+            'max_connections': _setting('DB_POOL_MAX_CONNECTIONS'),
+            'in_use': getattr(pool, '_connections', 0),
+            'idle': len(getattr(pool, '_idle_cache', [])),
+        }
+
+
+_shared_pool = SharedPool()
+
+
+def get_pool():
+    """获取共享连接池"""
+    return _shared_pool
+
+
+def get_pool_stats():
+    """获取当前进程连接池使用情况"""
+    return _shared_pool.stats()
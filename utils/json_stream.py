@@ -0,0 +1,120 @@
+# json_stream.py
+import json
+
+'''
+JSON数组增量解析
+
+按块输入文本，跳过数组前的任意前缀（如```json标记或说明文字），
+只有后一个非空白字符为{或]的[才视为数组开始，前缀中的"[见下]"等文字不会被误认。
+数组中每个顶层对象闭合时立即产出，不需要等待整个响应结束。
+'''
+
+
+class JsonArrayStreamParser:
+    """增量解析JSON数组中的顶层对象"""
+
+    def __init__(self):
+        self._buffer = ''
+        self._started = False
+        self._candidate = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start = None
+
+    @property
+    def finished(self):
+        """数组是否已闭合"""
+        return self._finished
+
+    def feed(self, text):
+        """
+        输入一段文本
+
+        参数:
+            text: 新到达的文本
+
+        返回:
+            本次输入中闭合的对象原始文本列表
+        """
+        if self._finished or not text:
+            return []
+
+        objects = []
+        offset = len(self._buffer)
+        self._buffer += text
+
+        for position in range(offset, len(self._buffer)):
+            char = self._buffer[position]
+
+            if not self._started:
+                if not self._candidate:
+                    self._candidate = char == '['
+                    continue
+                if char.isspace():
+                    continue
+                self._candidate = False
+                if char not in '{]':
+                    self._candidate = char == '['
+                    continue
+                # 确认数组开始，当前字符按数组内容处理
+                self._started = True
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0 and char == '{':
+                    self._object_start = position
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0:
+                    # 顶层数组闭合
+                    self._finished = True
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    objects.append(self._buffer[self._object_start:position + 1])
+                    self._object_start = None
+
+        # 只保留未闭合对象的文本
+        if self._object_start is not None:
+            self._buffer = self._buffer[self._object_start:]
+            self._object_start = 0
+        else:
+            self._buffer = ''
+
+        return objects
+
+
+def iter_array_objects(chunks, on_error=None):
+    """
+    从文本块序列中逐个解析数组对象
+
+    数组闭合后仍会读完剩余文本块，调用方在块生成器中收集的完整内容可用于兜底解析。
+
+    参数:
+        chunks: 文本块可迭代对象
+        on_error: 对象文本无法解析时的处理函数，参数为原始文本，返回修复后的对象或None
+
+    返回:
+        解析出的对象生成器
+    """
+    parser = JsonArrayStreamParser()
+    for chunk in chunks:
+        for raw in parser.feed(chunk):
+            try:
+                yield json.loads(raw)
+            except json.JSONDecodeError:
+                fixed = on_error(raw) if on_error else None
+                if fixed is not None:
+                    yield fixed
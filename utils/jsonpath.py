@@ -0,0 +1,389 @@
+# jsonpath.py
+import re
+from functools import lru_cache
+
+from configs import config
+
+'''
+JSONPath表达式编译与提取
+
+表达式编译为一组选择器后缓存，同一路径重复提取时不再解析。支持的语法：
+    $.data.items[0].name      子节点与下标（支持负数下标）
+    $.data['key name']        括号取键
+    $.data.*  $.data[*]       通配符
+    $..name  $..[0]           递归下降
+    $.items[1:5:2]            切片
+    $.items[0,2]  $['a','b']  联合
+    $.items[?(@.price > 10 && @.tags)]  过滤器，支持 == != < <= > >= =~ && || 及存在性判断
+'''
+
+
+class JsonPathError(ValueError):
+    """JSONPath表达式不合法"""
+    pass
+
+
+class CompiledPath:
+    """编译后的JSONPath表达式"""
+
+    def __init__(self, expression, selectors):
+        self.expression = expression
+        self._selectors = selectors
+
+    def find(self, obj):
+        """
+        提取所有匹配的值
+
+        参数:
+            obj: JSON对象
+
+        返回:
+            匹配的值列表
+        """
+        nodes = [obj]
+        for selector in self._selectors:
+            nodes = [child for node in nodes for child in selector(node)]
+            if not nodes:
+                break
+        return nodes
+
+    def first(self, obj, default=None):
+        """提取第一个匹配的值"""
+        matches = self.find(obj)
+        return matches[0] if matches else default
+
+    def __repr__(self):
+        return f'CompiledPath({self.expression!r})'
+
+
+@lru_cache(maxsize=config.JSONPATH_CACHE_SIZE)
+def compile_path(expression):
+    """
+    编译JSONPath表达式，结果按表达式缓存
+
+    参数:
+        expression: 路径表达式，例如 $.data.items[0].name
+
+    返回:
+        CompiledPath
+    """
+    if not isinstance(expression, str) or not expression.strip():
+        raise JsonPathError(f'JSONPath表达式不能为空: {expression!r}')
+    return CompiledPath(expression, _parse(expression.strip()))
+
+
+def find(obj, expression):
+    """按表达式提取所有匹配的值"""
+    return compile_path(expression).find(obj)
+
+
+def cache_info():
+    """编译缓存命中情况"""
+    return compile_path.cache_info()
+
+
+# ---------------- 选择器 ----------------
+
+def _children(node):
+    if isinstance(node, dict):
+        return list(node.values())
+    if isinstance(node, list):
+        return list(node)
+    return []
+
+
+def _walk(node):
+    """先序遍历节点自身及全部后代"""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(reversed(_children(current)))
+
+
+def _select_name(name):
+    def selector(node):
+        if isinstance(node, dict) and name in node:
+            return [node[name]]
+        return []
+    return selector
+
+
+def _select_index(index):
+    def selector(node):
+        if isinstance(node, list) and -len(node) <= index < len(node):
+            return [node[index]]
+        return []
+    return selector
+
+
+def _select_wildcard(node):
+    return _children(node)
+
+
+def _select_slice(start, end, step):
+    def selector(node):
+        if isinstance(node, list):
+            return node[start:end:step]
+        return []
+    return selector
+
+
+def _select_union(selectors):
+    def selector(node):
+        return [child for item in selectors for child in item(node)]
+    return selector
+
+
+def _select_filter(predicate):
+    def selector(node):
+        return [child for child in _children(node) if predicate(child)]
+    return selector
+
+
+def _select_descendants(inner):
+    def selector(node):
+        return [child for descendant in _walk(node) for child in inner(descendant)]
+    return selector
+
+
+# ---------------- 解析 ----------------
+
+def _parse(expression):
+    text = expression
+    if text[0] in '$@':
+        i = 1
+    elif text[0] in '.[':
+        i = 0
+    else:
+        # 兼容不带$的写法，如 data.items[0]
+        text = '.' + text
+        i = 0
+
+    selectors = []
+    length = len(text)
+    while i < length:
+        char = text[i]
+        if char.isspace():
+            i += 1
+        elif text.startswith('..', i):
+            i += 2
+            if i < length and text[i] == '[':
+                inner, i = _parse_bracket(text, i, expression)
+            else:
+                name, i = _read_name(text, i, expression)
+                inner = _select_wildcard if name == '*' else _select_name(name)
+            selectors.append(_select_descendants(inner))
+        elif char == '.':
+            name, i = _read_name(text, i + 1, expression)
+            selectors.append(_select_wildcard if name == '*' else _select_name(name))
+        elif char == '[':
+            selector, i = _parse_bracket(text, i, expression)
+            selectors.append(selector)
+        else:
+            raise JsonPathError(f'JSONPath表达式不合法: {expression}，位置 {i} 处的字符 {char!r}')
+
+    return selectors
+
+
+def _read_name(text, i, expression):
+    start = i
+    while i < len(text) and text[i] not in '.[' and not text[i].isspace():
+        i += 1
+    if start == i:
+        raise JsonPathError(f'JSONPath表达式不合法: {expression}，位置 {start} 处缺少字段名')
+    return text[start:i], i
+
+
+def _find_closing(text, i, expression):
+    """从开括号位置查找匹配的闭括号，跳过引号及嵌套括号内的内容"""
+    pairs = {'[': ']', '(': ')'}
+    stack = []
+    quote = None
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == '\\':
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in '\'"':
+            quote = char
+        elif char in pairs:
+            stack.append(pairs[char])
+        elif stack and char == stack[-1]:
+            stack.pop()
+            if not stack:
+                return i
+        i += 1
+    raise JsonPathError(f'JSONPath表达式不合法: {expression}，括号未闭合')
+
+
+def _split_top(text, separator):
+    """按分隔符拆分，忽略引号与括号内的分隔符"""
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == '\\':
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in '\'"':
+            quote = char
+        elif char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif depth == 0 and text.startswith(separator, i):
+            parts.append(text[start:i])
+            i += len(separator)
+            start = i
+            continue
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _unquote(token):
+    if len(token) >= 2 and token[0] == token[-1] and token[0] in '\'"':
+        return re.sub(r'\\(.)', r'\1', token[1:-1])
+    return None
+
+
+def _parse_bracket(text, i, expression):
+    end = _find_closing(text, i, expression)
+    content = text[i + 1:end].strip()
+    next_index = end + 1
+
+    if not content:
+        raise JsonPathError(f'JSONPath表达式不合法: {expression}，括号内容为空')
+
+    if content.startswith('?'):
+        return _select_filter(_compile_filter(content[1:].strip(), expression)), next_index
+
+    if content == '*':
+        return _select_wildcard, next_index
+
+    parts = [part.strip() for part in _split_top(content, ',')]
+    selectors = [_parse_bracket_item(part, expression) for part in parts]
+    if len(selectors) == 1:
+        return selectors[0], next_index
+    return _select_union(selectors), next_index
+
+
+def _parse_bracket_item(item, expression):
+    name = _unquote(item)
+    if name is not None:
+        return _select_name(name)
+
+    if item == '*':
+        return _select_wildcard
+
+    try:
+        if ':' in item:
+            bounds = [int(bound) if bound.strip() else None for bound in item.split(':')]
+            if len(bounds) > 3:
+                raise ValueError(item)
+            bounds += [None] * (3 - len(bounds))
+            if bounds[2] == 0:
+                raise ValueError(item)
+            return _select_slice(*bounds)
+        return _select_index(int(item))
+    except ValueError:
+        raise JsonPathError(f'JSONPath表达式不合法: {expression}，无法解析 [{item}]')
+
+
+# ---------------- 过滤器 ----------------
+
+_COMPARISON = re.compile(r'^(@.*?)\s*(==|!=|<=|>=|=~|<|>)\s*(.+)$', re.DOTALL)
+
+
+def _compile_filter(text, expression):
+    if text.startswith('(') and _find_closing(text, 0, expression) == len(text) - 1:
+        text = text[1:-1].strip()
+
+    alternatives = [
+        [_compile_condition(part.strip(), expression) for part in _split_top(option, '&&')]
+        for option in _split_top(text, '||')
+    ]
+
+    def predicate(item):
+        return any(all(condition(item) for condition in conditions) for conditions in alternatives)
+
+    return predicate
+
+
+def _compile_condition(text, expression):
+    if text.startswith('(') and _find_closing(text, 0, expression) == len(text) - 1:
+        return _compile_filter(text, expression)
+
+    if text.startswith('!'):
+        inner = _compile_condition(text[1:].strip(), expression)
+        return lambda item: not inner(item)
+
+    match = _COMPARISON.match(text)
+    if not match:
+        if not text.startswith('@'):
+            raise JsonPathError(f'JSONPath表达式不合法: {expression}，无法解析过滤条件 {text}')
+        path = CompiledPath(text, _parse(text))
+        return lambda item: bool(path.find(item))
+
+    path = CompiledPath(match.group(1), _parse(match.group(1).strip()))
+    operator = match.group(2)
+    expected = _parse_literal(match.group(3).strip(), operator, expression)
+
+    def condition(item):
+        matches = path.find(item)
+        if not matches:
+            return False
+        actual = matches[0]
+        try:
+            if operator == '==':
+                return actual == expected
+            if operator == '!=':
+                return actual != expected
+            if operator == '<':
+                return actual < expected
+            if operator == '<=':
+                return actual <= expected
+            if operator == '>':
+                return actual > expected
+            if operator == '>=':
+                return actual >= expected
+            return isinstance(actual, str) and expected.search(actual) is not None
+        except TypeError:
+            return False
+
+    return condition
+
+
+def _parse_literal(token, operator, expression):
+    if operator == '=~':
+        pattern = token[1:token.rfind('/')] if token.startswith('/') and token.rfind('/') > 0 else _unquote(token)
+        if pattern is None:
+            raise JsonPathError(f'JSONPath表达式不合法: {expression}，正则需写成 /pattern/ 或带引号')
+        flags = re.IGNORECASE if token.startswith('/') and token.endswith('/i') else 0
+        return re.compile(pattern, flags)
+
+    value = _unquote(token)
+    if value is not None:
+        return value
+    if token == 'true':
+        return True
+    if token == 'false':
+        return False
+    if token == 'null':
+        return None
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token)
+    except ValueError:
+        raise JsonPathError(f'JSONPath表达式不合法: {expression}，无法解析值 {token}')
@@ -0,0 +1,150 @@
+# latency_histogram.py
+import json
+
+'''
+可合并的对数线性延迟直方图（HDR风格）
+
+数值按微秒记录，小于 2^SIGNIFICANT_BITS 的值各占一个桶，更大的值按2的幂分段，
+每段再线性细分为 2^(SIGNIFICANT_BITS-1) 个桶，相对误差不超过 1/2^(SIGNIFICANT_BITS-1)。
+只保存非空桶，直方图之间可直接按桶合并，适合分片统计后汇总。
+'''
+
+SIGNIFICANT_BITS = 7
+SUB_BUCKET_COUNT = 1 << SIGNIFICANT_BITS
+HALF_SUB_BUCKET_COUNT = SUB_BUCKET_COUNT >> 1
+
+
+def bucket_index(value):
+    """计算数值(微秒)所在桶的序号"""
+    if value < SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SIGNIFICANT_BITS
+    return SUB_BUCKET_COUNT + (shift - 1) * HALF_SUB_BUCKET_COUNT + ((value >> shift) - HALF_SUB_BUCKET_COUNT)
+
+
+def bucket_range(index):
+    """桶序号对应的数值区间(微秒)，返回 (下界, 上界)"""
+    if index < SUB_BUCKET_COUNT:
+        return index, index
+    offset = index - SUB_BUCKET_COUNT
+    shift = offset // HALF_SUB_BUCKET_COUNT + 1
+    top = offset % HALF_SUB_BUCKET_COUNT + HALF_SUB_BUCKET_COUNT
+    return top << shift, ((top + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """延迟直方图，对外以毫秒为单位"""
+
+    def __init__(self):
+        self.counts = {}
+        self.total_count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = None
+
+    def record(self, latency_ms, count=1):
+        """
+        记录一次延迟
+
+        参数:
+            latency_ms: 延迟(毫秒)
+            count: 记录次数
+        """
+        value = max(0, int(round(latency_ms * 1000)))
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += count
+        self.total_us += value * count
+        if self.min_us is None or value < self.min_us:
+            self.min_us = value
+        if self.max_us is None or value > self.max_us:
+            self.max_us = value
+
+    def merge(self, other):
+        """合并另一个直方图，返回自身"""
+        if other is None or not other.total_count:
+            return self
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += other.total_count
+        self.total_us += other.total_us
+        self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+        self.max_us = other.max_us if self.max_us is None else max(self.max_us, other.max_us)
+        return self
+
+    def percentile(self, percent):
+        """
+        计算百分位延迟(毫秒)，无数据时返回None
+
+        参数:
+            percent: 百分位，如 50、90、99
+        """
+        if not self.total_count:
+            return None
+
+        rank = max(1, -(-self.total_count * percent // 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = bucket_range(index)
+                value = min(max((low + high) / 2, self.min_us), self.max_us)
+                return round(value / 1000, 3)
+        return round(self.max_us / 1000, 3)
+
+    @property
+    def min(self):
+        return None if self.min_us is None else round(self.min_us / 1000, 3)
+
+    @property
+    def max(self):
+        return None if self.max_us is None else round(self.max_us / 1000, 3)
+
+    @property
+    def mean(self):
+        return round(self.total_us / self.total_count / 1000, 3) if self.total_count else None
+
+    def summary(self):
+        """常用统计值(毫秒)"""
+        return {
+            'count': self.total_count,
+            'min': self.min,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max
+        }
+
+    def to_dict(self):
+        """序列化为可JSON保存的结构，桶以 [序号, 次数] 数组保存"""
+        return {
+            'significant_bits': SIGNIFICANT_BITS,
+            'count': self.total_count,
+            'total_us': self.total_us,
+            'min_us': self.min_us,
+            'max_us': self.max_us,
+            'buckets': [[index, self.counts[index]] for index in sorted(self.counts)]
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+    @classmethod
+    def from_dict(cls, data):
+        """从to_dict的结果还原，数据为空时返回空直方图"""
+        histogram = cls()
+        if not data:
+            return histogram
+        if data.get('significant_bits', SIGNIFICANT_BITS) != SIGNIFICANT_BITS:
+            raise ValueError(f"直方图精度不一致: {data.get('significant_bits')}")
+        histogram.counts = {int(index): int(count) for index, count in data.get('buckets', [])}
+        histogram.total_count = int(data.get('count', 0))
+        histogram.total_us = int(data.get('total_us', 0))
+        histogram.min_us = data.get('min_us')
+        histogram.max_us = data.get('max_us')
+        return histogram
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text) if text else None)
@@ -11,6 +11,21 @@ ASSERTION_TOTAL = Counter('assertion_total', '断言总数', ['result'])
 HTTP_REQUEST_TOTAL = Counter('http_request_total', 'HTTP请求总数', ['method', 'status_code'])
 HTTP_REQUEST_DURATION = Histogram('http_request_duration_seconds', 'HTTP请求耗时(秒)',
                                   ['method'], buckets=[0.1, 0.5, 1, 2, 5, 10, 30])
+BATCH_STATUS = Gauge('test_batch_status', '测试批次状态', ['batch_id', 'status'])
+BATCH_COMPLETION = Gauge('test_batch_completion_rate', '测试批次完成率', ['batch_id'])
+BATCH_SUCCESS_RATE = Gauge('test_batch_success_rate', '测试批次通过率', ['batch_id'])
+DB_POOL_IN_USE = Gauge('db_pool_connections_in_use', '数据库连接池使用中的连接数')
+DB_POOL_IDLE = Gauge('db_pool_connections_idle', '数据库连接池空闲连接数')
+DB_POOL_CHECKOUT_WAIT = Histogram('db_pool_checkout_wait_seconds', '从数据库连接池获取连接的等待时间(秒)',
+                                  buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30])
+DB_QUERY_DURATION = Histogram('db_query_duration_seconds', 'SQL执行耗时(秒)', ['statement'],
+                              buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10])
+AI_PROVIDER_CIRCUIT_STATE = Gauge('ai_provider_circuit_state', 'AI服务商熔断器状态(0-关闭,1-半开,2-打开)',
+                                  ['provider'])
+AI_PROVIDER_LATENCY_EWMA = Gauge('ai_provider_latency_ewma_seconds', 'AI服务商响应耗时EWMA(秒)', ['provider'])
+AI_PROVIDER_REQUEST_TOTAL = Counter('ai_provider_request_total', 'AI服务商请求总数', ['provider', 'result'])
+AI_PROVIDER_REQUEST_DURATION = Histogram('ai_provider_request_duration_seconds', 'AI服务商请求耗时(秒)',
+                                         ['provider'], buckets=[0.5, 1, 2, 5, 10, 30, 60, 120])
 
 
 # 启动指标服务器
@@ -56,6 +71,41 @@ def update_queue_length(length):
     QUEUE_LENGTH.set(length)
 
 
+# 记录数据库连接池状态
+def update_db_pool_usage(in_use, idle):
+    """更新数据库连接池使用中与空闲的连接数"""
+    DB_POOL_IN_USE.set(in_use)
+    DB_POOL_IDLE.set(idle)
+
+
+# 记录获取数据库连接的等待时间
+def record_db_checkout(wait_seconds):
+    """记录从连接池获取连接的等待时间"""
+    DB_POOL_CHECKOUT_WAIT.observe(wait_seconds)
+
+
+# 记录SQL执行耗时
+def record_db_query(statement, duration_seconds):
+    """记录SQL执行耗时"""
+    DB_QUERY_DURATION.labels(statement=statement).observe(duration_seconds)
+
+
+# 记录AI服务商熔断器状态
+def update_ai_provider_state(provider, state):
+    """更新AI服务商熔断器状态"""
+    AI_PROVIDER_CIRCUIT_STATE.labels(provider=provider).set(state)
+
+
+# 记录AI服务商请求
+def record_ai_provider_request(provider, success, duration_seconds, latency_ewma=None):
+    """记录AI服务商请求结果、耗时及最新的耗时EWMA"""
+    result = 'success' if success else 'failure'
+    AI_PROVIDER_REQUEST_TOTAL.labels(provider=provider, result=result).inc()
+    AI_PROVIDER_REQUEST_DURATION.labels(provider=provider).observe(duration_seconds)
+    if latency_ewma is not None:
+        AI_PROVIDER_LATENCY_EWMA.labels(provider=provider).set(latency_ewma)
+
+
 # 初始化函数，在应用启动时调用
 def init_metrics(port=8000):
     """初始化指标收集"""